@@ -0,0 +1,109 @@
+# acoes.py
+from datetime import date, timedelta
+
+from eventos import SQL_REGISTRAR
+from utilitarios import DIAS_BANIMENTO, DIAS_RECARGA
+
+# Todas as mudanças de estado são set-based (WHERE id = ANY(%s)): a rota de um chip
+# e as operações em lote da API usam o mesmo comando. Cada comando grava também o
+# evento em chip_events, no mesmo statement.
+
+
+def transicao(cur, tipo, set_sql, where_sql, params_set=(), params_where=(), retorno="count(*)", ordem=None):
+    """UPDATE em chips + evento `tipo` para cada linha alterada.
+
+    `atual` trava as linhas (FOR UPDATE) e lê o status delas já travadas: com outra
+    transição no mesmo chip em andamento, espera o commit dela e grava como anterior o
+    status que ela deixou. (Um self-join no UPDATE leria o snapshot de antes da espera:
+    o EvalPlanQual do READ COMMITTED só relê a tabela alvo.) Por padrão retorna quantas
+    linhas mudaram; com `retorno` (colunas de `alterados`) retorna as linhas, na `ordem`
+    pedida. `alterados` expõe também status_anterior e ultima_utilizacao_anterior.
+    """
+    cur.execute(f"""
+        WITH atual AS (
+            SELECT c.id, c.status, c.ultima_utilizacao FROM chips c WHERE {where_sql} FOR UPDATE
+        ), alterados AS (
+            UPDATE chips c SET {set_sql}
+            FROM atual a WHERE a.id = c.id
+            RETURNING c.*, a.status AS status_anterior, a.ultima_utilizacao AS ultima_utilizacao_anterior
+        ), eventos AS (
+            {SQL_REGISTRAR}
+        )
+        SELECT {retorno} FROM alterados{f" ORDER BY {ordem}" if ordem else ""}
+    """, tuple(params_where) + tuple(params_set) + (tipo,))
+    if retorno == "count(*)":
+        return cur.fetchone()[0]
+    return cur.fetchall()
+
+def inserir_chip(cur, dados):
+    """`dados` é a tupla de salvar_chip; retorna o id criado"""
+    cur.execute(f"""
+        WITH alterados AS (
+            INSERT INTO chips (numero_chip,status,ultima_utilizacao,primeira_recarga,proxima_recarga,
+            proxima_utilizacao,data_banimento,observacoes) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
+            RETURNING *, NULL::varchar AS status_anterior
+        ), eventos AS (
+            {SQL_REGISTRAR}
+        )
+        SELECT id FROM alterados
+    """, tuple(dados) + ("cadastro",))
+    return cur.fetchone()[0]
+
+def atualizar_chip(cur, id, dados):
+    return transicao(cur, "edicao", """
+        numero_chip=%s,status=%s,ultima_utilizacao=%s,primeira_recarga=%s,proxima_recarga=%s,
+        proxima_utilizacao=%s,data_banimento=%s,observacoes=%s
+    """, "c.id=%s", tuple(dados), (id,))
+
+def deletar(cur, ids):
+    cur.execute(f"""
+        WITH alterados AS (
+            DELETE FROM chips WHERE id = ANY(%s)
+            RETURNING id, status AS status_anterior, NULL::varchar AS status, data_banimento,
+                      proxima_utilizacao, proxima_recarga
+        ), eventos AS (
+            {SQL_REGISTRAR}
+        )
+        SELECT count(*) FROM alterados
+    """, (list(ids), "exclusao"))
+    return cur.fetchone()[0]
+
+# Valores de cada transição nomeada, calculados na hora (datas de hoje); a chave é o tipo
+# do evento gravado em chip_events
+def valores_banimento():
+    hoje = date.today()
+    return {"status": "banido", "data_banimento": hoje, "proxima_utilizacao": hoje + timedelta(days=DIAS_BANIMENTO)}
+
+def valores_desbanimento():
+    return {"status": "disponivel", "data_banimento": None, "proxima_utilizacao": None}
+
+def valores_recarga():
+    hoje = date.today()
+    return {"ultima_utilizacao": hoje, "proxima_recarga": hoje + timedelta(days=DIAS_RECARGA), "status": "em_uso",
+            "recarga_vencida": False}
+
+TRANSICOES = {
+    "banimento": valores_banimento,
+    "desbanimento": valores_desbanimento,
+    "recarga": valores_recarga,
+}
+
+def transicionar(cur, ids, valores, tipo):
+    """`valores` ({coluna: valor}) nos `ids`, com evento `tipo`; retorna quantas linhas mudaram"""
+    return transicao(cur, tipo, ",".join(f"{coluna}=%s" for coluna in valores), "c.id = ANY(%s)",
+                     tuple(valores.values()), (list(ids),))
+
+def alocar(cur, quantidade, colunas=("id","numero_chip")):
+    """Marca até `quantidade` chips disponíveis como em uso, os menos usados primeiro.
+
+    SKIP LOCKED faz alocações concorrentes pegarem chips diferentes sem esperar
+    umas pelas outras; retorna as linhas alocadas (pode vir menos que o pedido) na
+    ordem da fila, pela ultima_utilizacao de antes da alocação (o UPDATE a põe em hoje).
+    """
+    return transicao(cur, "alocacao", "status='em_uso', ultima_utilizacao=%s", """
+        c.id IN (
+            SELECT id FROM chips WHERE status='disponivel'
+            ORDER BY ultima_utilizacao NULLS FIRST, id
+            LIMIT %s FOR UPDATE SKIP LOCKED
+        )
+    """, (date.today(),), (quantidade,), ",".join(colunas), "ultima_utilizacao_anterior NULLS FIRST, id")
@@ -0,0 +1,120 @@
+# agendador.py
+import logging
+import os
+import threading
+import time
+
+from acoes import transicao
+from analitico import atualizar_resumos
+from cache import invalidar_cache
+from db import get_db
+from eventos import garantir_particoes
+
+log = logging.getLogger(__name__)
+
+AGENDADOR_INTERVALO = float(os.getenv("AGENDADOR_INTERVALO","300"))
+# Chave do advisory lock: com vários workers só um executa as regras por vez
+CHAVE_LOCK = 7_241_001
+
+# Uma regra = um UPDATE set-based (SET, WHERE), sempre apoiado num índice parcial.
+# O nome da regra é também o tipo do evento gravado em chip_events.
+REGRAS = (
+    ("desbanir_expirados",
+     "status='disponivel', data_banimento=NULL, proxima_utilizacao=NULL",
+     "c.status='banido' AND c.proxima_utilizacao <= CURRENT_DATE"),
+    ("marcar_recarga_vencida",
+     "recarga_vencida=TRUE",
+     "c.status <> 'banido' AND c.proxima_recarga < CURRENT_DATE AND NOT c.recarga_vencida"),
+    ("limpar_recarga_vencida",
+     "recarga_vencida=FALSE",
+     "c.recarga_vencida AND (c.proxima_recarga IS NULL OR c.proxima_recarga >= CURRENT_DATE)"),
+)
+
+
+def executar_transicoes():
+    """Roda todas as regras numa transação; retorna linhas alteradas por regra (None se outro worker já está rodando)"""
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (CHAVE_LOCK,))
+        if not cur.fetchone()[0]:
+            conn.rollback()
+            return None
+        garantir_particoes(cur)
+        alteradas = {}
+        for nome, set_sql, where_sql in REGRAS:
+            alteradas[nome] = transicao(cur, nome, set_sql, where_sql)
+        atualizar_resumos(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    if any(alteradas.values()):
+        invalidar_cache()
+    return alteradas
+
+
+class Agendador:
+    def __init__(self, intervalo=AGENDADOR_INTERVALO):
+        self.intervalo = intervalo
+        self._pid = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self.execucoes = 0
+        self.puladas = 0
+        self.erros = 0
+        self.ultima_execucao = None
+        self.ultima_duracao_ms = None
+        self.ultimas = {}
+        self.totais = {nome: 0 for nome, _, _ in REGRAS}
+
+    def executar(self):
+        inicio = time.monotonic()
+        try:
+            alteradas = executar_transicoes()
+        except Exception:
+            log.exception("Falha ao executar transições agendadas")
+            with self._lock:
+                self.erros += 1
+            return None
+        with self._lock:
+            self.ultima_execucao = time.time()
+            self.ultima_duracao_ms = round((time.monotonic() - inicio) * 1000, 3)
+            if alteradas is None:
+                self.puladas += 1
+                return None
+            self.execucoes += 1
+            self.ultimas = alteradas
+            for nome, qtd in alteradas.items():
+                self.totais[nome] += qtd
+        log.info("Transições agendadas: %s", alteradas)
+        return alteradas
+
+    def _loop(self):
+        while not self._parar.wait(self.intervalo):
+            self.executar()
+
+    def iniciar(self):
+        # Uma thread por processo (a do pai não existe no worker depois do fork)
+        if self.intervalo <= 0 or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._parar.clear()
+        threading.Thread(target=self._loop, name="agendador", daemon=True).start()
+
+    def parar(self):
+        self._parar.set()
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "intervalo_s": self.intervalo,
+                "execucoes": self.execucoes,
+                "puladas": self.puladas,
+                "erros": self.erros,
+                "ultima_execucao": self.ultima_execucao,
+                "ultima_duracao_ms": self.ultima_duracao_ms,
+                "ultimas": dict(self.ultimas),
+                "totais": dict(self.totais),
+            }
+
+agendador = Agendador()
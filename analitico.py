@@ -0,0 +1,145 @@
+# analitico.py
+import os
+
+# Resumos pré-agregados: o agendador atualiza, o endpoint só lê. Nenhuma consulta
+# de request faz GROUP BY sobre chips ou chip_events.
+ANALITICO_DIAS_RECALCULO = int(os.getenv("ANALITICO_DIAS_RECALCULO","2"))
+ANALITICO_SEMANAS = int(os.getenv("ANALITICO_SEMANAS","8"))
+ANALITICO_DIAS_MAX = 366
+
+DDL_ANALITICO = """
+CREATE TABLE IF NOT EXISTS resumo_status_diario (
+    dia DATE NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    quantidade INTEGER NOT NULL,
+    PRIMARY KEY (dia, status)
+);
+CREATE TABLE IF NOT EXISTS resumo_eventos_diario (
+    dia DATE NOT NULL,
+    tipo VARCHAR(30) NOT NULL,
+    quantidade INTEGER NOT NULL,
+    soma_dias_entre_recargas BIGINT NOT NULL DEFAULT 0,
+    intervalos_recarga INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, tipo)
+);
+CREATE TABLE IF NOT EXISTS resumo_recargas_semana (
+    semana DATE PRIMARY KEY,
+    quantidade INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chip_events_criado_em ON chip_events (criado_em);
+"""
+
+# Marca d'água dos resumos que são foto de chips (status do dia, recargas por semana)
+DDL_CONTROLE_RESUMOS = """
+CREATE TABLE IF NOT EXISTS resumo_controle (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    dia DATE NOT NULL,
+    eventos_janela BIGINT NOT NULL
+);
+"""
+
+# Foto do dia: reescrita quando algo mudou (a do dia anterior fica como histórico).
+# Não dá para derivar de chip_events por diferença: o upsert da importação grava o
+# evento com status_anterior NULL, sem dizer de que status o chip saiu.
+SQL_STATUS_DIARIO = """
+DELETE FROM resumo_status_diario WHERE dia = CURRENT_DATE;
+INSERT INTO resumo_status_diario (dia, status, quantidade)
+SELECT CURRENT_DATE, status, count(*) FROM chips GROUP BY status;
+"""
+
+# Só os últimos dias são recalculados (poda de partição + idx_chip_events_criado_em).
+# A janela cobre importações longas, cujos eventos levam o horário do início da transação.
+# O intervalo desde a recarga anterior sai de um lag() sobre as recargas dos chips
+# recarregados na janela (idx_chip_events_chip), numa passada só, em vez de uma
+# subconsulta por evento.
+SQL_EVENTOS_DIARIO = """
+DELETE FROM resumo_eventos_diario WHERE dia >= CURRENT_DATE - %(dias)s;
+WITH recargas AS (
+    SELECT r.id, r.criado_em::date - lag(r.criado_em::date) OVER (PARTITION BY r.chip_id ORDER BY r.id) AS intervalo
+    FROM chip_events r
+    WHERE r.tipo = 'recarga'
+      AND r.chip_id IN (SELECT chip_id FROM chip_events WHERE tipo = 'recarga' AND criado_em >= CURRENT_DATE - %(dias)s)
+)
+INSERT INTO resumo_eventos_diario (dia, tipo, quantidade, soma_dias_entre_recargas, intervalos_recarga)
+SELECT e.criado_em::date, e.tipo, count(*), COALESCE(sum(r.intervalo), 0), count(r.intervalo)
+FROM chip_events e
+LEFT JOIN recargas r ON r.id = e.id
+WHERE e.criado_em >= CURRENT_DATE - %(dias)s
+GROUP BY 1, 2;
+"""
+
+SQL_RECARGAS_SEMANA = """
+DELETE FROM resumo_recargas_semana;
+INSERT INTO resumo_recargas_semana (semana, quantidade)
+SELECT date_trunc('week', proxima_recarga)::date, count(*)
+FROM chips
+WHERE status <> 'banido'
+  AND proxima_recarga >= date_trunc('week', CURRENT_DATE)
+  AND proxima_recarga < date_trunc('week', CURRENT_DATE) + %(semanas)s * INTERVAL '1 week'
+GROUP BY 1;
+"""
+
+# As duas fotos acima varrem chips, então só rodam se algo mudou desde a última vez.
+# Toda escrita em chips grava chip_events, e um evento confirmado depois (importação
+# longa) leva o horário do início da transação, que ainda cai na janela recalculada
+# de SQL_EVENTOS_DIARIO. Logo, a soma da janela em resumo_eventos_diario só fica igual
+# se nenhum evento entrou. A virada do dia também refaz: a foto é por dia e as semanas
+# andam com CURRENT_DATE.
+SQL_MARCA_DAGUA = """
+WITH atual AS (
+    SELECT CURRENT_DATE AS dia, COALESCE(sum(quantidade), 0) AS eventos_janela
+    FROM resumo_eventos_diario WHERE dia >= CURRENT_DATE - %(dias)s
+), gravado AS (
+    INSERT INTO resumo_controle (dia, eventos_janela) SELECT dia, eventos_janela FROM atual
+    ON CONFLICT (id) DO UPDATE SET dia = EXCLUDED.dia, eventos_janela = EXCLUDED.eventos_janela
+)
+SELECT NOT EXISTS (SELECT 1 FROM resumo_controle c JOIN atual a USING (dia, eventos_janela))
+"""
+
+
+def atualizar_resumos(cur, dias=ANALITICO_DIAS_RECALCULO, semanas=ANALITICO_SEMANAS):
+    """Chamado pelo agendador, dentro da transação (e do advisory lock) das transições.
+    Retorna se as fotos de chips foram refeitas."""
+    cur.execute(SQL_EVENTOS_DIARIO, {"dias": dias})
+    cur.execute(SQL_MARCA_DAGUA, {"dias": dias})
+    if not cur.fetchone()[0]:
+        return False
+    cur.execute(SQL_STATUS_DIARIO)
+    cur.execute(SQL_RECARGAS_SEMANA, {"semanas": semanas})
+    return True
+
+def ler_resumo(cur, dias=30):
+    """Monta o JSON do endpoint só a partir das tabelas de resumo"""
+    cur.execute("""
+        SELECT dia, status, quantidade FROM resumo_status_diario
+        WHERE dia > CURRENT_DATE - %s ORDER BY dia, status
+    """, (dias,))
+    status_por_dia = {}
+    for dia, status, quantidade in cur.fetchall():
+        status_por_dia.setdefault(dia.isoformat(), {})[status] = quantidade
+
+    cur.execute("""
+        SELECT dia, tipo, quantidade, soma_dias_entre_recargas, intervalos_recarga FROM resumo_eventos_diario
+        WHERE dia > CURRENT_DATE - %s ORDER BY dia, tipo
+    """, (dias,))
+    eventos_por_dia = {}
+    banimentos_por_dia = {}
+    soma_dias = intervalos = 0
+    for dia, tipo, quantidade, soma, n in cur.fetchall():
+        eventos_por_dia.setdefault(dia.isoformat(), {})[tipo] = quantidade
+        if tipo == "banimento":
+            banimentos_por_dia[dia.isoformat()] = quantidade
+        soma_dias += soma
+        intervalos += n
+
+    cur.execute("SELECT semana, quantidade FROM resumo_recargas_semana ORDER BY semana")
+    recargas_por_semana = {semana.isoformat(): quantidade for semana, quantidade in cur.fetchall()}
+
+    return {
+        "dias": dias,
+        "status_por_dia": status_por_dia,
+        "banimentos_por_dia": banimentos_por_dia,
+        "eventos_por_dia": eventos_por_dia,
+        "media_dias_entre_recargas": round(soma_dias / intervalos, 1) if intervalos else None,
+        "recargas_por_semana": recargas_por_semana,
+    }
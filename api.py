@@ -0,0 +1,198 @@
+# api.py
+from datetime import date, datetime
+
+from flask import Blueprint, request, jsonify
+import psycopg2
+
+import acoes
+from analitico import ANALITICO_DIAS_MAX, ler_resumo
+from cache import invalidar_cache
+from db import get_db
+from modelos import ChipCursor, buscar_chip
+from eventos import EVENTOS_LIMITE_MAX, linha_do_tempo
+from exportacao import COLUNAS_EXPORT
+from importacao import validar_linha
+from indice import INDICE_FROTA, PROXIMOS_MAX, indice_frota, resumo_sql
+from repositorio import repositorio_postgres as repositorio
+
+API_BP = Blueprint("api", __name__, url_prefix="/api")
+
+COLUNAS_API = COLUNAS_EXPORT
+LOTE_MAX = 10000
+ALOCACAO_MAX = 1000
+# Ação da URL -> tipo do evento (acoes.TRANSICOES); deletar é repositorio.excluir
+ACOES_LOTE = {
+    "banir": "banimento",
+    "desbanir": "desbanimento",
+    "recarga": "recarga",
+    "deletar": None,
+}
+
+
+def chip_para_dict(chip):
+    return {
+        coluna: valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+        for coluna, valor in chip._asdict().items()
+    }
+
+def erro(mensagem, status=400):
+    return jsonify({"erro": mensagem}), status
+
+def ler_chip_json():
+    """Valida o corpo JSON com as mesmas regras da importação; retorna (dados, motivo)"""
+    corpo = request.get_json(silent=True)
+    if not isinstance(corpo, dict):
+        return None, "corpo JSON inválido"
+    # validar_linha espera textos, como viriam do CSV
+    row = {k: (None if v is None else str(v)) for k, v in corpo.items()}
+    return validar_linha(row)
+
+def ler_ids():
+    corpo = request.get_json(silent=True) or {}
+    ids = corpo.get("ids")
+    if not isinstance(ids, list) or not ids:
+        return None, "informe 'ids' como lista não vazia"
+    if len(ids) > LOTE_MAX:
+        return None, f"no máximo {LOTE_MAX} ids por requisição"
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return None, "'ids' deve conter apenas inteiros"
+    return ids, None
+
+
+# ===============================
+# CRUD
+# ===============================
+@API_BP.route("/chips")
+def listar():
+    linhas, proximo = repositorio.listar(request.args, COLUNAS_API)
+    return jsonify({"chips": [chip_para_dict(c) for c in linhas], "proximo": proximo})
+
+@API_BP.route("/chips/<int:id>")
+def obter(id):
+    conn = get_db()
+    chip = buscar_chip(conn, id, COLUNAS_API)
+    conn.close()
+    if chip is None:
+        return erro("chip não encontrado", 404)
+    return jsonify(chip_para_dict(chip))
+
+@API_BP.route("/chips/<int:id>/eventos")
+def eventos(id):
+    """Linha do tempo do chip (continua disponível depois da exclusão)"""
+    limite = min(request.args.get("limite", 100, type=int) or 100, EVENTOS_LIMITE_MAX)
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=ChipCursor)
+    linhas = linha_do_tempo(cur, id, limite, request.args.get("antes", type=int))
+    conn.close()
+    proximo = linhas[-1].id if len(linhas) == limite else None
+    return jsonify({"chip_id": id, "eventos": [chip_para_dict(e) for e in linhas], "proximo": proximo})
+
+@API_BP.route("/chips", methods=["POST"])
+def criar():
+    dados, motivo = ler_chip_json()
+    if motivo:
+        return erro(motivo)
+    try:
+        id = repositorio.inserir(dados)
+    except psycopg2.IntegrityError:
+        return erro(f"já existe um chip com o número {dados[0]}", 409)
+    invalidar_cache()
+    return jsonify({"id": id}), 201
+
+@API_BP.route("/chips/<int:id>", methods=["PUT"])
+def atualizar(id):
+    dados, motivo = ler_chip_json()
+    if motivo:
+        return erro(motivo)
+    try:
+        afetados = repositorio.atualizar(id, dados)
+    except psycopg2.IntegrityError:
+        return erro(f"já existe outro chip com o número {dados[0]}", 409)
+    invalidar_cache()
+    if not afetados:
+        return erro("chip não encontrado", 404)
+    return jsonify({"id": id, "afetados": afetados})
+
+@API_BP.route("/chips/<int:id>", methods=["DELETE"])
+def remover(id):
+    afetados = repositorio.excluir([id])
+    invalidar_cache()
+    if not afetados:
+        return erro("chip não encontrado", 404)
+    return jsonify({"afetados": afetados})
+
+
+# ===============================
+# Lote: um único UPDATE/DELETE ... WHERE id = ANY(%s) (repositorio.transicionar/excluir)
+# ===============================
+@API_BP.route("/chips/lote/<acao>", methods=["POST"])
+def lote(acao):
+    if acao not in ACOES_LOTE:
+        return erro(f"ação inválida: {acao}. Use: {', '.join(ACOES_LOTE)}", 404)
+    ids, motivo = ler_ids()
+    if motivo:
+        return erro(motivo)
+    evento = ACOES_LOTE[acao]
+    if evento is None:
+        afetados = repositorio.excluir(ids)
+    else:
+        afetados = repositorio.transicionar(ids, acoes.TRANSICOES[evento](), evento)
+    invalidar_cache()
+    return jsonify({"acao": acao, "solicitados": len(ids), "afetados": afetados})
+
+
+# ===============================
+# Alocação: entrega N chips disponíveis sem dupla atribuição
+# ===============================
+@API_BP.route("/chips/alocar", methods=["POST"])
+def alocar():
+    corpo = request.get_json(silent=True) or {}
+    quantidade = corpo.get("quantidade", 1)
+    if not isinstance(quantidade, int) or isinstance(quantidade, bool) or not 1 <= quantidade <= ALOCACAO_MAX:
+        return erro(f"'quantidade' deve ser um inteiro entre 1 e {ALOCACAO_MAX}")
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=ChipCursor)
+    chips = acoes.alocar(cur, quantidade, COLUNAS_API)
+    conn.commit()
+    conn.close()
+    if chips:
+        invalidar_cache()
+    return jsonify({"solicitados": quantidade, "alocados": len(chips), "chips": [chip_para_dict(c) for c in chips]})
+
+
+# ===============================
+# Analítico: lido das tabelas de resumo mantidas pelo agendador
+# ===============================
+@API_BP.route("/analitico")
+def analitico():
+    dias = min(max(request.args.get("dias", 30, type=int) or 30, 1), ANALITICO_DIAS_MAX)
+    conn = get_db()
+    resumo = ler_resumo(conn.cursor(), dias)
+    conn.close()
+    return jsonify(resumo)
+
+
+# ===============================
+# Frota: contagens e próximos vencimentos (índice em memória quando ligado)
+# ===============================
+@API_BP.route("/frota")
+def frota():
+    quantidade = min(max(request.args.get("quantidade", 5, type=int) or 5, 1), PROXIMOS_MAX)
+    if indice_frota.pronto:
+        return jsonify({"fonte": "indice", **indice_frota.resumo(quantidade)})
+    conn = get_db()
+    resumo = resumo_sql(conn.cursor(), quantidade)
+    conn.close()
+    return jsonify({"fonte": "sql", **resumo})
+
+@API_BP.route("/frota/verificar")
+def verificar_frota():
+    """Consistência do índice do worker que atendeu (o pid vem na resposta)"""
+    if not INDICE_FROTA:
+        return erro("índice da frota desligado (INDICE_FROTA=1)", 404)
+    if not indice_frota.pronto:
+        return erro("índice da frota ainda carregando", 503)
+    conn = get_db()
+    resultado = indice_frota.verificar(conn.cursor(), corrigir=request.args.get("corrigir") == "1")
+    conn.close()
+    return jsonify(resultado), 200 if resultado["consistente"] or resultado["corrigido"] else 409
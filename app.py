@@ -1,111 +1,95 @@
+import time
+INICIO_IMPORTACAO = time.perf_counter()
+
+import logging
 import os
-from flask import Flask, request, redirect, url_for, flash, render_template_string
+import re
+import sys
+import tempfile
+import json
+import urllib.error
+import urllib.request
+import click
 import psycopg2
-import pandas as pd
-import chardet
-from datetime import date, timedelta, datetime
+from flask import Flask, request, redirect, url_for, flash, render_template, jsonify, send_file, abort, \
+    Response, stream_template, stream_with_context
+from jinja2 import FileSystemBytecodeCache
+import acoes
+from api import API_BP
+from agendador import agendador
+from cache import resposta_cacheada, invalidar_cache, iniciar_invalidacao
+from db import get_db, pool_postgres
+import indice
+from metricas import instrumentar, exportar_prometheus
+from migracoes import MigracaoBloqueada, aplicar_migracoes, imprimir_status
+from modelos import COLUNAS_FORMULARIO, chip_de_dados
+from notificacoes import ouvinte, eventos_sse
+from repositorio import repositorio_postgres as repositorio
+from utilitarios import str_para_date, salvar_chip, normalizar_telefone
+from consultas import contexto_listagem, contexto_listagem_stream, buscar_alertas, formatar_alerta, ler_horizonte
+from exportacao import stream_export, FORMATOS_EXPORT
+from importacao import caminho_relatorio, MODOS_IMPORTACAO
+from jobs import executor, processar_pendentes, enfileirar_importacao, status_job, cancelar_job
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL","INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+log = logging.getLogger("chips")
+FIM_IMPORTACAO = time.perf_counter()
 
 app = Flask(__name__)
+instrumentar(app)
 app.secret_key = os.getenv("SECRET_KEY","chave_secreta_teste")
 
-# ===============================
-# Banco de Dados
-# ===============================
-def get_db():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST","localhost"),
-        port=os.getenv("DB_PORT","5432"),
-        database=os.getenv("DB_NAME","postgres"),
-        user=os.getenv("DB_USER","postgres"),
-        password=os.getenv("DB_PASSWORD","postgress")
-    )
-
-def init_db():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS chips (
-        id SERIAL PRIMARY KEY,
-        numero_chip VARCHAR(20) NOT NULL,
-        status VARCHAR(20) NOT NULL CHECK (status IN ('disponivel','banido','em_uso')),
-        ultima_utilizacao DATE,
-        primeira_recarga DATE,
-        proxima_recarga DATE,
-        proxima_utilizacao DATE,
-        data_banimento DATE,
-        observacoes TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    );
-    """)
-    conn.commit()
-    conn.close()
-
-init_db()
+# Templates vêm de templates/ e ficam compilados em memória; o bytecode vai para disco
+# para que workers novos (e o próximo deploy, se a pasta persistir) não recompilem
+PASTA_CACHE_TEMPLATES = os.getenv("TEMPLATES_CACHE", os.path.join(tempfile.gettempdir(), "chips_jinja_cache"))
+os.makedirs(PASTA_CACHE_TEMPLATES, exist_ok=True)
+app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(PASTA_CACHE_TEMPLATES)}
+app.register_blueprint(API_BP)
 
 # ===============================
-# Funções utilitárias
+# Inicialização
 # ===============================
-def ler_csv_auto(path):
-    with open(path,"rb") as f:
-        raw_data = f.read()
-        encoding = chardet.detect(raw_data)['encoding'] or 'utf-8'
+# O esquema não é mais criado aqui: cada worker subia abrindo conexão e rodando DDL.
+# As migrações rodam uma vez por deploy (release no Procfile, "flask migrar").
+#
+# As threads que usam o banco também não sobem no import: "flask migrar" e os outros
+# comandos importam este módulo, às vezes antes de as tabelas existirem. Quem atende
+# requisições chama iniciar_servicos(): o gunicorn no post_worker_init
+# (gunicorn.conf.py), o asgi.py no lifespan e o servidor de desenvolvimento no __main__.
+# encerrar_servicos() é o par no fim do worker (worker_exit / lifespan.shutdown).
+_servicos_pid = None
+
+def iniciar_servicos():
+    global _servicos_pid
+    if _servicos_pid == os.getpid():
+        return
+    _servicos_pid = os.getpid()
+    # DB_POOL_MIN conexões abertas antes da primeira requisição (já no processo do
+    # worker: o pool esquece as herdadas do pai). Banco fora do ar não impede o boot;
+    # as requisições conectam sob demanda.
     try:
-        return pd.read_csv(path, encoding=encoding)
-    except UnicodeDecodeError:
-        return pd.read_csv(path, encoding=encoding, errors="ignore")
-
-def str_para_date(valor):
-    if not valor:
-        return None
-    if isinstance(valor, date):
-        return valor
-    if isinstance(valor, str):
-        try:
-            return datetime.strptime(valor, "%Y-%m-%d").date()
-        except:
-            return None
-    return None
+        pool_postgres.aquecer()
+    except Exception:
+        log.exception("Não foi possível aquecer o pool PostgreSQL")
+    # Retoma importações que ficaram pendentes (ex.: enfileiradas antes de um restart)
+    executor().submit(processar_pendentes)
+    # AGENDADOR_INTERVALO=0 desliga a thread (ex.: quando as transições rodam via cron)
+    agendador.iniciar()
+    # INDICE_FROTA=1: contagens e próximos vencimentos em memória (carga em segundo plano)
+    indice.iniciar()
+    # Cache em memória: escritas dos outros workers chegam pelo NOTIFY e invalidam este
+    iniciar_invalidacao()
+
+def encerrar_servicos():
+    # Fecha as conexões ociosas do pool em vez de deixá-las cair com o processo
+    # (o PostgreSQL registra cada uma como "unexpected EOF")
+    pool_postgres.fechar_todas()
 
 # ===============================
 # Formulário Novo/Editar Chip
 # ===============================
 def form_chip(chip=None):
-    numero = chip[1] if chip else ""
-    status = chip[2] if chip else "disponivel"
-    ultima = chip[3] if chip else ""
-    primeira = chip[4] if chip else ""
-    proxima = chip[5] if chip else ""
-    observacoes = chip[8] if chip else ""
-    return render_template_string("""
-    <html>
-    <head>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    </head>
-    <body class="bg-dark text-light">
-    <div class="container mt-4">
-        <h2>{{ '✏️ Editar Chip' if chip else '➕ Novo Chip' }}</h2>
-        <form method="POST">
-            <div class="mb-3"><label>Número</label><input type="text" name="numero" class="form-control" value="{{ numero }}" required></div>
-            <div class="mb-3"><label>Status</label>
-                <select name="status" class="form-select" required>
-                    <option value="disponivel" {% if status=="disponivel" %}selected{% endif %}>Disponível</option>
-                    <option value="banido" {% if status=="banido" %}selected{% endif %}>Banido</option>
-                    <option value="em_uso" {% if status=="em_uso" %}selected{% endif %}>Em Uso</option>
-                </select>
-            </div>
-            <div class="mb-3"><label>Última Utilização</label><input type="date" name="ultima_utilizacao" class="form-control" value="{{ ultima }}"></div>
-            <div class="mb-3"><label>Primeira Recarga</label><input type="date" name="primeira_recarga" class="form-control" value="{{ primeira }}"></div>
-            <div class="mb-3"><label>Próxima Recarga</label><input type="date" name="proxima_recarga" class="form-control" value="{{ proxima }}"></div>
-            <div class="mb-3"><label>Observações</label><textarea name="observacoes" class="form-control">{{ observacoes }}</textarea></div>
-            <div class="d-flex gap-2">
-                <button type="submit" class="btn btn-success flex-fill">Salvar</button>
-                <a href="{{ url_for('listar_chips') }}" class="btn btn-secondary flex-fill">Cancelar</a>
-            </div>
-        </form>
-    </div>
-    </body>
-    </html>
-    """, chip=chip, numero=numero, status=status, ultima=ultima, primeira=primeira, proxima=proxima, observacoes=observacoes)
+    return render_template("chips_form.html", chip=chip)
 
 # ===============================
 # Dashboard / Listagem Chips
@@ -116,132 +100,93 @@ def index():
 
 @app.route("/chips")
 def listar_chips():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM chips ORDER BY id DESC")
-    chips_raw = cur.fetchall()
-    conn.close()
-
-    hoje = date.today()
-    alertas = []
-    chips_display = []
-
-    for c in chips_raw:
-        ultima_utilizacao = str_para_date(c[3])
-        primeira_recarga = str_para_date(c[4])
-        proxima_recarga = str_para_date(c[5])
-        proxima_utilizacao = str_para_date(c[6])
-        data_banimento = str_para_date(c[7])
-        row_class = ""
-
-        if c[2] == "banido":
-            row_class = "table-danger"
-            if proxima_utilizacao:
-                alertas.append(f"⏰ Chip {c[1]} poderá ser usado a partir de {proxima_utilizacao.strftime('%d/%m/%Y')}")
-        elif proxima_recarga and (proxima_recarga - hoje).days <= 5:
-            row_class = "table-warning"
-            alertas.append(f"🔔 Chip {c[1]} precisa de recarga em breve ({proxima_recarga.strftime('%d/%m/%Y')})")
-
-        chips_display.append({
-            "chip": c,
-            "row_class": row_class
-        })
-
-    template = """
-    <!DOCTYPE html>
-    <html lang="pt-br">
-    <head>
-        <meta charset="UTF-8">
-        <title>Dashboard Chips</title>
-        <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-        <style>
-            .btn-group .btn { min-width: 100px; }
-        </style>
-    </head>
-    <body class="bg-dark text-light">
-    <div class="container mt-4">
-        <h2>📱 Dashboard de Chips</h2>
-        {% for msg in alertas %}
-            <div class="alert alert-warning">{{ msg }}</div>
-        {% endfor %}
-        <div class="mb-3 d-flex gap-2">
-            <a href="{{ url_for('novo_chip') }}" class="btn btn-success">Novo Chip</a>
-            <a href="{{ url_for('importar_csv') }}" class="btn btn-info">Importar CSV</a>
-        </div>
-        <div class="table-responsive">
-        <table class="table table-dark table-hover align-middle text-center">
-            <thead>
-                <tr>
-                    <th>ID</th><th>Número</th><th>Status</th>
-                    <th>Última Utilização</th><th>Primeira Recarga</th>
-                    <th>Próxima Recarga</th><th>Próxima Utilização</th><th>Data Banimento</th><th>Ações</th>
-                </tr>
-            </thead>
-            <tbody>
-            {% for item in chips_display %}
-                <tr class="{{ item.row_class }}">
-                    <td>{{ item.chip[0] }}</td>
-                    <td>{{ item.chip[1] }}</td>
-                    <td>
-                        {% if item.chip[2]=="disponivel" %}
-                            <span class="badge bg-success">Disponível</span>
-                        {% elif item.chip[2]=="banido" %}
-                            <span class="badge bg-danger">Banido</span>
-                        {% else %}
-                            <span class="badge bg-warning text-dark">Em uso</span>
-                        {% endif %}
-                    </td>
-                    <td>{{ item.chip[3].strftime("%d/%m/%Y") if item.chip[3] else "-" }}</td>
-                    <td>{{ item.chip[4].strftime("%d/%m/%Y") if item.chip[4] else "-" }}</td>
-                    <td>{{ item.chip[5].strftime("%d/%m/%Y") if item.chip[5] else "-" }}</td>
-                    <td>
-                        {% if item.chip[2]=="banido" and item.chip[6] %}
-                            {{ item.chip[6].strftime("%d/%m/%Y") }}
-                        {% else %}
-                            -
-                        {% endif %}
-                    </td>
-                    <td>
-                        {% if item.chip[2]=="banido" and item.chip[7] %}
-                            {{ item.chip[7].strftime("%d/%m/%Y") }}
-                        {% else %}
-                            -
-                        {% endif %}
-                    </td>
-                    <td>
-                        <div class="btn-group" role="group">
-                            <a href="{{ url_for('editar_chip', id=item.chip[0]) }}" class="btn btn-primary" title="Editar chip">Editar</a>
-                            <a href="{{ url_for('banir_chip', id=item.chip[0]) }}" class="btn btn-danger" title="Banir chip">Banir</a>
-                            <a href="{{ url_for('desbanir_chip', id=item.chip[0]) }}" class="btn btn-success" title="Desbanir chip">Desbanir</a>
-                            <a href="{{ url_for('recarga_rapida', id=item.chip[0]) }}" class="btn btn-info" title="Recarga rápida">Recarga</a>
-                            <a href="{{ url_for('deletar_chip', id=item.chip[0]) }}" class="btn btn-secondary" title="Deletar chip">Deletar</a>
-                        </div>
-                    </td>
-                </tr>
-            {% endfor %}
-            </tbody>
-        </table>
-        </div>
-    </div>
-    </body>
-    </html>
+    if request.args.get("todos"):
+        # Todas as linhas do filtro, renderizadas à medida que o cursor nomeado avança
+        contexto = contexto_listagem_stream(get_db(), request.args)
+        return Response(stream_with_context(stream_template("chips_list.html", acoes_rapidas=True,
+                                                            ao_vivo=ouvinte.max_clientes > 0, **contexto)))
+    def gerar():
+        conn = get_db()
+        contexto = contexto_listagem(conn, request.args)
+        conn.close()
+        return render_template("chips_list.html", acoes_rapidas=True, ao_vivo=ouvinte.max_clientes > 0, **contexto)
+    return resposta_cacheada(f"listagem:{request.full_path}", gerar)
+
+@app.route("/chips/export")
+def exportar_chips():
+    formato = request.args.get("formato","csv")
+    if formato not in FORMATOS_EXPORT:
+        abort(400)
+    mimetype = FORMATOS_EXPORT[formato][0]
+    return Response(stream_export(request.args, formato), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=chips.{formato}"})
+
+
+@app.route("/chips/alertas")
+def listar_alertas():
+    dias = ler_horizonte(request.args)
+    def gerar():
+        conn = get_db()
+        cur = conn.cursor()
+        alertas = buscar_alertas(cur, dias)
+        conn.close()
+        return app.json.dumps([
+            {"tipo": tipo, "id": id, "numero_chip": numero, "data": data.isoformat(), "mensagem": formatar_alerta((tipo, id, numero, data))}
+            for tipo, id, numero, data in alertas
+        ])
+    return resposta_cacheada(f"alertas:{dias}", gerar, mimetype="application/json")
+
+@app.route("/chips/ao-vivo")
+def chips_ao_vivo():
+    """Server-sent events com as linhas alteradas (uma conexão LISTEN por worker).
+
+    Cada navegador conectado ocupa uma thread do worker enquanto a aba estiver aberta:
+    SSE_MAX_CLIENTES precisa ficar abaixo do --threads do gunicorn.
     """
-    return render_template_string(template, chips_display=chips_display, alertas=alertas)
+    fila = ouvinte.inscrever()
+    if fila is None:
+        abort(503)
+    return Response(eventos_sse(fila), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/agendador/status")
+def status_agendador():
+    return jsonify(agendador.metricas())
 
+@app.route("/db/pool")
+def status_pool():
+    return jsonify(pool_postgres.metricas())
+
+@app.route("/metrics")
+def metrics():
+    """Formato texto do Prometheus; valores por worker (o scrape deve identificar o processo)"""
+    pool = pool_postgres.metricas()
+    ag = agendador.metricas()
+    sse = ouvinte.metricas()
+    frota = indice.indice_frota.metricas()
+    extras = [
+        ("chips_pool_conexoes", "gauge", "Conexões do pool PostgreSQL",
+         {(("estado", "em_uso"),): pool["em_uso"], (("estado", "livres"),): pool["livres"]}),
+        ("chips_pool_espera_timeouts_total", "counter", "Pedidos de conexão que estouraram o timeout",
+         {(): pool["timeouts"]}),
+        ("chips_pool_espera_segundos_total", "counter", "Tempo total esperando conexão do pool",
+         {(): pool["espera_total_s"]}),
+        ("chips_inicializacao_segundos", "gauge", "Tempo de inicialização deste worker por etapa",
+         {(("etapa", etapa),): segundos for etapa, segundos in TEMPOS_INICIALIZACAO.items()}),
+        ("chips_sse_clientes", "gauge", "Navegadores conectados em /chips/ao-vivo", {(): sse["clientes"]}),
+        ("chips_sse_descartados_total", "counter", "Clientes SSE lentos mandados recarregar",
+         {(): sse["descartados"]}),
+        ("chips_indice_frota_chips", "gauge", "Chips no índice em memória deste worker", {(): frota["chips"]}),
+        ("chips_indice_frota_carregamentos_total", "counter", "Cargas completas do índice da frota",
+         {(): frota["carregamentos"]}),
+        ("chips_agendador_linhas_total", "counter", "Linhas alteradas pelas regras do agendador",
+         {(("regra", regra),): n for regra, n in ag["totais"].items()}),
+    ]
+    return Response(exportar_prometheus(extras), mimetype="text/plain; version=0.0.4")
 
 # ===============================
 # CRUD e Ações
 # ===============================
-def salvar_chip(numero, status, ultima, primeira, proxima, obs):
-    """Calcula datas corretamente e retorna tupla pronta para INSERT/UPDATE"""
-    if status=="banido":
-        data_banimento = date.today()
-        proxima_utilizacao = data_banimento + timedelta(days=1)
-    else:
-        data_banimento = None
-        proxima_utilizacao = None
-    return (numero,status,ultima,primeira,proxima,proxima_utilizacao,data_banimento,obs)
-
 @app.route("/chips/novo", methods=["GET","POST"])
 def novo_chip():
     if request.method=="POST":
@@ -253,22 +198,21 @@ def novo_chip():
             str_para_date(request.form.get("proxima_recarga")),
             request.form.get("observacoes")
         )
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO chips (numero_chip,status,ultima_utilizacao,primeira_recarga,proxima_recarga,
-            proxima_utilizacao,data_banimento,observacoes) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-        """,data)
-        conn.commit()
-        conn.close()
+        if not normalizar_telefone(data[0]):
+            flash("O número do chip precisa ter dígitos.", "danger")
+            return form_chip()
+        try:
+            repositorio.inserir(data)
+        except psycopg2.IntegrityError:
+            flash(f"Já existe um chip com o número {data[0]}.", "danger")
+            return form_chip()
+        invalidar_cache()
         flash("Chip adicionado!", "success")
         return redirect(url_for("listar_chips"))
     return form_chip()
 
 @app.route("/chips/editar/<int:id>", methods=["GET","POST"])
 def editar_chip(id):
-    conn = get_db()
-    cur = conn.cursor()
     if request.method=="POST":
         data = salvar_chip(
             request.form["numero"],
@@ -278,67 +222,47 @@ def editar_chip(id):
             str_para_date(request.form.get("proxima_recarga")),
             request.form.get("observacoes")
         )
-        cur.execute("""
-            UPDATE chips SET numero_chip=%s,status=%s,ultima_utilizacao=%s,primeira_recarga=%s,proxima_recarga=%s,
-            proxima_utilizacao=%s,data_banimento=%s,observacoes=%s WHERE id=%s
-        """, data + (id,))
-        conn.commit()
-        conn.close()
+        if not normalizar_telefone(data[0]):
+            flash("O número do chip precisa ter dígitos.", "danger")
+            return form_chip(chip_de_dados(id, data))
+        try:
+            repositorio.atualizar(id, data)
+        except psycopg2.IntegrityError:
+            flash(f"Já existe outro chip com o número {data[0]}.", "danger")
+            return form_chip(chip_de_dados(id, data))
+        invalidar_cache()
         flash("Chip atualizado!", "success")
         return redirect(url_for("listar_chips"))
     else:
-        cur.execute("SELECT * FROM chips WHERE id=%s",(id,))
-        chip = cur.fetchone()
-        conn.close()
-        return form_chip(chip)
+        return form_chip(repositorio.obter(id, COLUNAS_FORMULARIO))
+
+def aplicar_transicao(evento, id):
+    """Transição nomeada (acoes.TRANSICOES) num chip, com o evento no histórico"""
+    repositorio.transicionar([id], acoes.TRANSICOES[evento](), evento)
+    invalidar_cache()
 
 @app.route("/chips/deletar/<int:id>")
 def deletar_chip(id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM chips WHERE id=%s",(id,))
-    conn.commit()
-    conn.close()
+    repositorio.excluir([id])
+    invalidar_cache()
     flash("Chip deletado!", "danger")
     return redirect(url_for("listar_chips"))
 
 @app.route("/chips/banir/<int:id>")
 def banir_chip(id):
-    hoje = date.today()
-    proxima_utilizacao = hoje + timedelta(days=1)
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE chips SET status='banido', data_banimento=%s, proxima_utilizacao=%s WHERE id=%s
-    """,(hoje,proxima_utilizacao,id))
-    conn.commit()
-    conn.close()
+    aplicar_transicao("banimento", id)
     flash("Chip banido!", "warning")
     return redirect(url_for("listar_chips"))
 
 @app.route("/chips/desbanir/<int:id>")
 def desbanir_chip(id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE chips SET status='disponivel', data_banimento=NULL, proxima_utilizacao=NULL WHERE id=%s
-    """,(id,))
-    conn.commit()
-    conn.close()
+    aplicar_transicao("desbanimento", id)
     flash("Chip desbanido!", "success")
     return redirect(url_for("listar_chips"))
 
 @app.route("/chips/recarga/<int:id>")
 def recarga_rapida(id):
-    hoje = date.today()
-    proxima_recarga = hoje + timedelta(days=30)
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("""
-        UPDATE chips SET ultima_utilizacao=%s, proxima_recarga=%s, status='em_uso' WHERE id=%s
-    """,(hoje,proxima_recarga,id))
-    conn.commit()
-    conn.close()
+    aplicar_transicao("recarga", id)
     flash("Recarga rápida aplicada!", "info")
     return redirect(url_for("listar_chips"))
 
@@ -347,45 +271,124 @@ def importar_csv():
     if request.method=="POST":
         f = request.files.get("csv_file")
         if f:
-            df = ler_csv_auto(f)
-            conn = get_db()
-            cur = conn.cursor()
-            for _, row in df.iterrows():
-                data = salvar_chip(
-                    row.get("numero_chip"),
-                    row.get("status","disponivel").lower(),
-                    str_para_date(row.get("ultima_utilizacao")),
-                    str_para_date(row.get("primeira_recarga")),
-                    str_para_date(row.get("proxima_recarga")),
-                    row.get("observacoes")
-                )
-                try:
-                    cur.execute("""
-                        INSERT INTO chips (numero_chip,status,ultima_utilizacao,
-                        primeira_recarga,proxima_recarga,proxima_utilizacao,data_banimento,observacoes)
-                        VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-                    """, data)
-                except Exception as e:
-                    print("Erro CSV:", e)
-            conn.commit()
-            conn.close()
-            flash("CSV importado com sucesso!", "success")
-            return redirect(url_for("listar_chips"))
-    return render_template_string("""
-    <html><head>
-    <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css" rel="stylesheet">
-    </head><body class="bg-dark text-light">
-    <div class="container mt-4">
-        <h2>📂 Importar CSV</h2>
-        <form method="POST" enctype="multipart/form-data">
-            <div class="mb-3">
-                <input type="file" name="csv_file" class="form-control" accept=".csv" required>
-            </div>
-            <button type="submit" class="btn btn-info">Importar</button>
-            <a href="{{ url_for('listar_chips') }}" class="btn btn-secondary">Cancelar</a>
-        </form>
-    </div></body></html>
-    """)
+            modo = request.form.get("modo","inserir")
+            if modo not in MODOS_IMPORTACAO:
+                modo = "inserir"
+            job_id = enfileirar_importacao(f.stream, f.filename, modo)
+            flash("Importação enviada para processamento.", "info")
+            return redirect(url_for("acompanhar_importacao", job_id=job_id))
+    return render_template("chips_importar.html")
+
+@app.route("/chips/importar/<int:job_id>")
+def acompanhar_importacao(job_id):
+    job = status_job(job_id)
+    if job is None:
+        abort(404)
+    return render_template("chips_importacao.html", job=job)
+
+@app.route("/chips/importar/jobs/<int:job_id>")
+def status_importacao(job_id):
+    job = status_job(job_id)
+    if job is None:
+        abort(404)
+    return jsonify(job)
+
+@app.route("/chips/importar/jobs/<int:job_id>/cancelar", methods=["POST"])
+def cancelar_importacao(job_id):
+    if cancelar_job(job_id):
+        flash("Cancelamento solicitado.", "warning")
+    else:
+        flash("Importação já finalizada.", "secondary")
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(status_job(job_id))
+    return redirect(url_for("acompanhar_importacao", job_id=job_id))
+
+@app.route("/chips/importar/relatorio/<relatorio_id>")
+def relatorio_importacao(relatorio_id):
+    if not re.fullmatch(r"[0-9a-f]{32}", relatorio_id) or not os.path.exists(caminho_relatorio(relatorio_id)):
+        abort(404)
+    return send_file(caminho_relatorio(relatorio_id), mimetype="text/csv", as_attachment=True,
+                     download_name=f"rejeitados_{relatorio_id}.csv")
+
+# ===============================
+# Pré-compilação dos templates
+# ===============================
+def precompilar_templates():
+    """Compila todos os templates de uma vez, para o primeiro request após o deploy não pagar isso"""
+    nomes = app.jinja_env.list_templates(extensions=["html"])
+    for nome in nomes:
+        app.jinja_env.get_template(nome)
+    return nomes
+
+@app.cli.command("precompilar-templates")
+def precompilar_templates_cmd():
+    nomes = precompilar_templates()
+    print(f"{len(nomes)} templates compilados em {PASTA_CACHE_TEMPLATES}")
+
+@app.cli.command("migrar")
+@click.option("--status", is_flag=True, help="Só lista as versões pendentes")
+def migrar_cmd(status):
+    """Aplica as migrações pendentes do esquema (uma vez por deploy)"""
+    if status:
+        imprimir_status()
+        return
+    try:
+        aplicadas = aplicar_migracoes()
+    except MigracaoBloqueada as e:
+        raise click.ClickException(str(e))
+    for versao, descricao, ms in aplicadas:
+        print(f"{versao}: {descricao} ({ms} ms)")
+
+@app.cli.command("verificar-indice")
+@click.option("--url", default="http://127.0.0.1:8000", show_default=True, help="Servidor em execução")
+@click.option("--vezes", default=8, show_default=True, help="Requisições (cada uma cai num worker)")
+@click.option("--corrigir", is_flag=True, help="Recarrega o índice dos workers divergentes")
+def verificar_indice_cmd(url, vezes, corrigir):
+    """Compara o índice da frota de cada worker com o banco"""
+    endereco = f"{url.rstrip('/')}/api/frota/verificar" + ("?corrigir=1" if corrigir else "")
+    por_pid = {}
+    for _ in range(vezes):
+        try:
+            resposta = urllib.request.urlopen(endereco, timeout=30)
+        except urllib.error.HTTPError as e:
+            resposta = e  # 409 (divergente) e 503 (carregando) também trazem JSON
+        resultado = json.load(resposta)
+        if "pid" in resultado:
+            por_pid.setdefault(resultado["pid"], resultado)  # o primeiro de cada worker: antes de corrigir
+        else:
+            print(resultado.get("erro"))
+    for pid, resultado in sorted(por_pid.items()):
+        estado = "ok" if resultado["consistente"] else ("corrigido" if resultado["corrigido"] else "DIVERGENTE")
+        print(f"worker {pid}: {estado} ({resultado['chips_indice']} no índice, {resultado['chips_banco']} no banco) "
+              f"{'' if resultado['consistente'] else resultado['totais']}")
+    if any(not r["consistente"] and not r["corrigido"] for r in por_pid.values()):
+        sys.exit(1)
+
+@app.cli.command("executar-transicoes")
+def executar_transicoes_cmd():
+    """Roda as regras do agendador uma vez (para uso via cron)"""
+    print(agendador.executar())
+
+if os.getenv("PRECOMPILAR_TEMPLATES") == "1":
+    precompilar_templates()
+
+# ===============================
+# Relatório de inicialização
+# ===============================
+# Custo de cold start por worker: importações (pandas/chardet só entram na primeira
+# importação de CSV) e montagem do app. Vai para o log e para o /metrics.
+FIM_INICIALIZACAO = time.perf_counter()
+TEMPOS_INICIALIZACAO = {
+    "importacoes": round(FIM_IMPORTACAO - INICIO_IMPORTACAO, 4),
+    "app": round(FIM_INICIALIZACAO - FIM_IMPORTACAO, 4),
+    "total": round(FIM_INICIALIZACAO - INICIO_IMPORTACAO, 4),
+}
+log.info("Worker %s pronto em %.0f ms (importações %.0f ms, app %.0f ms, %d módulos carregados, pandas=%s)",
+         os.getpid(), TEMPOS_INICIALIZACAO["total"] * 1000, TEMPOS_INICIALIZACAO["importacoes"] * 1000,
+         TEMPOS_INICIALIZACAO["app"] * 1000, len(sys.modules), "pandas" in sys.modules)
 
 if __name__=="__main__":
+    # Servidor de desenvolvimento: aplica as migrações antes de subir
+    aplicar_migracoes()
+    iniciar_servicos()
     app.run(debug=True)
@@ -0,0 +1,185 @@
+# asgi.py
+"""Modo async (opcional): entrada ASGI com asyncpg para as rotas de leitura mais chamadas.
+
+As rotas de polling do dashboard (/api/chips, /api/chips/<id>, /chips/alertas) são
+atendidas direto no event loop, com pool asyncpg próprio: um worker mantém muitas
+requisições em andamento enquanto espera o banco. Todo o resto (telas, escrita,
+importação, exportação) continua no app Flask, executado em threads pelo adaptador
+WSGI do uvicorn, com o pool psycopg2 de sempre.
+
+Execução (pip install uvicorn asyncpg):
+
+    # 1 processo, desenvolvimento
+    uvicorn asgi:app --port 8000
+    # produção: gunicorn gerenciando workers uvicorn (substitui "gunicorn app:app" no Procfile)
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker -w 2 -b 0.0.0.0:$PORT
+
+Com workers async, poucos processos bastam (1 a 2 por CPU). ASYNC_POOL_MAX é por
+worker; DB_POOL_MAX continua valendo para as rotas Flask do mesmo worker, e a soma de
+todos os workers deve caber no max_connections do PostgreSQL.
+
+Comparação com o modo sync: python -m benchmarks.carga --app asgi:app
+--classe-worker uvicorn.workers.UvicornWorker (e o mesmo sem as duas opções).
+"""
+import asyncio
+import os
+import re
+import time
+from datetime import date, datetime
+from urllib.parse import parse_qsl
+
+import asyncpg
+from uvicorn.middleware.wsgi import WSGIMiddleware
+
+from app import app as app_flask, encerrar_servicos, iniciar_servicos
+from cache import CacheMemoria, cache, chave_atual, guardar
+from consultas import SQL_ALERTAS, ALERTAS_MAX, ler_horizonte, formatar_alerta
+from api import COLUNAS_API
+from metricas import registro, registrar_consulta
+from repositorio import fatiar_pagina, repositorio_postgres
+
+ASYNC_POOL_MIN = int(os.getenv("ASYNC_POOL_MIN","1"))
+ASYNC_POOL_MAX = int(os.getenv("ASYNC_POOL_MAX","20"))
+ASYNC_WSGI_THREADS = int(os.getenv("ASYNC_WSGI_THREADS","10"))
+
+_pool = None
+wsgi = WSGIMiddleware(app_flask, workers=ASYNC_WSGI_THREADS)
+
+
+async def pool():
+    # Criado no primeiro uso (ou no lifespan) dentro do event loop do worker
+    global _pool
+    if _pool is None:
+        _pool = await asyncpg.create_pool(
+            host=os.getenv("DB_HOST","localhost"),
+            port=int(os.getenv("DB_PORT","5432")),
+            database=os.getenv("DB_NAME","postgres"),
+            user=os.getenv("DB_USER","postgres"),
+            password=os.getenv("DB_PASSWORD","postgress"),
+            min_size=ASYNC_POOL_MIN,
+            max_size=ASYNC_POOL_MAX,
+        )
+    return _pool
+
+def para_asyncpg(sql):
+    """Mesmo SQL das consultas síncronas, com os %s trocados por $1, $2..."""
+    contador = iter(range(1, 10_000))
+    return re.sub(r"%s", lambda _: f"${next(contador)}", sql)
+
+def _json(corpo):
+    # Mesmo formato do jsonify (compacto) das rotas Flask
+    return app_flask.json.dumps(corpo, separators=(",", ":"))
+
+async def _cache(funcao, *args):
+    # O Redis é síncrono: fora do event loop, para uma ida à rede não travar as outras
+    # requisições do worker. O LRU em memória responde na hora e roda direto.
+    if isinstance(cache, CacheMemoria):
+        return funcao(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, funcao, *args)
+
+async def _consultar(medicao, metodo, sql, *params):
+    """fetch/fetchrow no pool asyncpg, com a mesma contabilidade do CursorMedido"""
+    inicio = time.perf_counter()
+    resultado = await getattr(await pool(), metodo)(sql, *params)
+    duracao = time.perf_counter() - inicio
+    registrar_consulta(sql, params, duracao)  # fora do app context: só o log de lentas
+    medicao["db"] += duracao
+    medicao["consultas"] += 1
+    medicao["linhas"] += len(resultado) if isinstance(resultado, list) else int(resultado is not None)
+    return resultado
+
+def _chip_para_dict(linha):
+    return {coluna: valor.isoformat() if isinstance(valor, (date, datetime)) else valor
+            for coluna, valor in linha.items()}
+
+
+# ===============================
+# Rotas async
+# ===============================
+async def listar_chips(args, medicao):
+    sql, params, por_pagina = repositorio_postgres.sql_pagina(args, COLUNAS_API)
+    linhas = await _consultar(medicao, "fetch", para_asyncpg(sql), *params)
+    linhas, proximo = fatiar_pagina(linhas, por_pagina)
+    return 200, _json({"chips": [_chip_para_dict(linha) for linha in linhas], "proximo": proximo}), None
+
+async def obter_chip(args, medicao, id):
+    linha = await _consultar(medicao, "fetchrow", f"SELECT {','.join(COLUNAS_API)} FROM chips WHERE id=$1", int(id))
+    if linha is None:
+        return 404, _json({"erro": "chip não encontrado"}), None
+    return 200, _json(_chip_para_dict(linha)), None
+
+async def listar_alertas(args, medicao):
+    # Mesma chave e mesmo corpo da rota Flask: os dois modos compartilham o cache
+    dias = ler_horizonte(args)
+    chave = await _cache(chave_atual, f"alertas:{dias}")
+    item = await _cache(cache.get, chave)
+    if item is None:
+        alertas = await _consultar(medicao, "fetch", para_asyncpg(SQL_ALERTAS), ALERTAS_MAX, dias, ALERTAS_MAX)
+        item = await _cache(guardar, chave, app_flask.json.dumps([
+            {"tipo": tipo, "id": id, "numero_chip": numero, "data": data.isoformat(),
+             "mensagem": formatar_alerta((tipo, id, numero, data))}
+            for tipo, id, numero, data in alertas
+        ]))
+    corpo, etag = item
+    return 200, corpo, etag
+
+ROTAS = (
+    (re.compile(r"^/api/chips$"), "/api/chips", listar_chips),
+    (re.compile(r"^/api/chips/(\d+)$"), "/api/chips/<int:id>", obter_chip),
+    (re.compile(r"^/chips/alertas$"), "/chips/alertas", listar_alertas),
+)
+
+
+# ===============================
+# Aplicação ASGI
+# ===============================
+async def _lifespan(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem["type"] == "lifespan.startup":
+            iniciar_servicos()
+            await pool()
+            await send({"type": "lifespan.startup.complete"})
+        elif mensagem["type"] == "lifespan.shutdown":
+            if _pool is not None:
+                await _pool.close()
+            encerrar_servicos()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+def _cabecalho(scope, nome):
+    for chave, valor in scope["headers"]:
+        if chave == nome:
+            return valor.decode("latin-1")
+    return None
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+    if scope["type"] == "http" and scope["method"] in ("GET", "HEAD"):
+        for padrao, rota, view in ROTAS:
+            encontrado = padrao.match(scope["path"])
+            if encontrado:
+                return await _atender(scope, send, rota, view, encontrado.groups())
+    return await wsgi(scope, receive, send)
+
+async def _atender(scope, send, rota, view, grupos):
+    inicio = time.perf_counter()
+    medicao = {"db": 0.0, "consultas": 0, "linhas": 0}
+    args = dict(parse_qsl(scope["query_string"].decode("latin-1")))
+    status, corpo, etag = await view(args, medicao, *grupos)
+
+    cabecalhos = [(b"content-type", b"application/json")]
+    if etag:
+        cabecalhos += [(b"etag", f'"{etag}"'.encode()), (b"cache-control", b"no-cache")]
+        if _cabecalho(scope, b"if-none-match") == f'"{etag}"':
+            status, corpo = 304, ""
+    total = time.perf_counter() - inicio
+    cabecalhos.append((b"server-timing", f"db;dur={medicao['db'] * 1000:.1f}, total;dur={total * 1000:.1f}".encode()))
+    registro.registrar_requisicao(rota, scope["method"], status, total, medicao["db"], 0.0,
+                                  medicao["consultas"], medicao["linhas"])
+
+    dados = corpo.encode("utf-8") if scope["method"] == "GET" else b""
+    cabecalhos.append((b"content-length", str(len(corpo.encode("utf-8"))).encode()))
+    await send({"type": "http.response.start", "status": status, "headers": cabecalhos})
+    await send({"type": "http.response.body", "body": dados})
@@ -0,0 +1,127 @@
+# benchmarks/carga.py
+"""Teste de carga HTTP: sobe o gunicorn local (ou usa --url) e mede latência e vazão.
+
+    python -m benchmarks.carga [--duracao 30] [--concorrencia 16] [--workers 4] [--threads 4]
+    python -m benchmarks.carga --url http://servidor:8000 --rotas /chips /api/chips
+
+Cada cliente mantém uma conexão keep-alive e percorre as rotas em ciclo. Reporta
+p50/p95/p99 e requisições por segundo por rota e no total; grava
+benchmarks/resultados/<data>-carga.json.
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.comum import resumir, salvar_resultado, imprimir
+
+ROTAS_PADRAO = ("/chips", "/chips?status=banido", "/chips?numero=119", "/chips/alertas", "/api/chips")
+
+
+def subir_gunicorn(porta, workers, threads, classe_worker=None, app="app:app"):
+    comando = [sys.executable, "-m", "gunicorn", app, "-b", f"127.0.0.1:{porta}",
+               "-w", str(workers), "--threads", str(threads), "--log-level", "warning"]
+    if classe_worker:
+        comando += ["-k", classe_worker]
+    processo = subprocess.Popen(comando, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # Espera o bind (importação do app + aquecimento dos workers)
+    limite = time.monotonic() + 60
+    while time.monotonic() < limite:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", porta, timeout=2)
+            conn.request("GET", "/db/pool")
+            conn.getresponse().read()
+            conn.close()
+            return processo
+        except OSError:
+            if processo.poll() is not None:
+                raise RuntimeError("gunicorn encerrou durante a inicialização")
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError("gunicorn não respondeu em 60s")
+
+def cliente(host, porta, rotas, fim, latencias, erros, lock):
+    conn = http.client.HTTPConnection(host, porta, timeout=30)
+    locais = {rota: [] for rota in rotas}
+    falhas = {rota: 0 for rota in rotas}
+    i = 0
+    while time.monotonic() < fim:
+        rota = rotas[i % len(rotas)]
+        i += 1
+        inicio = time.perf_counter()
+        try:
+            conn.request("GET", rota)
+            resposta = conn.getresponse()
+            resposta.read()
+            ok = resposta.status < 400
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, porta, timeout=30)
+            ok = False
+        if ok:
+            locais[rota].append(time.perf_counter() - inicio)
+        else:
+            falhas[rota] += 1
+    conn.close()
+    with lock:
+        for rota in rotas:
+            latencias[rota].extend(locais[rota])
+            erros[rota] += falhas[rota]
+
+def executar_carga(url, rotas, duracao, concorrencia):
+    partes = urlsplit(url)
+    latencias = {rota: [] for rota in rotas}
+    erros = {rota: 0 for rota in rotas}
+    lock = threading.Lock()
+    fim = time.monotonic() + duracao
+    inicio = time.monotonic()
+    threads = [threading.Thread(target=cliente, args=(partes.hostname, partes.port or 80, list(rotas), fim,
+                                                      latencias, erros, lock))
+               for _ in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    decorrido = time.monotonic() - inicio
+
+    resultados = {}
+    for rota in rotas:
+        resultados[rota] = resumir(latencias[rota], decorrido)
+        resultados[rota]["erros"] = erros[rota]
+    resultados["total"] = resumir([l for ls in latencias.values() for l in ls], decorrido)
+    resultados["total"]["erros"] = sum(erros.values())
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="servidor já em execução (senão sobe o gunicorn local)")
+    parser.add_argument("--rotas", nargs="+", default=list(ROTAS_PADRAO))
+    parser.add_argument("--duracao", type=float, default=30)
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--porta", type=int, default=8099)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--classe-worker", help="-k do gunicorn (ex.: uvicorn.workers.UvicornWorker)")
+    parser.add_argument("--app", default="app:app")
+    args = parser.parse_args()
+
+    processo = None
+    url = args.url
+    if not url:
+        processo = subir_gunicorn(args.porta, args.workers, args.threads, args.classe_worker, args.app)
+        url = f"http://127.0.0.1:{args.porta}"
+    try:
+        resultados = executar_carga(url, args.rotas, args.duracao, args.concorrencia)
+    finally:
+        if processo:
+            processo.terminate()
+            processo.wait()
+    imprimir(resultados)
+    print(salvar_resultado("carga", vars(args), resultados))
+
+if __name__ == "__main__":
+    main()
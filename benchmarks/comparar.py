@@ -0,0 +1,36 @@
+# benchmarks/comparar.py
+"""Compara dois resultados (antes/depois) do mesmo tipo.
+
+    python -m benchmarks.comparar benchmarks/resultados/A.json benchmarks/resultados/B.json
+"""
+import argparse
+import json
+
+
+def variacao(antes, depois):
+    if antes in (None, 0) or depois is None:
+        return "-"
+    return f"{(depois - antes) / antes * 100:+.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("antes")
+    parser.add_argument("depois")
+    args = parser.parse_args()
+
+    with open(args.antes, encoding="utf-8") as f:
+        antes = json.load(f)
+    with open(args.depois, encoding="utf-8") as f:
+        depois = json.load(f)
+    print(f"{antes['ambiente']['commit']} -> {depois['ambiente']['commit']} ({antes['tipo']})")
+    for nome, d in depois["resultados"].items():
+        a = antes["resultados"].get(nome)
+        if a is None:
+            print(f"{nome:<32} (novo)")
+            continue
+        print(f"{nome:<32} p50 {a['p50_ms']} -> {d['p50_ms']}ms ({variacao(a['p50_ms'], d['p50_ms'])})  "
+              f"p99 {a['p99_ms']} -> {d['p99_ms']}ms ({variacao(a['p99_ms'], d['p99_ms'])})  "
+              f"{a['por_segundo']} -> {d['por_segundo']}/s ({variacao(a['por_segundo'], d['por_segundo'])})")
+
+if __name__ == "__main__":
+    main()
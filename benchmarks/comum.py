@@ -0,0 +1,93 @@
+# benchmarks/comum.py
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+PASTA_RESULTADOS = os.getenv("BENCH_RESULTADOS", os.path.join(os.path.dirname(__file__), "resultados"))
+
+
+def exigir_banco_descartavel(argumento):
+    """Para antes de escrever no banco configurado (DB_*) se ele não foi declarado
+    descartável: com BENCH_DB=1 no ambiente ou `argumento` (--banco-descartavel) ligado"""
+    if argumento or os.getenv("BENCH_DB") == "1":
+        return
+    sys.exit(f"Este benchmark grava e apaga chips no banco {os.getenv('DB_NAME','postgres')} "
+             f"em {os.getenv('DB_HOST','localhost')}. Use um banco só para benchmark e confirme com "
+             f"--banco-descartavel ou BENCH_DB=1.")
+
+def adicionar_opcao_banco(parser):
+    parser.add_argument("--banco-descartavel", action="store_true",
+                        help="confirma que o banco DB_* pode receber e perder dados de teste (ou BENCH_DB=1)")
+
+def percentil(ordenados, p):
+    """Percentil por interpolação linear de uma lista já ordenada"""
+    if not ordenados:
+        return None
+    k = (len(ordenados) - 1) * p / 100
+    i = int(k)
+    if i + 1 >= len(ordenados):
+        return ordenados[-1]
+    return ordenados[i] + (ordenados[i + 1] - ordenados[i]) * (k - i)
+
+def resumir(latencias_s, duracao_s=None):
+    """p50/p95/p99 em ms e vazão; `duracao_s` é o tempo de parede (padrão: soma das latências)"""
+    ordenados = sorted(latencias_s)
+    duracao_s = duracao_s if duracao_s is not None else sum(ordenados)
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "n": len(ordenados),
+        "media_ms": ms(sum(ordenados) / len(ordenados)) if ordenados else None,
+        "p50_ms": ms(percentil(ordenados, 50)),
+        "p95_ms": ms(percentil(ordenados, 95)),
+        "p99_ms": ms(percentil(ordenados, 99)),
+        "max_ms": ms(ordenados[-1]) if ordenados else None,
+        "por_segundo": round(len(ordenados) / duracao_s, 1) if duracao_s else None,
+    }
+
+def medir(funcao, repeticoes, aquecimento=3):
+    """Executa `funcao` e devolve o resumo das latências de cada chamada"""
+    for _ in range(aquecimento):
+        funcao()
+    latencias = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        latencias.append(time.perf_counter() - inicio)
+    return resumir(latencias)
+
+def ambiente():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def salvar_resultado(tipo, parametros, resultados):
+    """Grava em PASTA_RESULTADOS/<data>-<tipo>.json (mesmo formato para comparar.py)"""
+    os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+    agora = datetime.now()
+    caminho = os.path.join(PASTA_RESULTADOS, f"{agora:%Y%m%d-%H%M%S}-{tipo}.json")
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump({
+            "tipo": tipo,
+            "data": agora.isoformat(timespec="seconds"),
+            "ambiente": ambiente(),
+            "parametros": parametros,
+            "resultados": resultados,
+        }, f, indent=2, ensure_ascii=False)
+    return caminho
+
+def imprimir(resultados):
+    for nome, r in resultados.items():
+        print(f"{nome:<32} n={r['n']:<7} p50={r['p50_ms']}ms p95={r['p95_ms']}ms p99={r['p99_ms']}ms "
+              f"{r['por_segundo']}/s")
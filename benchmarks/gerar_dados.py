@@ -0,0 +1,119 @@
+# benchmarks/gerar_dados.py
+"""Popula a tabela chips com N chips sintéticos (COPY em blocos, memória constante).
+
+    python -m benchmarks.gerar_dados 100000 --banco-descartavel [--limpar] [--semente 42]
+    python -m benchmarks.gerar_dados 100000 --csv arquivo.csv
+
+Com --csv grava o mesmo tipo de dado num CSV de importação em vez de ir ao banco.
+Para ir ao banco (DB_*) é preciso --banco-descartavel ou BENCH_DB=1: --limpar apaga
+a tabela chips inteira.
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.comum import exigir_banco_descartavel, adicionar_opcao_banco
+from utilitarios import DIAS_BANIMENTO, DIAS_RECARGA
+
+# Distribuição aproximada de uma frota em operação
+PESOS_STATUS = (("em_uso", 0.6), ("disponivel", 0.3), ("banido", 0.1))
+COLUNAS = ("numero_chip","status","ultima_utilizacao","primeira_recarga","proxima_recarga",
+           "proxima_utilizacao","data_banimento","observacoes")
+# DDD 99 fica fora: é o usado pelos arquivos do benchmark de importação
+DDDS = [d for d in range(11, 99) if d % 10]
+FORMATOS_NUMERO = ("{ddd}9{a}{b}", "({ddd}) 9 {a}-{b}", "{ddd} 9{a}-{b}")
+TAMANHO_BLOCO = 50000
+
+
+def gerar_chips(n, semente=42, ddds=DDDS, hoje=None):
+    """Gera n tuplas em COLUNAS, com números únicos e datas coerentes com o status"""
+    rnd = random.Random(semente)
+    hoje = hoje or date.today()
+    status, pesos = zip(*PESOS_STATUS)
+    # Números únicos sem guardar um set: i percorre um intervalo, embaralhado por DDD
+    por_ddd = -(-n // len(ddds))
+    passo = 99_999_999 // max(por_ddd, 1)
+    for i in range(n):
+        ddd = ddds[i % len(ddds)]
+        sufixo = (i // len(ddds)) * passo + rnd.randrange(passo)
+        a, b = divmod(sufixo, 10_000)
+        numero = rnd.choice(FORMATOS_NUMERO).format(ddd=ddd, a=f"{a:04d}", b=f"{b:04d}")
+
+        st = rnd.choices(status, pesos)[0]
+        primeira = hoje - timedelta(days=rnd.randint(30, 720))
+        ultima = hoje - timedelta(days=rnd.randint(0, 45))
+        proxima = ultima + timedelta(days=DIAS_RECARGA)
+        banimento = proxima_utilizacao = None
+        if st == "banido":
+            banimento = hoje - timedelta(days=rnd.randint(0, 3))
+            proxima_utilizacao = banimento + timedelta(days=DIAS_BANIMENTO)
+        obs = "lote sintético" if rnd.random() < 0.1 else None
+        yield (numero, st, ultima, primeira, proxima, proxima_utilizacao, banimento, obs)
+
+def copiar(conn, linhas):
+    cur = conn.cursor()
+    total = 0
+    bloco = []
+
+    def enviar():
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerows(["" if v is None else v for v in linha] for linha in bloco)
+        buffer.seek(0)
+        cur.copy_expert(f"COPY chips ({','.join(COLUNAS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= TAMANHO_BLOCO:
+            enviar()
+            total += len(bloco)
+            bloco = []
+    if bloco:
+        enviar()
+        total += len(bloco)
+    cur.execute("ANALYZE chips")
+    conn.commit()
+    return total
+
+def escrever_csv(caminho, linhas):
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(COLUNAS[:5] + ("observacoes",))
+        n = 0
+        for numero, st, ultima, primeira, proxima, _, _, obs in linhas:
+            escritor.writerow([numero, st, ultima, primeira, proxima, obs or ""])
+            n += 1
+    return n
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("quantidade", type=int)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--limpar", action="store_true", help="TRUNCATE chips antes de popular")
+    parser.add_argument("--csv", help="grava um CSV de importação em vez de popular o banco")
+    adicionar_opcao_banco(parser)
+    args = parser.parse_args()
+    if not args.csv:
+        exigir_banco_descartavel(args.banco_descartavel)
+
+    inicio = time.perf_counter()
+    linhas = gerar_chips(args.quantidade, args.semente)
+    if args.csv:
+        n = escrever_csv(args.csv, linhas)
+        destino = args.csv
+    else:
+        from db import get_db
+        conn = get_db()
+        if args.limpar:
+            conn.cursor().execute("TRUNCATE chips RESTART IDENTITY")
+        n = copiar(conn, linhas)
+        conn.close()
+        destino = "chips"
+    segundos = time.perf_counter() - inicio
+    print(f"{n} chips em {destino} em {segundos:.1f}s ({n / segundos:.0f}/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# benchmarks/micro.py
+"""Micro-benchmarks: listagem (com e sem cache), salvar_chip/str_para_date, validação, importação, cold start e
+índice da frota x SQL.
+
+    python -m benchmarks.micro [--repeticoes 200] [--importar 50000] [--inicializacoes 10]
+
+Roda contra o banco configurado (DB_*). A importação grava chips do DDD 99 e os
+remove no fim: só roda com --banco-descartavel (ou BENCH_DB=1), num banco que
+não seja o de produção. O resultado vai para benchmarks/resultados/<data>-micro.json.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+
+from benchmarks.comum import medir, resumir, salvar_resultado, imprimir, exigir_banco_descartavel, \
+    adicionar_opcao_banco
+from benchmarks.gerar_dados import gerar_chips, escrever_csv
+
+
+def bench_funcoes(repeticoes):
+    import pandas as pd
+    from importacao import validar_linha, validar_frame
+    from utilitarios import salvar_chip, str_para_date
+
+    linha = {"numero_chip": "(11) 9 1234-5678", "status": "em_uso", "ultima_utilizacao": "2026-01-10",
+             "primeira_recarga": "2025-12-01", "proxima_recarga": "2026-02-09", "observacoes": ""}
+    vezes = 1000
+    resultados = {
+        f"str_para_date x{vezes}": medir(lambda: [str_para_date("2026-01-10") for _ in range(vezes)], repeticoes),
+        f"salvar_chip x{vezes}": medir(lambda: [salvar_chip("11912345678", "banido", date(2026, 1, 10), None, None, None)
+                                                for _ in range(vezes)], repeticoes),
+        f"validar_linha x{vezes}": medir(lambda: [validar_linha(linha) for _ in range(vezes)], repeticoes),
+    }
+    # Um lote de importação inteiro: por linha (como era) x vetorizado
+    lote = pd.DataFrame([linha] * 5000)
+    resultados["validar_linha lote 5000"] = medir(lambda: [validar_linha(r) for r in lote.to_dict("records")],
+                                                  max(repeticoes // 10, 1))
+    resultados["validar_frame lote 5000"] = medir(lambda: validar_frame(lote, 2), max(repeticoes // 10, 1))
+    return resultados
+
+def bench_listagem(repeticoes):
+    from app import app
+    from cache import invalidar_cache
+
+    cliente = app.test_client()
+
+    def sem_cache(url):
+        def f():
+            invalidar_cache()
+            assert cliente.get(url).status_code == 200
+        return f
+
+    def com_cache(url):
+        return lambda: cliente.get(url).status_code
+
+    return {
+        "GET /chips (sem cache)": medir(sem_cache("/chips"), repeticoes),
+        "GET /chips (cache)": medir(com_cache("/chips"), repeticoes),
+        "GET /chips?status=banido": medir(sem_cache("/chips?status=banido"), repeticoes),
+        "GET /chips?numero=119": medir(sem_cache("/chips?numero=119"), repeticoes),
+        "GET /chips/alertas": medir(sem_cache("/chips/alertas"), repeticoes),
+        "GET /api/chips?por_pagina=500": medir(sem_cache("/api/chips?por_pagina=500"), max(repeticoes // 4, 1)),
+    }
+
+def bench_frota(repeticoes):
+    from db import get_db
+    from indice import IndiceFrota, resumo_sql
+
+    conn = get_db()
+    cur = conn.cursor()
+    indice = IndiceFrota()
+    try:
+        resultados = {"carregar índice da frota": medir(lambda: indice.carregar(cur), max(repeticoes // 20, 1), 1)}
+        resultados.update({
+            "frota: contagens (SQL)": medir(lambda: cur.execute("SELECT status, count(*) FROM chips GROUP BY status")
+                                            or cur.fetchall(), repeticoes),
+            "frota: contagens (índice)": medir(indice.contagens, repeticoes),
+            "frota: resumo (SQL)": medir(lambda: resumo_sql(cur), repeticoes),
+            "frota: resumo (índice)": medir(indice.resumo, repeticoes),
+        })
+    finally:
+        conn.rollback()
+        conn.close()
+    return resultados
+
+def bench_importacao(quantidade):
+    from db import get_db
+    from importacao import importar_stream
+
+    caminho = os.path.join(tempfile.gettempdir(), f"bench_importacao_{quantidade}.csv")
+    escrever_csv(caminho, gerar_chips(quantidade, semente=7, ddds=[99]))
+    conn = get_db()
+    cur = conn.cursor()
+    # Só o que esta execução inserir é removido no fim
+    cur.execute("SELECT coalesce(max(id), 0) FROM chips")
+    ultimo_id, = cur.fetchone()
+    conn.commit()
+    try:
+        inicio = time.perf_counter()
+        with open(caminho, "rb") as f:
+            estatisticas = importar_stream(conn, f)
+        segundos = time.perf_counter() - inicio
+    finally:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM chips WHERE id > %s AND numero_normalizado LIKE '99%%'", (ultimo_id,))
+        conn.commit()
+        conn.close()
+        os.remove(caminho)
+    resultado = resumir([segundos])
+    resultado["por_segundo"] = round(estatisticas["lidas"] / segundos, 1)
+    resultado["linhas"] = estatisticas["lidas"]
+    return {f"importar_stream {quantidade} linhas": resultado}
+
+def bench_inicializacao(vezes):
+    """`import app` num processo novo, como um worker do gunicorn recém-criado"""
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ambiente = {**os.environ, "AGENDADOR_INTERVALO": "0", "LOG_LEVEL": "WARNING"}
+    latencias = []
+    for _ in range(vezes):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import app"], cwd=raiz, env=ambiente, check=True)
+        latencias.append(time.perf_counter() - inicio)
+    return {"processo novo + import app": resumir(latencias)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticoes", type=int, default=200)
+    parser.add_argument("--importar", type=int, default=50000, help="linhas do CSV de importação (0 pula)")
+    parser.add_argument("--inicializacoes", type=int, default=10, help="processos para medir o cold start (0 pula)")
+    adicionar_opcao_banco(parser)
+    args = parser.parse_args()
+    if args.importar:
+        exigir_banco_descartavel(args.banco_descartavel)
+
+    resultados = {}
+    resultados.update(bench_funcoes(args.repeticoes))
+    resultados.update(bench_listagem(args.repeticoes))
+    resultados.update(bench_frota(args.repeticoes))
+    if args.importar:
+        resultados.update(bench_importacao(args.importar))
+    if args.inicializacoes:
+        resultados.update(bench_inicializacao(args.inicializacoes))
+    imprimir(resultados)
+    print(salvar_resultado("micro", vars(args), resultados))
+
+if __name__ == "__main__":
+    main()
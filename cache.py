@@ -0,0 +1,144 @@
+# cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import Response, request, session
+
+from notificacoes import ouvinte
+
+try:
+    import redis
+except ImportError:  # backend compartilhado é opcional
+    redis = None
+
+CACHE_TTL = float(os.getenv("CACHE_TTL","30"))
+CACHE_MAX_ITENS = int(os.getenv("CACHE_MAX_ITENS","256"))
+CACHE_URL = os.getenv("CACHE_URL")  # ex.: redis://localhost:6379/0
+
+
+# ===============================
+# Backends
+# ===============================
+class CacheMemoria:
+    """LRU com TTL, por processo. invalidar_cache() só alcança o próprio worker; os
+    demais invalidam pelo NOTIFY das alterações em chips (iniciar_invalidacao)."""
+
+    def __init__(self, max_itens=CACHE_MAX_ITENS):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, chave):
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                return None
+            valor, expira = item
+            if expira is not None and expira < time.monotonic():
+                del self._itens[chave]
+                return None
+            self._itens.move_to_end(chave)
+            return valor
+
+    def set(self, chave, valor, ttl=None):
+        with self._lock:
+            self._itens[chave] = (valor, time.monotonic() + ttl if ttl else None)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def incr(self, chave):
+        with self._lock:
+            valor = (self._itens.get(chave, (0, None))[0] or 0) + 1
+            self._itens[chave] = (valor, None)
+            return valor
+
+
+class CacheRedis:
+    """Backend compartilhado entre workers: a invalidação vale para todos na hora.
+
+    Os valores vão como JSON, nunca pickle: quem escreve no Redis não consegue
+    executar código nos workers. (corpo, etag) volta como lista, e o desempacotamento
+    funciona igual. A geração (INCR) é um inteiro, que também é JSON válido."""
+
+    def __init__(self, url, prefixo="chips:"):
+        self.cliente = redis.Redis.from_url(url)
+        self.prefixo = prefixo
+
+    def get(self, chave):
+        valor = self.cliente.get(self.prefixo + chave)
+        return json.loads(valor) if valor is not None else None
+
+    def set(self, chave, valor, ttl=None):
+        # Em milissegundos: ex=int(ttl) daria 0 para TTL abaixo de 1 s, e o Redis recusa
+        self.cliente.set(self.prefixo + chave, json.dumps(valor), px=max(1, int(ttl * 1000)) if ttl else None)
+
+    def incr(self, chave):
+        return self.cliente.incr(self.prefixo + chave)
+
+
+def criar_cache():
+    if CACHE_URL and redis is not None:
+        return CacheRedis(CACHE_URL)
+    return CacheMemoria()
+
+cache = criar_cache()
+
+
+# ===============================
+# Invalidação por geração
+# ===============================
+# Em vez de apagar chave por chave, cada escrita incrementa a geração; as chaves
+# antigas deixam de ser consultadas e saem pelo LRU/TTL.
+def geracao():
+    return cache.get("geracao") or 0
+
+def invalidar_cache():
+    cache.incr("geracao")
+
+class InvalidacaoPorNotificacao:
+    """Consumidor do ouvinte de notificações para o LRU em memória: toda escrita em chips
+    (de qualquer worker, da importação ou do agendador) grava chip_events, cujo NOTIFY
+    chega a todos os workers no COMMIT e incrementa a geração local. Na (re)conexão do
+    LISTEN também incrementa: as notificações do intervalo sem conexão se perderam."""
+
+    def ao_conectar(self):
+        invalidar_cache()
+
+    def ao_alterar(self, mensagens):
+        invalidar_cache()
+
+invalidacao = InvalidacaoPorNotificacao()
+
+def iniciar_invalidacao():
+    """Liga a invalidação entre workers neste processo (no Redis a geração já é compartilhada)"""
+    if isinstance(cache, CacheMemoria):
+        ouvinte.registrar(invalidacao)
+        ouvinte.iniciar()
+
+def chave_atual(chave):
+    return f"{geracao()}:{chave}"
+
+def guardar(chave, corpo):
+    """Guarda (corpo, etag) na chave já com a geração; devolve o item"""
+    item = (corpo, hashlib.sha1(corpo.encode("utf-8")).hexdigest())
+    cache.set(chave, item, CACHE_TTL)
+    return item
+
+def resposta_cacheada(chave, gerar, mimetype="text/html"):
+    """Read-through: devolve o corpo em cache (ou gera e guarda) com ETag; 304 se o cliente já tem"""
+    # Página com mensagem flash pendente é única daquele usuário: não entra no cache
+    if session.get("_flashes"):
+        return Response(gerar(), mimetype=mimetype)
+
+    chave = chave_atual(chave)
+    item = cache.get(chave) or guardar(chave, gerar())
+    corpo, etag = item
+    resposta = Response(corpo, mimetype=mimetype)
+    resposta.set_etag(etag)
+    resposta.headers["Cache-Control"] = "no-cache"
+    return resposta.make_conditional(request)
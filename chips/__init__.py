@@ -2,4 +2,4 @@ from flask import Blueprint
 
 
 chips_bp = Blueprint('chips', __name__, template_folder='templates')
-from . import routes
+from . import routes, migracoes
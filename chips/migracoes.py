@@ -0,0 +1,160 @@
+# chips/migracoes.py
+"""Migrações versionadas do esquema SQL Server (dbo.Chips), no mesmo modelo de migracoes.py.
+
+Rodam uma vez por deploy, fora das requisições:
+
+    python -m chips.migracoes            # aplica as pendentes
+    python -m chips.migracoes --status   # lista aplicadas/pendentes
+    flask chips migrar [--status]        # mesmo efeito, pelo CLI do blueprint
+
+Cada versão roda na própria transação, serializada por sp_getapplock, e fica
+registrada em dbo.schema_migrations. Para mudar o esquema, acrescente uma versão nova
+no fim de MIGRACOES.
+"""
+import logging
+import sys
+import time
+
+import click
+
+from utilitarios import normalizar_telefone
+from .routes import chips_bp, pool_sqlserver
+
+log = logging.getLogger(__name__)
+
+RECURSO_LOCK = "chips_migracoes"
+LOTE_NORMALIZACAO = 5000
+
+DDL_CONTROLE = """
+IF OBJECT_ID('dbo.schema_migrations', 'U') IS NULL
+CREATE TABLE dbo.schema_migrations (
+    versao INT PRIMARY KEY,
+    descricao NVARCHAR(200) NOT NULL,
+    aplicada_em DATETIME2 NOT NULL DEFAULT SYSDATETIME(),
+    duracao_ms INT
+)
+"""
+
+
+# ===============================
+# Versões
+# ===============================
+def numero_normalizado(cur):
+    # Só os dígitos do número, gravado pelo app (repositorio.RepositorioSqlServer) com
+    # normalizar_telefone, a mesma regra do PostgreSQL. O T-SQL não tem regex: uma
+    # coluna calculada só removeria uma lista fixa de separadores e a busca por prefixo
+    # perderia números escritos com qualquer outro. Escrita fora do app precisa
+    # preencher a coluna.
+    cur.execute("""
+        IF COL_LENGTH('dbo.Chips', 'NumeroNormalizado') IS NOT NULL
+           AND COLUMNPROPERTY(OBJECT_ID('dbo.Chips'), 'NumeroNormalizado', 'IsComputed') = 1
+        BEGIN
+            -- Versão anterior (coluna calculada, criada na primeira requisição)
+            IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_Chips_NumeroNormalizado')
+                DROP INDEX ix_Chips_NumeroNormalizado ON dbo.Chips;
+            ALTER TABLE dbo.Chips DROP COLUMN NumeroNormalizado;
+        END
+    """)
+    cur.execute("""
+        IF COL_LENGTH('dbo.Chips', 'NumeroNormalizado') IS NULL
+        ALTER TABLE dbo.Chips ADD NumeroNormalizado VARCHAR(20) NULL
+    """)
+    cur.execute("SELECT Id, NumeroCelular FROM dbo.Chips")
+    valores = [(normalizar_telefone(numero), id) for id, numero in cur.fetchall()]
+    cur.fast_executemany = True
+    for i in range(0, len(valores), LOTE_NORMALIZACAO):
+        cur.executemany("UPDATE dbo.Chips SET NumeroNormalizado = ? WHERE Id = ?", valores[i:i + LOTE_NORMALIZACAO])
+    cur.execute("CREATE INDEX ix_Chips_NumeroNormalizado ON dbo.Chips (NumeroNormalizado)")
+
+def indices_filtros(cur):
+    # Filtros da listagem
+    cur.execute("""
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_Chips_Usuario')
+        CREATE INDEX ix_Chips_Usuario ON dbo.Chips (Usuario)
+    """)
+    cur.execute("""
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_Chips_DataCadastro')
+        CREATE INDEX ix_Chips_DataCadastro ON dbo.Chips (DataCadastro)
+    """)
+
+def resumo_indexado(cur):
+    # Resumo por Operadora/Usuario/EstadoAtual como indexed view: o SQL Server mantém os
+    # totais a cada INSERT/UPDATE/DELETE em Chips, e a leitura não varre a tabela
+    cur.execute("""
+        IF OBJECT_ID('dbo.vw_chips_resumo', 'V') IS NULL
+        EXEC('CREATE VIEW dbo.vw_chips_resumo WITH SCHEMABINDING AS
+              SELECT Operadora, Usuario, EstadoAtual, COUNT_BIG(*) AS Quantidade
+              FROM dbo.Chips
+              GROUP BY Operadora, Usuario, EstadoAtual')
+    """)
+    cur.execute("""
+        IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'ix_vw_chips_resumo')
+        CREATE UNIQUE CLUSTERED INDEX ix_vw_chips_resumo ON dbo.vw_chips_resumo (Operadora, Usuario, EstadoAtual)
+    """)
+
+MIGRACOES = (
+    (1, "NumeroNormalizado gravado pelo app e indexado", numero_normalizado),
+    (2, "índices de Usuario e DataCadastro", indices_filtros),
+    (3, "resumo indexado (vw_chips_resumo)", resumo_indexado),
+)
+
+
+# ===============================
+# Execução
+# ===============================
+def versoes_aplicadas(cur):
+    cur.execute(DDL_CONTROLE)
+    cur.execute("SELECT versao FROM dbo.schema_migrations")
+    return {versao for versao, in cur.fetchall()}
+
+def pendentes():
+    with pool_sqlserver.conexao() as conn:
+        aplicadas = versoes_aplicadas(conn.cursor())
+    return [(versao, descricao) for versao, descricao, _ in MIGRACOES if versao not in aplicadas]
+
+def aplicar_migracoes():
+    """Aplica as versões pendentes em ordem; retorna [(versao, descricao, ms)] do que foi aplicado"""
+    aplicadas = []
+    for versao, descricao, migrar in MIGRACOES:
+        with pool_sqlserver.conexao() as conn:
+            cur = conn.cursor()
+            # Lock da transação: quem esperou enxerga o que o outro processo acabou de aplicar
+            cur.execute("EXEC sp_getapplock @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Transaction'",
+                        (RECURSO_LOCK,))
+            if versao in versoes_aplicadas(cur):
+                continue
+            inicio = time.perf_counter()
+            migrar(cur)
+            ms = round((time.perf_counter() - inicio) * 1000)
+            cur.execute("INSERT INTO dbo.schema_migrations (versao, descricao, duracao_ms) VALUES (?,?,?)",
+                        (versao, descricao, ms))
+        log.info("Migração SQL Server %s aplicada (%s) em %s ms", versao, descricao, ms)
+        aplicadas.append((versao, descricao, ms))
+    return aplicadas
+
+def imprimir_status():
+    faltando = pendentes()
+    print(f"{len(MIGRACOES) - len(faltando)} aplicadas, {len(faltando)} pendentes")
+    for versao, descricao in faltando:
+        print(f"  pendente {versao}: {descricao}")
+
+@chips_bp.cli.command("migrar")
+@click.option("--status", is_flag=True, help="Só lista as versões pendentes")
+def migrar_cmd(status):
+    """Aplica as migrações pendentes do esquema SQL Server (uma vez por deploy)"""
+    if status:
+        imprimir_status()
+        return
+    for versao, descricao, ms in aplicar_migracoes():
+        print(f"{versao}: {descricao} ({ms} ms)")
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if "--status" in sys.argv[1:]:
+        imprimir_status()
+        return
+    aplicadas = aplicar_migracoes()
+    print(f"{len(aplicadas)} migrações aplicadas" if aplicadas else "Esquema atualizado, nada a aplicar")
+
+if __name__ == "__main__":
+    main()
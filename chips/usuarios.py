@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 import pyodbc
-from datetime import datetime
 import re
+from .routes import pool_sqlserver, repositorio
 
 usuarios_bp = Blueprint('usuarios', __name__)
 
@@ -11,7 +11,7 @@ chips_bp = Blueprint('chips', __name__, template_folder='templates')
 ESTADOS_VALIDOS = ['ativo', 'desconectado', 'banido', 'desbanido']
 
 def get_connection():
-    return pyodbc.connect('Driver={SQL Server};Server=localhost;Database=CHIPS;Trusted_Connection=yes;')
+    return pool_sqlserver.conexao()
 
 def formatar_telefone(numero):
     numeros = re.sub(r'\D', '', numero)
@@ -22,45 +22,10 @@ def formatar_telefone(numero):
 
 @chips_bp.route('/chips')
 def listar_chips():
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Filtros
-    numero = request.args.get('numero', '').strip()
-    estado = request.args.get('estado', '').strip()
-    usuario = request.args.get('usuario', '').strip()
-    data_ini = request.args.get('data_ini', '').strip()
-    data_fim = request.args.get('data_fim', '').strip()
-
-    query = """
-        SELECT Id, NumeroCelular, EstadoAtual, Operadora, Status, DataCadastro, Usuario
-        FROM Chips
-        WHERE 1=1
-    """
-    params = []
-
-    if numero:
-        query += " AND NumeroCelular LIKE ?"
-        params.append(f"%{numero}%")
-    if estado:
-        query += " AND EstadoAtual = ?"
-        params.append(estado)
-    if usuario:
-        query += " AND Usuario LIKE ?"
-        params.append(f"%{usuario}%")
-    if data_ini:
-        query += " AND CONVERT(date, DataCadastro) >= ?"
-        params.append(data_ini)
-    if data_fim:
-        query += " AND CONVERT(date, DataCadastro) <= ?"
-        params.append(data_fim)
-
-    query += " ORDER BY Id DESC"
-    cursor.execute(query, params)
-    chips = cursor.fetchall()
-    conn.close()
-
-    return render_template('chips/listar.html', chips=chips)
+    # Filtros (numero, estado, usuario, busca, data_ini/data_fim) e página keyset do repositório
+    chips, proximo = repositorio.listar(request.args)
+    filtros = {k: v for k, v in request.args.items() if k != 'apos' and v}
+    return render_template('chips/listar.html', chips=chips, proximo=proximo, filtros=filtros)
 
 @chips_bp.route('/chips/novo', methods=['GET', 'POST'])
 def novo_chip():
@@ -70,25 +35,16 @@ def novo_chip():
         estado = request.form.get('EstadoAtual', '').lower().strip()
         status = request.form.get('Status', '')
         usuario = request.form.get('Usuario', '')
-        data = datetime.now()
 
         if estado not in ESTADOS_VALIDOS:
             flash(f"Estado inválido: {estado}. Valores permitidos: {', '.join(ESTADOS_VALIDOS)}", 'danger')
             return render_template('chips/formulario.html', chip=request.form)
 
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO Chips (NumeroCelular, EstadoAtual, Operadora, Status, Usuario, DataCadastro)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (numero, estado, operadora, status, usuario, data))
-            conn.commit()
+            repositorio.inserir((numero, estado, operadora, status, usuario))
         except pyodbc.IntegrityError as e:
             flash(f"Erro ao cadastrar chip: {e}", 'danger')
             return render_template('chips/formulario.html', chip=request.form)
-        finally:
-            conn.close()
 
         flash('Chip cadastrado com sucesso!', 'success')
         return redirect(url_for('chips.listar_chips'))
@@ -97,9 +53,6 @@ def novo_chip():
 
 @chips_bp.route('/chips/editar/<int:id>', methods=['GET', 'POST'])
 def editar_chip(id):
-    conn = get_connection()
-    cursor = conn.cursor()
-
     if request.method == 'POST':
         numero = request.form['NumeroCelular']
         operadora = request.form.get('Operadora', '')
@@ -112,24 +65,16 @@ def editar_chip(id):
             return render_template('chips/formulario.html', chip=request.form)
 
         try:
-            cursor.execute("""
-                UPDATE Chips
-                SET NumeroCelular = ?, EstadoAtual = ?, Operadora = ?, Status = ?, Usuario = ?
-                WHERE Id = ?
-            """, (numero, estado, operadora, status, usuario, id))
-            conn.commit()
+            repositorio.atualizar(id, (numero, estado, operadora, status, usuario))
         except pyodbc.IntegrityError as e:
             flash(f"Erro ao atualizar chip: {e}", 'danger')
             return render_template('chips/formulario.html', chip=request.form)
-        finally:
-            conn.close()
 
         flash('Chip atualizado com sucesso!', 'success')
         return redirect(url_for('chips.listar_chips'))
 
-    cursor.execute("SELECT * FROM Chips WHERE Id = ?", (id,))
-    chip = cursor.fetchone()
-    conn.close()
+    # Só as colunas do formulário; pyodbc.Row já dá acesso por nome (chip.NumeroCelular)
+    chip = repositorio.obter(id, ("Id",) + repositorio.colunas)
 
     if not chip:
         flash('Chip não encontrado.', 'danger')
@@ -139,11 +84,7 @@ def editar_chip(id):
 
 @chips_bp.route('/chips/excluir/<int:id>', methods=['POST'])
 def excluir_chip(id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM Chips WHERE Id = ?", (id,))
-    conn.commit()
-    conn.close()
+    repositorio.excluir([id])
     flash('Chip excluído com sucesso!', 'success')
     return redirect(url_for('chips.listar_chips'))
 
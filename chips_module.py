@@ -1,47 +1,54 @@
 # chips_module.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
-import psycopg2, os
-from datetime import date, timedelta
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, \
+    Response, stream_template, stream_with_context
+import psycopg2
+from cache import resposta_cacheada, invalidar_cache
+from db import get_db
+from modelos import COLUNAS_FORMULARIO, chip_de_dados
+from consultas import contexto_listagem, contexto_listagem_stream
+from repositorio import repositorio_postgres as repositorio
+from utilitarios import str_para_date, salvar_chip, normalizar_telefone
 
+# Mesmo schema e mesmos templates (templates/chips_*.html) do app.py
 CHIPS_BP = Blueprint("chips", __name__, template_folder="templates")
 
-def get_db():
-    return psycopg2.connect(
-        host=os.getenv("DB_HOST", "localhost"),
-        port=os.getenv("DB_PORT", "5432"),
-        database=os.getenv("DB_NAME", "postgres"),
-        user=os.getenv("DB_USER", "postgres"),
-        password=os.getenv("DB_PASSWORD", "postgres")
+def dados_formulario():
+    return salvar_chip(
+        request.form["numero"],
+        request.form["status"],
+        str_para_date(request.form.get("ultima_utilizacao")),
+        str_para_date(request.form.get("primeira_recarga")),
+        str_para_date(request.form.get("proxima_recarga")),
+        request.form.get("observacoes")
     )
 
 # Listagem
 @CHIPS_BP.route("/chips")
 def listar_chips():
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM chips ORDER BY id DESC")
-    chips = cur.fetchall()
-    conn.close()
-    return render_template("chips_list.html", chips=chips)
+    if request.args.get("todos"):
+        contexto = contexto_listagem_stream(get_db(), request.args)
+        return Response(stream_with_context(stream_template("chips_list.html", acoes_rapidas=False, **contexto)))
+    def gerar():
+        conn = get_db()
+        contexto = contexto_listagem(conn, request.args)
+        conn.close()
+        return render_template("chips_list.html", acoes_rapidas=False, **contexto)
+    return resposta_cacheada(f"{request.blueprint}:listagem:{request.full_path}", gerar)
 
 # Novo chip
 @CHIPS_BP.route("/chips/novo", methods=["GET", "POST"])
 def novo_chip():
     if request.method == "POST":
-        numero = request.form["numero"]
-        status = request.form["status"]
-        ultima = request.form.get("ultima_utilizacao") or None
-        proxima = request.form.get("proxima_disponibilidade") or None
-        obs = request.form.get("observacoes")
-
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO chips (numero_chip, status, ultima_utilizacao, proxima_disponibilidade, observacoes)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (numero, status, ultima, proxima, obs))
-        conn.commit()
-        conn.close()
+        data = dados_formulario()
+        if not normalizar_telefone(data[0]):
+            flash("O número do chip precisa ter dígitos.", "danger")
+            return render_template("chips_form.html", chip=None)
+        try:
+            repositorio.inserir(data)
+        except psycopg2.IntegrityError:
+            flash(f"Já existe um chip com o número {data[0]}.", "danger")
+            return render_template("chips_form.html", chip=None)
+        invalidar_cache()
         flash("Chip adicionado com sucesso!", "success")
         return redirect(url_for("chips.listar_chips"))
     return render_template("chips_form.html", chip=None)
@@ -49,36 +56,26 @@ def novo_chip():
 # Editar chip
 @CHIPS_BP.route("/chips/editar/<int:id>", methods=["GET", "POST"])
 def editar_chip(id):
-    conn = get_db()
-    cur = conn.cursor()
     if request.method == "POST":
-        numero = request.form["numero"]
-        status = request.form["status"]
-        ultima = request.form.get("ultima_utilizacao") or None
-        proxima = request.form.get("proxima_disponibilidade") or None
-        obs = request.form.get("observacoes")
-
-        cur.execute("""
-            UPDATE chips SET numero_chip=%s, status=%s, ultima_utilizacao=%s, proxima_disponibilidade=%s, observacoes=%s
-            WHERE id=%s
-        """, (numero, status, ultima, proxima, obs, id))
-        conn.commit()
-        conn.close()
+        data = dados_formulario()
+        if not normalizar_telefone(data[0]):
+            flash("O número do chip precisa ter dígitos.", "danger")
+            return render_template("chips_form.html", chip=chip_de_dados(id, data))
+        try:
+            repositorio.atualizar(id, data)
+        except psycopg2.IntegrityError:
+            flash(f"Já existe outro chip com o número {data[0]}.", "danger")
+            return render_template("chips_form.html", chip=chip_de_dados(id, data))
+        invalidar_cache()
         flash("Chip atualizado!", "success")
         return redirect(url_for("chips.listar_chips"))
     else:
-        cur.execute("SELECT * FROM chips WHERE id=%s", (id,))
-        chip = cur.fetchone()
-        conn.close()
-        return render_template("chips_form.html", chip=chip)
+        return render_template("chips_form.html", chip=repositorio.obter(id, COLUNAS_FORMULARIO))
 
 # Deletar
-@CHIPS_BP.route("/chips/deletar/<int:id>", methods=["POST"])
+@CHIPS_BP.route("/chips/deletar/<int:id>", methods=["GET", "POST"])
 def deletar_chip(id):
-    conn = get_db()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM chips WHERE id=%s", (id,))
-    conn.commit()
-    conn.close()
+    repositorio.excluir([id])
+    invalidar_cache()
     flash("Chip removido!", "danger")
     return redirect(url_for("chips.listar_chips"))
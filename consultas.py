@@ -0,0 +1,105 @@
+# consultas.py
+import os
+from datetime import date, timedelta
+
+from modelos import ChipCursor
+from repositorio import ler_paginacao, repositorio_postgres
+
+
+# ===============================
+# Alertas
+# ===============================
+ALERTA_RECARGA_DIAS = int(os.getenv("ALERTA_RECARGA_DIAS","5"))
+ALERTAS_MAX = int(os.getenv("ALERTAS_MAX","100"))
+
+def ler_horizonte(args):
+    try:
+        return max(0, int(args.get("dias", ALERTA_RECARGA_DIAS)))
+    except ValueError:
+        return ALERTA_RECARGA_DIAS
+
+SQL_ALERTAS = """
+    (SELECT 'banido', id, numero_chip, proxima_utilizacao FROM chips
+     WHERE status = 'banido' AND proxima_utilizacao IS NOT NULL
+     ORDER BY proxima_utilizacao LIMIT %s)
+    UNION ALL
+    (SELECT 'recarga', id, numero_chip, proxima_recarga FROM chips
+     WHERE status <> 'banido' AND proxima_recarga <= CURRENT_DATE + %s::integer
+     ORDER BY proxima_recarga LIMIT %s)
+"""
+
+def buscar_alertas(cur, dias=ALERTA_RECARGA_DIAS, limite=ALERTAS_MAX):
+    """Banidos com próxima utilização e chips com recarga vencendo em até `dias` dias"""
+    cur.execute(SQL_ALERTAS, (limite, dias, limite))
+    return cur.fetchall()
+
+def formatar_alerta(alerta):
+    tipo, _, numero, data = alerta
+    if tipo == "banido":
+        return f"⏰ Chip {numero} poderá ser usado a partir de {data.strftime('%d/%m/%Y')}"
+    return f"🔔 Chip {numero} precisa de recarga em breve ({data.strftime('%d/%m/%Y')})"
+
+# ===============================
+# Dashboard
+# ===============================
+TAMANHO_LOTE_STREAM = int(os.getenv("STREAM_LOTE","2000"))
+# Parâmetros que o template passa explicitamente no url_for (paginação, "Ver todos",
+# exportação): repetidos em **filtros dariam TypeError (argumento duplicado)
+PARAMETROS_NAO_FILTRO = ("apos","todos","formato")
+
+def ler_filtros(args):
+    return {k: v for k, v in args.items() if k not in PARAMETROS_NAO_FILTRO and v}
+
+def contexto_listagem(conn, args):
+    """Página, alertas e filtros prontos para o chips_list.html"""
+    chips, proximo = repositorio_postgres.listar(args, conn=conn)
+    dias = ler_horizonte(args)
+    alertas = [formatar_alerta(a) for a in buscar_alertas(conn.cursor(), dias)]
+    _, por_pagina = ler_paginacao(args)
+    filtros = ler_filtros(args)
+
+    return {
+        "chips": chips,
+        "alertas": alertas,
+        "limite_recarga": date.today() + timedelta(days=dias),
+        "filtros": filtros,
+        "proximo": proximo,
+        "por_pagina": por_pagina,
+        "todos": False,
+    }
+
+def iterar_chips(conn, args, colunas=None, lote=TAMANHO_LOTE_STREAM):
+    """Todas as linhas do filtro via cursor nomeado (server-side): só `lote` linhas em memória por vez"""
+    sql, params = repositorio_postgres.sql_filtrado(args, colunas)
+    cur = conn.cursor(name="chips_stream", cursor_factory=ChipCursor)
+    cur.itersize = lote
+    cur.execute(sql, params)
+    try:
+        yield from cur
+    finally:
+        cur.close()
+
+def contexto_listagem_stream(conn, args):
+    """Como contexto_listagem, mas `chips` é um gerador para stream_template"""
+    cur = conn.cursor()
+    dias = ler_horizonte(args)
+    alertas = [formatar_alerta(a) for a in buscar_alertas(cur, dias)]
+    cur.close()
+    _, por_pagina = ler_paginacao(args)
+    filtros = ler_filtros(args)
+
+    def chips():
+        try:
+            yield from iterar_chips(conn, args)
+        finally:
+            conn.close()
+
+    return {
+        "chips": chips(),
+        "alertas": alertas,
+        "limite_recarga": date.today() + timedelta(days=dias),
+        "filtros": filtros,
+        "proximo": None,
+        "por_pagina": por_pagina,
+        "todos": True,
+    }
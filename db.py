@@ -0,0 +1,234 @@
+# db.py
+import os
+import threading
+import time
+
+import psycopg2
+
+from metricas import CursorMedido
+
+
+class PoolEsgotado(Exception):
+    pass
+
+
+# ===============================
+# Pool de conexões genérico
+# ===============================
+class PoolConexoes:
+    """Pool thread-safe e fork-safe: serve psycopg2 e pyodbc, basta passar a função que conecta."""
+
+    def __init__(self, conectar, minimo=1, maximo=10, timeout=10.0, max_idade=1800.0, ping_apos=30.0, ping_sql="SELECT 1"):
+        self._conectar = conectar
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.max_idade = max_idade
+        self.ping_apos = ping_apos
+        self.ping_sql = ping_sql
+        self._cond = threading.Condition()
+        self._resetar_estado()
+
+    def _resetar_estado(self):
+        self._pid = os.getpid()
+        self._livres = []        # (conn, criada_em, devolvida_em)
+        self._criada_em = {}     # id(conn) -> timestamp de criação
+        self._em_uso = 0
+        self.checkouts = 0
+        self.criadas = 0
+        self.descartadas = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+
+    def _verificar_fork(self):
+        # Conexões herdadas do processo pai (gunicorn --preload) não podem ser usadas
+        # nem fechadas no filho: o socket é compartilhado. Apenas esquecemos delas.
+        if os.getpid() != self._pid:
+            self._resetar_estado()
+
+    def _nova(self):
+        conn = self._conectar()
+        self._criada_em[id(conn)] = time.monotonic()
+        self.criadas += 1
+        return conn
+
+    def _descartar(self, conn):
+        self._criada_em.pop(id(conn), None)
+        self.descartadas += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _saudavel(self, conn, criada_em, devolvida_em):
+        agora = time.monotonic()
+        if getattr(conn, "closed", 0):
+            return False
+        if self.max_idade and agora - criada_em > self.max_idade:
+            return False
+        if self.ping_apos is not None and agora - devolvida_em > self.ping_apos:
+            try:
+                cur = conn.cursor()
+                cur.execute(self.ping_sql)
+                cur.fetchall()
+                cur.close()
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def obter(self):
+        inicio = time.monotonic()
+        with self._cond:
+            self._verificar_fork()
+            while True:
+                if self._livres:
+                    conn, criada_em, devolvida_em = self._livres.pop()
+                    self._em_uso += 1
+                    break
+                if self._em_uso + len(self._livres) < self.maximo:
+                    self._em_uso += 1
+                    conn = None
+                    break
+                restante = self.timeout - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self.timeouts += 1
+                    raise PoolEsgotado(f"Nenhuma conexão livre após {self.timeout}s (máximo {self.maximo})")
+                self._cond.wait(restante)
+
+        # Conexão e health check acontecem fora do lock para não serializar o pool
+        try:
+            if conn is not None and not self._saudavel(conn, criada_em, devolvida_em):
+                with self._cond:
+                    self._descartar(conn)
+                conn = None
+            if conn is None:
+                conn = self._nova()
+        except Exception:
+            with self._cond:
+                self._em_uso -= 1
+                self._cond.notify()
+            raise
+
+        espera = time.monotonic() - inicio
+        with self._cond:
+            self.checkouts += 1
+            self.espera_total += espera
+            self.espera_max = max(self.espera_max, espera)
+        return conn
+
+    def devolver(self, conn, descartar=False):
+        with self._cond:
+            if os.getpid() != self._pid:
+                return
+            self._em_uso -= 1
+            if not descartar:
+                try:
+                    # Desfaz transação deixada aberta pela rota (no psycopg2 é no-op se ociosa)
+                    conn.rollback()
+                except Exception:
+                    descartar = True
+            if descartar or getattr(conn, "closed", 0):
+                self._descartar(conn)
+            else:
+                self._livres.append((conn, self._criada_em.get(id(conn), time.monotonic()), time.monotonic()))
+            self._cond.notify()
+
+    def aquecer(self):
+        """Abre as conexões mínimas de uma vez (chamar após o fork do worker)."""
+        conns = [self.obter() for _ in range(self.minimo)]
+        for conn in conns:
+            self.devolver(conn)
+
+    def fechar_todas(self):
+        with self._cond:
+            self._verificar_fork()
+            while self._livres:
+                self._descartar(self._livres.pop()[0])
+
+    def metricas(self):
+        with self._cond:
+            return {
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "em_uso": self._em_uso,
+                "livres": len(self._livres),
+                "checkouts": self.checkouts,
+                "criadas": self.criadas,
+                "descartadas": self.descartadas,
+                "timeouts": self.timeouts,
+                "espera_total_s": round(self.espera_total, 6),
+                "espera_media_ms": round(self.espera_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "espera_max_ms": round(self.espera_max * 1000, 3),
+            }
+
+    def conexao(self):
+        return ConexaoPool(self, self.obter())
+
+
+class ConexaoPool:
+    """Proxy da conexão: close() devolve ao pool em vez de encerrar o socket."""
+
+    __slots__ = ("_pool", "_conn")
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, nome):
+        conn = self._conn
+        if conn is None:
+            raise AttributeError(f"conexão já devolvida ao pool ({nome})")
+        return getattr(conn, nome)
+
+    def cursor(self, *args, **kwargs):
+        # Todo cursor do pool é medido (tempo de banco, consultas, linhas, SQL lenta)
+        return CursorMedido(self.__getattr__("cursor")(*args, **kwargs))
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.devolver(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._conn is not None:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# ===============================
+# Pool PostgreSQL (app.py / chips_module.py)
+# ===============================
+def _conectar_postgres():
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST","localhost"),
+        port=os.getenv("DB_PORT","5432"),
+        database=os.getenv("DB_NAME","postgres"),
+        user=os.getenv("DB_USER","postgres"),
+        password=os.getenv("DB_PASSWORD","postgress")
+    )
+
+pool_postgres = PoolConexoes(
+    _conectar_postgres,
+    minimo=int(os.getenv("DB_POOL_MIN","1")),
+    maximo=int(os.getenv("DB_POOL_MAX","10")),
+    timeout=float(os.getenv("DB_POOL_TIMEOUT","10")),
+    max_idade=float(os.getenv("DB_POOL_MAX_IDADE","1800")),
+    ping_apos=float(os.getenv("DB_POOL_PING_APOS","30")),
+)
+
+def get_db():
+    return pool_postgres.conexao()
@@ -0,0 +1,91 @@
+# eventos.py
+import os
+from datetime import date
+
+# Histórico append-only das transições de estado. Nunca recebe UPDATE/DELETE;
+# particionado por mês para os INSERTs e as consultas por período ficarem baratos
+# mesmo com milhões de linhas (e para descartar meses antigos com DROP TABLE).
+EVENTOS_MESES_ADIANTE = int(os.getenv("EVENTOS_MESES_ADIANTE","2"))
+# Folga criada a cada deploy (flask migrar): o histórico não depende do agendador estar ligado
+EVENTOS_MESES_DEPLOY = int(os.getenv("EVENTOS_MESES_DEPLOY","6"))
+EVENTOS_LIMITE_MAX = 500
+CHAVE_LOCK_PARTICOES = 7_241_003
+
+# Sem FK para chips: o histórico de um chip excluído continua consultável
+DDL_EVENTOS = """
+CREATE TABLE IF NOT EXISTS chip_events (
+    id BIGSERIAL,
+    chip_id INTEGER NOT NULL,
+    tipo VARCHAR(30) NOT NULL,
+    status_anterior VARCHAR(20),
+    status_novo VARCHAR(20),
+    data_banimento DATE,
+    proxima_utilizacao DATE,
+    proxima_recarga DATE,
+    criado_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) PARTITION BY RANGE (criado_em);
+CREATE INDEX IF NOT EXISTS idx_chip_events_chip ON chip_events (chip_id, id);
+-- Rede de segurança caso a partição do mês ainda não exista
+CREATE TABLE IF NOT EXISTS chip_events_padrao PARTITION OF chip_events DEFAULT;
+"""
+
+COLUNAS_EVENTO = ("chip_id","tipo","status_anterior","status_novo","data_banimento","proxima_utilizacao",
+                  "proxima_recarga")
+
+# Acrescentado como CTE ao comando que altera chips: o evento entra na mesma transação
+# (e no mesmo statement) que a mudança de estado. `alterados` precisa expor id,
+# status_anterior, status, data_banimento, proxima_utilizacao e proxima_recarga.
+SQL_REGISTRAR = f"""
+INSERT INTO chip_events ({",".join(COLUNAS_EVENTO)})
+SELECT id, %s, status_anterior, status, data_banimento, proxima_utilizacao, proxima_recarga FROM alterados
+"""
+
+
+def _mais_um_mes(dia):
+    return date(dia.year + dia.month // 12, dia.month % 12 + 1, 1)
+
+def _criar_particao(cur, inicio):
+    """Cria a partição do mês de `inicio`, trazendo o que já caiu na DEFAULT; devolve as linhas movidas"""
+    nome = f"chip_events_{inicio:%Y%m}"
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (nome,))
+    if cur.fetchone()[0]:
+        return 0
+    fim = _mais_um_mes(inicio)
+    # CREATE ... PARTITION OF falha se a DEFAULT tem linhas do intervalo. Cria a tabela
+    # solta, move as linhas e anexa; o lock segura INSERTs novos na DEFAULT até o commit.
+    cur.execute("LOCK TABLE chip_events_padrao IN ACCESS EXCLUSIVE MODE")
+    cur.execute(f"CREATE TABLE {nome} (LIKE chip_events INCLUDING DEFAULTS)")
+    cur.execute(f"""
+        WITH movidas AS (
+            DELETE FROM chip_events_padrao WHERE criado_em >= %s AND criado_em < %s RETURNING *
+        )
+        INSERT INTO {nome} SELECT * FROM movidas
+    """, (inicio, fim))
+    movidas = cur.rowcount
+    cur.execute(f"ALTER TABLE chip_events ATTACH PARTITION {nome} FOR VALUES FROM ('{inicio}') TO ('{fim}')")
+    return movidas
+
+def garantir_particoes(cur, meses_adiante=EVENTOS_MESES_ADIANTE):
+    """Cria a partição do mês corrente, das próximas `meses_adiante` e de todo mês com
+    linhas na DEFAULT (idempotente); devolve quantas linhas saíram da DEFAULT"""
+    # Serializa agendador, deploy e workers: sem isso dois processos criam a mesma tabela
+    cur.execute("SELECT pg_advisory_xact_lock(%s)", (CHAVE_LOCK_PARTICOES,))
+    cur.execute("SELECT DISTINCT date_trunc('month', criado_em)::date FROM chip_events_padrao")
+    meses = {mes for mes, in cur.fetchall()}
+    inicio = date.today().replace(day=1)
+    for _ in range(meses_adiante + 1):
+        meses.add(inicio)
+        inicio = _mais_um_mes(inicio)
+    return sum(_criar_particao(cur, mes) for mes in sorted(meses))
+
+def linha_do_tempo(cur, chip_id, limite=100, antes=None):
+    """Eventos do chip, do mais recente para o mais antigo; `antes` é o id do último evento já visto"""
+    sql = f"SELECT id,{','.join(COLUNAS_EVENTO[1:])},criado_em FROM chip_events WHERE chip_id=%s"
+    params = [chip_id]
+    if antes:
+        sql += " AND id < %s"
+        params.append(antes)
+    sql += " ORDER BY id DESC LIMIT %s"
+    params.append(limite)
+    cur.execute(sql, params)
+    return cur.fetchall()
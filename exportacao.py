@@ -0,0 +1,166 @@
+# exportacao.py
+import io
+import queue
+import threading
+
+from db import get_db
+from repositorio import repositorio_postgres
+
+COLUNAS_EXPORT = ("id","numero_chip","status","ultima_utilizacao","primeira_recarga","proxima_recarga",
+                  "proxima_utilizacao","data_banimento","observacoes","created_at")
+FORMATOS_EXPORT = {
+    "csv": ("text/csv", "WITH (FORMAT csv, HEADER)"),
+    # Uma linha JSON por chip; QUOTE/DELIMITER em caracteres de controle evitam que o
+    # COPY escape as aspas e barras do JSON
+    "jsonl": ("application/x-ndjson", "WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"),
+    # Sem COPY: cursor nomeado + pyarrow, um row group por bloco (stream_parquet)
+    "parquet": ("application/vnd.apache.parquet", None),
+}
+TAMANHO_FILA = 64
+LINHAS_POR_ROW_GROUP = 50000
+
+
+class _Fim:
+    pass
+
+
+class _EscritaNaFila:
+    """File-like que o copy_expert usa: cada write vira um item da fila (com backpressure)"""
+
+    def __init__(self, fila, cancelado):
+        self.fila = fila
+        self.cancelado = cancelado
+
+    def write(self, dados):
+        if isinstance(dados, str):
+            dados = dados.encode("utf-8")
+        if not self.enviar(dados):
+            raise IOError("exportação cancelada pelo cliente")
+        return len(dados)
+
+    def enviar(self, item):
+        while not self.cancelado.is_set():
+            try:
+                self.fila.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+def sql_export(args, formato):
+    select, params = repositorio_postgres.sql_filtrado(args, COLUNAS_EXPORT)
+    if formato == "jsonl":
+        select = f"SELECT row_to_json(c) FROM ({select}) c"
+    return select, params
+
+def stream_export(args, formato="csv"):
+    """Gera os bytes de COPY (...) TO STDOUT em blocos; memória constante qualquer que seja a frota"""
+    if formato == "parquet":
+        return stream_parquet(args)
+    return _stream_copy(args, formato)
+
+def _stream_copy(args, formato):
+    select, params = sql_export(args, formato)
+    fila = queue.Queue(maxsize=TAMANHO_FILA)
+    cancelado = threading.Event()
+
+    saida = _EscritaNaFila(fila, cancelado)
+
+    def copiar():
+        conn = get_db()
+        try:
+            cur = conn.cursor()
+            # copy_expert não aceita parâmetros: os filtros entram já escapados pelo mogrify
+            sql = f"COPY ({cur.mogrify(select, params).decode()}) TO STDOUT {FORMATOS_EXPORT[formato][1]}"
+            cur.copy_expert(sql, saida)
+            conn.commit()
+        except Exception as e:
+            saida.enviar(e)
+        finally:
+            conn.close()
+            saida.enviar(_Fim)
+
+    threading.Thread(target=copiar, name="exportacao", daemon=True).start()
+    try:
+        while True:
+            item = fila.get()
+            if item is _Fim:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Cliente desconectou (ou terminou): libera a thread do COPY
+        cancelado.set()
+
+
+# ===============================
+# Parquet
+# ===============================
+class _SaidaDrenavel(io.RawIOBase):
+    """Destino do ParquetWriter que guarda só o que ainda não foi enviado ao cliente"""
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def drenar(self):
+        dados = b"".join(self.partes)
+        self.partes = []
+        return dados
+
+def esquema_parquet():
+    import pyarrow as pa
+    return pa.schema([
+        ("id", pa.int32()),
+        ("numero_chip", pa.string()),
+        ("status", pa.string()),
+        ("ultima_utilizacao", pa.date32()),
+        ("primeira_recarga", pa.date32()),
+        ("proxima_recarga", pa.date32()),
+        ("proxima_utilizacao", pa.date32()),
+        ("data_banimento", pa.date32()),
+        ("observacoes", pa.string()),
+        ("created_at", pa.timestamp("us")),
+    ])
+
+def stream_parquet(args, linhas_por_row_group=LINHAS_POR_ROW_GROUP):
+    """Cursor nomeado em blocos; cada bloco vira um row group e é enviado em seguida.
+    A memória fica em um bloco, e o arquivo é lido de volta pela importação sem ajustes."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    select, params = sql_export(args, "parquet")
+    esquema = esquema_parquet()
+    saida = _SaidaDrenavel()
+    conn = get_db()
+    try:
+        cur = conn.cursor(name="exportacao_parquet")
+        cur.itersize = linhas_por_row_group
+        cur.execute(select, params)
+        with pq.ParquetWriter(pa.PythonFile(saida, mode="w"), esquema, compression="zstd") as escritor:
+            while True:
+                linhas = cur.fetchmany(linhas_por_row_group)
+                if not linhas:
+                    break
+                colunas = list(zip(*linhas))
+                escritor.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)],
+                    schema=esquema))
+                yield saida.drenar()
+        yield saida.drenar()  # rodapé com os metadados
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,13 @@
+# gunicorn.conf.py
+# Lido automaticamente pelo gunicorn quando roda a partir desta pasta (Procfile, benchmarks.carga).
+
+
+def post_worker_init(worker):
+    # Fila de importações, agendador e índice da frota: só em worker que atende
+    # requisições, depois do fork (o import do app não abre conexão nem sobe threads)
+    from app import iniciar_servicos
+    iniciar_servicos()
+
+def worker_exit(server, worker):
+    from app import encerrar_servicos
+    encerrar_servicos()
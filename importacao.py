@@ -0,0 +1,419 @@
+# importacao.py
+import csv
+import io
+import os
+import tempfile
+import time
+import uuid
+from datetime import date, datetime
+
+from eventos import SQL_REGISTRAR
+from utilitarios import STATUS_VALIDOS, DIAS_BANIMENTO, str_para_date, salvar_chip, normalizar_telefone, \
+    normalizar_telefones
+
+COLUNAS_CHIPS = ("numero_chip","status","ultima_utilizacao","primeira_recarga","proxima_recarga",
+                 "proxima_utilizacao","data_banimento","observacoes")
+COLUNAS_DATA = ("ultima_utilizacao","primeira_recarga","proxima_recarga")
+TAMANHO_LOTE = int(os.getenv("IMPORT_LOTE","5000"))
+TAMANHO_AMOSTRA = 64 * 1024
+PASTA_RELATORIOS = os.getenv("IMPORT_RELATORIOS", os.path.join(tempfile.gettempdir(), "chips_importacoes"))
+# inserir: números já cadastrados são ignorados / atualizar: upsert pelo número normalizado
+MODOS_IMPORTACAO = ("inserir","atualizar")
+# Formatos de entrada, reconhecidos pelos primeiros bytes do arquivo (a extensão pode mentir)
+ASSINATURAS = ((b"PAR1", "parquet"), (b"PK\x03\x04", "xlsx"))
+
+
+class ImportacaoCancelada(Exception):
+    pass
+
+
+# ===============================
+# Leitura em streaming
+# ===============================
+def detectar_encoding(stream, tamanho_amostra=TAMANHO_AMOSTRA):
+    """Detecta o encoding só pela amostra inicial e volta o stream para o começo"""
+    import chardet  # só carregado na primeira importação: não pesa no boot dos workers
+    amostra = stream.read(tamanho_amostra)
+    stream.seek(0)
+    return chardet.detect(amostra)['encoding'] or 'utf-8'
+
+def detectar_formato(stream):
+    """csv, parquet ou xlsx; volta o stream para o começo"""
+    inicio = stream.read(4)
+    stream.seek(0)
+    for assinatura, formato in ASSINATURAS:
+        if inicio.startswith(assinatura):
+            return formato
+    return "csv"
+
+# Cada leitor gera (DataFrame de textos, bytes já consumidos), um lote por vez: a
+# validação e a carga são as mesmas para todos os formatos.
+def ler_csv_em_lotes(stream, tamanho_lote=TAMANHO_LOTE):
+    import pandas as pd  # idem: ~250 ms e dezenas de MB a menos por worker que não importa CSV
+    encoding = detectar_encoding(stream)
+    texto = io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+    # dtype=str: a validação é nossa, o pandas não deve adivinhar tipos nem trocar vazio por NaN
+    for df in pd.read_csv(texto, dtype=str, keep_default_na=False, chunksize=tamanho_lote):
+        yield df, stream.tell()
+
+def _tamanho(stream):
+    posicao = stream.tell()
+    tamanho = stream.seek(0, os.SEEK_END)
+    stream.seek(posicao)
+    return tamanho
+
+def ler_parquet_em_lotes(stream, tamanho_lote=TAMANHO_LOTE):
+    """Lotes de `tamanho_lote` linhas, row group a row group; com arquivo em disco o
+    pyarrow mapeia em memória em vez de ler tudo"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    origem = getattr(stream, "name", None)
+    arquivo = pq.ParquetFile(origem if isinstance(origem, str) else stream, memory_map=isinstance(origem, str))
+    total_linhas = arquivo.metadata.num_rows or 1
+    total_bytes = _tamanho(stream)
+    lidas = 0
+    for lote in arquivo.iter_batches(batch_size=tamanho_lote):
+        colunas = {}
+        for nome, coluna in zip(lote.schema.names, lote.columns):
+            # Tudo vira texto como no CSV; datas/timestamps no formato que a validação espera
+            if pa.types.is_date(coluna.type) or pa.types.is_timestamp(coluna.type):
+                coluna = pc.strftime(coluna, "%Y-%m-%d")
+            elif not pa.types.is_string(coluna.type):
+                coluna = pc.cast(coluna, pa.string())
+            colunas[nome] = coluna.fill_null("").to_pandas()
+        lidas += lote.num_rows
+        yield _frame_texto(colunas), round(total_bytes * lidas / total_linhas)
+
+def _celula(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d")
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))  # número do chip digitado como número na planilha
+    return str(valor)
+
+def ler_xlsx_em_lotes(stream, tamanho_lote=TAMANHO_LOTE):
+    """Primeira aba, linha a linha (openpyxl read_only: não monta a planilha em memória).
+
+    Linha em branco no meio dos dados continua sendo linha (rejeitada por numero_chip
+    vazio), para o relatório apontar a linha certa da planilha; só as do fim da aba,
+    que o Excel costuma deixar formatadas, são descartadas.
+    """
+    import openpyxl
+
+    total_bytes = _tamanho(stream)
+    planilha = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        aba = planilha.worksheets[0]
+        total_linhas = max((aba.max_row or 1) - 1, 1)
+        linhas = aba.iter_rows(values_only=True)
+        cabecalho = [str(c).strip() if c is not None else f"coluna_{i}" for i, c in enumerate(next(linhas, ()), 1)]
+        lidas = 0
+        lote = []
+        em_branco = 0
+        for linha in linhas:
+            if not any(v is not None for v in linha):
+                em_branco += 1  # só entram no lote se vier outra linha com dados depois
+                continue
+            lote.extend([[""] * len(cabecalho)] * em_branco)
+            em_branco = 0
+            lote.append([_celula(v) for v in linha[:len(cabecalho)]] + [""] * (len(cabecalho) - len(linha)))
+            if len(lote) >= tamanho_lote:
+                lidas += len(lote)
+                yield _frame_texto(dict(zip(cabecalho, zip(*lote)))), min(total_bytes * lidas // total_linhas, total_bytes)
+                lote = []
+        if lote:
+            lidas += len(lote)
+            yield _frame_texto(dict(zip(cabecalho, zip(*lote)))), total_bytes
+    finally:
+        planilha.close()
+
+def _frame_texto(colunas):
+    import pandas as pd
+    return pd.DataFrame({nome: pd.Series(valores, dtype=object) for nome, valores in colunas.items()})
+
+LEITORES = {
+    "csv": ler_csv_em_lotes,
+    "parquet": ler_parquet_em_lotes,
+    "xlsx": ler_xlsx_em_lotes,
+}
+
+
+# ===============================
+# Validação
+# ===============================
+def validar_linha(row):
+    """Retorna (tupla para salvar, None) ou (None, motivo da rejeição)"""
+    numero = (row.get("numero_chip") or "").strip()
+    if not numero:
+        return None, "numero_chip vazio"
+    if len(numero) > 20:
+        return None, "numero_chip com mais de 20 caracteres"
+    if not normalizar_telefone(numero):
+        return None, "numero_chip sem dígitos"
+
+    status = (row.get("status") or "").strip().lower() or "disponivel"
+    if status not in STATUS_VALIDOS:
+        return None, f"status inválido: {status}"
+
+    datas = []
+    for coluna in COLUNAS_DATA:
+        valor = (row.get(coluna) or "").strip()
+        data = str_para_date(valor)
+        if valor and data is None:
+            return None, f"{coluna} inválida: {valor} (esperado AAAA-MM-DD)"
+        datas.append(data)
+
+    obs = row.get("observacoes") or None
+    return salvar_chip(numero, status, *datas, obs), None
+
+def _coluna(df, nome):
+    """Coluna como texto sem espaços nas pontas ("" se o arquivo não tem a coluna)"""
+    if nome not in df.columns:
+        import pandas as pd
+        return pd.Series("", index=df.index, dtype=object)
+    return df[nome].fillna("").astype(str).str.strip()
+
+def _observacoes(df):
+    # Como `row.get("observacoes") or None`: sem strip, vazio vira NULL
+    observacoes = df["observacoes"].fillna("") if "observacoes" in df.columns else _coluna(df, "observacoes")
+    return observacoes.where(observacoes != "")
+
+def validar_frame(df, linha_inicial):
+    """Versão vetorizada de validar_linha para um lote inteiro do CSV.
+
+    Retorna (limpo, rejeitado): `limpo` tem as COLUNAS_CHIPS prontas para o COPY (datas
+    em datetime64, NaT quando vazias; date numa coluna com data fora da faixa do pandas); `rejeitado` tem "linha", "motivo" e as colunas
+    originais. O motivo de cada linha é o da primeira regra que falha, na mesma ordem
+    de validar_linha.
+    """
+    import pandas as pd
+
+    numero = _coluna(df, "numero_chip")
+    status = _coluna(df, "status").str.lower().replace("", "disponivel")
+    motivo = pd.Series(None, index=df.index, dtype=object)
+
+    def rejeitar(condicao, mensagem):
+        motivo.mask(motivo.isna() & condicao, mensagem, inplace=True)
+
+    rejeitar(numero == "", "numero_chip vazio")
+    rejeitar(numero.str.len() > 20, "numero_chip com mais de 20 caracteres")
+    rejeitar(normalizar_telefones(numero) == "", "numero_chip sem dígitos")
+    rejeitar(~status.isin(STATUS_VALIDOS), "status inválido: " + status)
+
+    datas = {}
+    for coluna in COLUNAS_DATA:
+        valor = _coluna(df, coluna)
+        # Formato estrito como o strptime de str_para_date; o que não casa vira NaT
+        datas[coluna] = pd.to_datetime(valor, format="%Y-%m-%d", errors="coerce")
+        # datetime64[ns] só cobre 1677-2262: o que o pandas não converteu passa por
+        # str_para_date (a regra de validar_linha), e datas fora da faixa ficam como date
+        falhas = (valor != "") & datas[coluna].isna()
+        if falhas.any():
+            refeitas = valor[falhas].map(str_para_date)
+            if refeitas.notna().any():
+                datas[coluna] = datas[coluna].dt.date.astype(object)
+                datas[coluna][falhas] = refeitas
+        rejeitar((valor != "") & datas[coluna].isna(), coluna + " inválida: " + valor + " (esperado AAAA-MM-DD)")
+
+    ok = motivo.isna()
+    # Datas derivadas do status, como salvar_chip
+    banido = status[ok] == "banido"
+    hoje = pd.Timestamp(date.today())
+    limpo = pd.DataFrame({
+        "numero_chip": numero[ok],
+        "status": status[ok],
+        **{coluna: datas[coluna][ok] for coluna in COLUNAS_DATA},
+        "proxima_utilizacao": pd.Series(hoje + pd.Timedelta(days=DIAS_BANIMENTO), index=banido.index).where(banido),
+        "data_banimento": pd.Series(hoje, index=banido.index).where(banido),
+        "observacoes": _observacoes(df)[ok],
+    }, columns=COLUNAS_CHIPS)
+
+    rejeitado = df[~ok].copy()
+    rejeitado.insert(0, "motivo", motivo[~ok])
+    rejeitado.insert(0, "linha", (linha_inicial + pd.RangeIndex(len(df)))[~ok.to_numpy()])
+    return limpo, rejeitado
+
+
+# ===============================
+# Carga via COPY + upsert
+# ===============================
+# O lote vai por COPY para uma tabela temporária e de lá para chips com ON CONFLICT,
+# assim números repetidos (no arquivo ou já cadastrados) não abortam a transação.
+SQL_STAGING = """
+CREATE TEMP TABLE IF NOT EXISTS chips_importacao (
+    ordem INTEGER,
+    numero_chip VARCHAR(20),
+    status VARCHAR(20),
+    ultima_utilizacao DATE,
+    primeira_recarga DATE,
+    proxima_recarga DATE,
+    proxima_utilizacao DATE,
+    data_banimento DATE,
+    observacoes TEXT
+) ON COMMIT DROP
+"""
+
+SQL_SELECT_STAGING = f"""
+SELECT DISTINCT ON (regexp_replace(numero_chip, '\\D', '', 'g')) {",".join(COLUNAS_CHIPS)}
+FROM chips_importacao
+ORDER BY regexp_replace(numero_chip, '\\D', '', 'g'), ordem DESC
+"""
+
+# Os eventos da carga entram em lote, no mesmo statement (status anterior não é
+# conhecido num upsert: fica NULL)
+SQL_INSERIR = f"""
+WITH alterados AS (
+    INSERT INTO chips ({",".join(COLUNAS_CHIPS)})
+    {SQL_SELECT_STAGING}
+    ON CONFLICT (numero_normalizado) WHERE numero_normalizado <> '' DO NOTHING
+    RETURNING *, NULL::varchar AS status_anterior, TRUE AS novo
+), eventos AS (
+    {SQL_REGISTRAR}
+)
+SELECT novo FROM alterados
+"""
+
+# Reimportar um chip que já está banido preserva a data do banimento original
+SQL_ATUALIZAR = f"""
+WITH alterados AS (
+    INSERT INTO chips AS c ({",".join(COLUNAS_CHIPS)})
+    {SQL_SELECT_STAGING}
+    ON CONFLICT (numero_normalizado) WHERE numero_normalizado <> '' DO UPDATE SET
+        numero_chip = EXCLUDED.numero_chip,
+        status = EXCLUDED.status,
+        ultima_utilizacao = EXCLUDED.ultima_utilizacao,
+        primeira_recarga = EXCLUDED.primeira_recarga,
+        proxima_recarga = EXCLUDED.proxima_recarga,
+        proxima_utilizacao = CASE WHEN c.status = 'banido' AND EXCLUDED.status = 'banido'
+                                  THEN c.proxima_utilizacao ELSE EXCLUDED.proxima_utilizacao END,
+        data_banimento = CASE WHEN c.status = 'banido' AND EXCLUDED.status = 'banido'
+                              THEN c.data_banimento ELSE EXCLUDED.data_banimento END,
+        observacoes = EXCLUDED.observacoes
+    WHERE (c.numero_chip, c.status, c.ultima_utilizacao, c.primeira_recarga, c.proxima_recarga, c.observacoes)
+          IS DISTINCT FROM
+          (EXCLUDED.numero_chip, EXCLUDED.status, EXCLUDED.ultima_utilizacao, EXCLUDED.primeira_recarga,
+           EXCLUDED.proxima_recarga, EXCLUDED.observacoes)
+    RETURNING c.*, NULL::varchar AS status_anterior, (xmax = 0) AS novo
+), eventos AS (
+    {SQL_REGISTRAR}
+)
+SELECT novo FROM alterados
+"""
+
+def copiar_lote(cur, linhas):
+    """`linhas`: tuplas em COLUNAS_CHIPS ou o DataFrame limpo de validar_frame"""
+    buffer = io.StringIO()
+    # ordem: se o número se repete no lote, vale a última ocorrência
+    if hasattr(linhas, "to_csv"):
+        # O pandas escreve o CSV do COPY de uma vez (NaT/None viram vazio = NULL)
+        linhas.reset_index(drop=True).to_csv(buffer, header=False, date_format="%Y-%m-%d")
+    else:
+        escritor = csv.writer(buffer)
+        for i, linha in enumerate(linhas):
+            escritor.writerow([i] + ["" if v is None else v for v in linha])
+    buffer.seek(0)
+    cur.execute("TRUNCATE chips_importacao")
+    cur.copy_expert(f"COPY chips_importacao (ordem,{','.join(COLUNAS_CHIPS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def gravar_lote(cur, linhas, modo):
+    """Retorna (inseridas, atualizadas, inalteradas) do lote"""
+    copiar_lote(cur, linhas)
+    cur.execute(SQL_ATUALIZAR if modo == "atualizar" else SQL_INSERIR, ("importacao",))
+    retorno = cur.fetchall()
+    inseridas = sum(1 for (novo,) in retorno if novo)
+    atualizadas = len(retorno) - inseridas
+    return inseridas, atualizadas, len(linhas) - len(retorno)
+
+class RelatorioRejeitadas:
+    """CSV das linhas rejeitadas, gravado lote a lote: a memória não cresce com as rejeições"""
+
+    def __init__(self):
+        self.id = None
+        self.total = 0
+        self._arquivo = None
+        self._cabecalho = None
+
+    def adicionar(self, rejeitado, colunas):
+        if self._arquivo is None:
+            os.makedirs(PASTA_RELATORIOS, exist_ok=True)
+            self.id = uuid.uuid4().hex
+            self._cabecalho = ["linha","motivo"] + list(colunas)
+            self._arquivo = open(caminho_relatorio(self.id), "w", newline="", encoding="utf-8")
+            csv.writer(self._arquivo).writerow(self._cabecalho)
+        rejeitado.reindex(columns=self._cabecalho, fill_value="").to_csv(self._arquivo, header=False, index=False)
+        self.total += len(rejeitado)
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+
+    def descartar(self):
+        self.fechar()
+        if self.id is not None:
+            os.remove(caminho_relatorio(self.id))
+            self.id = None
+
+def caminho_relatorio(relatorio_id):
+    return os.path.join(PASTA_RELATORIOS, f"{relatorio_id}.csv")
+
+def importar_stream(conn, stream, tamanho_lote=TAMANHO_LOTE, progresso=None, modo="inserir", formato=None):
+    """Importa o arquivo (CSV, Parquet ou XLSX) lote a lote numa única transação;
+    rejeições não abortam a carga. `formato` None detecta pelos primeiros bytes.
+
+    Em `modo` "inserir" números já cadastrados contam como inalterados; em
+    "atualizar" eles recebem os dados do arquivo (upsert pelo número normalizado).
+
+    `progresso(dict)` é chamado após cada lote; se retornar False a importação é
+    desfeita e ImportacaoCancelada é levantada.
+    """
+    inicio = time.monotonic()
+    cur = conn.cursor()
+    lidas = inseridas = atualizadas = inalteradas = 0
+    rejeitadas = RelatorioRejeitadas()
+    linha = 2  # linha 1 é o cabeçalho
+    ler_em_lotes = LEITORES[formato or detectar_formato(stream)]
+    try:
+        cur.execute(SQL_STAGING)
+        for df, bytes_lidos in ler_em_lotes(stream, tamanho_lote):
+            limpo, rejeitado = validar_frame(df, linha)
+            if len(limpo):
+                i, a, n = gravar_lote(cur, limpo, modo)
+                inseridas += i
+                atualizadas += a
+                inalteradas += n
+            if len(rejeitado):
+                rejeitadas.adicionar(rejeitado, df.columns)
+            lidas += len(df)
+            linha += len(df)
+            if progresso and progresso({
+                "lidas": lidas,
+                "importadas": inseridas + atualizadas,
+                "inseridas": inseridas,
+                "atualizadas": atualizadas,
+                "inalteradas": inalteradas,
+                "rejeitadas": rejeitadas.total,
+                "bytes_lidos": bytes_lidos,
+            }) is False:
+                raise ImportacaoCancelada()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        rejeitadas.descartar()
+        raise
+    rejeitadas.fechar()
+    segundos = time.monotonic() - inicio
+    return {
+        "lidas": lidas,
+        "importadas": inseridas + atualizadas,
+        "inseridas": inseridas,
+        "atualizadas": atualizadas,
+        "inalteradas": inalteradas,
+        "rejeitadas": rejeitadas.total,
+        "segundos": round(segundos, 3),
+        "linhas_por_segundo": round(lidas / segundos, 1) if segundos else 0.0,
+        "relatorio": rejeitadas.id,
+    }
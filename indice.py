@@ -0,0 +1,238 @@
+# indice.py
+"""Índice da frota em memória (opcional, INDICE_FROTA=1).
+
+Responde sem ir ao banco "quantos chips há em cada status" (um set de ids por status)
+e "qual a próxima recarga / o próximo desbanimento" (min-heaps em proxima_recarga dos
+não banidos e em proxima_utilizacao dos banidos).
+
+Carregado com uma leitura só de chips, na thread do ouvinte de notificações logo
+depois do LISTEN: o que for alterado a partir dali chega pelo NOTIFY (notificacoes.py)
+e é aplicado em ordem. É eventual (milissegundos) e por worker; escrita que não passa
+por chip_events (SQL manual, TRUNCATE) não é vista até o próximo recarregamento, e
+é o que `flask verificar-indice` detecta.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import date
+
+from db import get_db
+from notificacoes import ouvinte
+from utilitarios import STATUS_VALIDOS
+
+log = logging.getLogger(__name__)
+
+INDICE_FROTA = os.getenv("INDICE_FROTA","0") == "1"
+PROXIMOS_MAX = 100
+
+SQL_CARREGAR = "SELECT id, status, proxima_recarga, proxima_utilizacao FROM chips"
+
+
+# ===============================
+# Caminho SQL (referência da verificação e fallback sem índice)
+# ===============================
+def resumo_sql(cur, quantidade=5):
+    cur.execute("SELECT status, count(*) FROM chips GROUP BY status")
+    contagens = dict.fromkeys(STATUS_VALIDOS, 0)
+    contagens.update(cur.fetchall())
+    cur.execute("""
+        SELECT id, proxima_recarga FROM chips
+        WHERE status <> 'banido' AND proxima_recarga IS NOT NULL
+        ORDER BY proxima_recarga, id LIMIT %s
+    """, (quantidade,))
+    recargas = cur.fetchall()
+    cur.execute("""
+        SELECT id, proxima_utilizacao FROM chips
+        WHERE status = 'banido' AND proxima_utilizacao IS NOT NULL
+        ORDER BY proxima_utilizacao, id LIMIT %s
+    """, (quantidade,))
+    desbanimentos = cur.fetchall()
+    return _formatar(contagens, recargas, desbanimentos)
+
+def _formatar(contagens, recargas, desbanimentos):
+    return {
+        "contagens": contagens,
+        "total": sum(contagens.values()),
+        "proximas_recargas": [{"id": id, "data": data.isoformat()} for id, data in recargas],
+        "proximos_desbanimentos": [{"id": id, "data": data.isoformat()} for id, data in desbanimentos],
+    }
+
+
+# ===============================
+# Índice
+# ===============================
+class IndiceFrota:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chips = {}                                   # id -> (status, proxima_recarga, proxima_utilizacao)
+        self._por_status = {status: set() for status in STATUS_VALIDOS}
+        # Heaps de (data, id) com remoção preguiçosa: entrada que não bate mais com
+        # _chips é descartada quando chega ao topo
+        self._recargas = []
+        self._desbanimentos = []
+        self.pronto = False
+        self.carregamentos = 0
+        self.alteracoes = 0
+        self.ultimo_carregamento_ms = None
+
+    # --- manutenção (thread do ouvinte) ---
+    def carregar(self, cur):
+        inicio = time.perf_counter()
+        cur.execute(SQL_CARREGAR)
+        chips = {id: (status, recarga, utilizacao) for id, status, recarga, utilizacao in cur.fetchall()}
+        por_status = {status: set() for status in STATUS_VALIDOS}
+        recargas = []
+        desbanimentos = []
+        for id, (status, recarga, utilizacao) in chips.items():
+            por_status[status].add(id)
+            if status != "banido" and recarga is not None:
+                recargas.append((recarga, id))
+            elif status == "banido" and utilizacao is not None:
+                desbanimentos.append((utilizacao, id))
+        heapq.heapify(recargas)
+        heapq.heapify(desbanimentos)
+        with self._lock:
+            self._chips, self._por_status = chips, por_status
+            self._recargas, self._desbanimentos = recargas, desbanimentos
+            self.pronto = True
+            self.carregamentos += 1
+            self.ultimo_carregamento_ms = round((time.perf_counter() - inicio) * 1000, 3)
+        log.info("Índice da frota carregado: %s chips em %s ms", len(chips), self.ultimo_carregamento_ms)
+
+    def _remover(self, id):
+        anterior = self._chips.pop(id, None)
+        if anterior is not None:
+            self._por_status[anterior[0]].discard(id)
+
+    def _gravar(self, id, status, recarga, utilizacao):
+        self._remover(id)
+        self._chips[id] = (status, recarga, utilizacao)
+        self._por_status[status].add(id)
+        if status != "banido" and recarga is not None:
+            heapq.heappush(self._recargas, (recarga, id))
+        elif status == "banido" and utilizacao is not None:
+            heapq.heappush(self._desbanimentos, (utilizacao, id))
+
+    def _compactar(self):
+        # Muitas entradas obsoletas acumuladas: reconstrói os heaps a partir de _chips
+        if len(self._recargas) + len(self._desbanimentos) > 2 * len(self._chips) + 1000:
+            self._recargas = [(r, id) for id, (s, r, _) in self._chips.items() if s != "banido" and r is not None]
+            self._desbanimentos = [(u, id) for id, (s, _, u) in self._chips.items() if s == "banido" and u is not None]
+            heapq.heapify(self._recargas)
+            heapq.heapify(self._desbanimentos)
+
+    def ao_conectar(self):
+        conn = get_db()
+        try:
+            self.carregar(conn.cursor())
+        finally:
+            conn.close()
+
+    def ao_alterar(self, mensagens):
+        if any(m["op"] == "recarregar" for m in mensagens):
+            self.ao_conectar()
+            return
+        with self._lock:
+            for mensagem in mensagens:
+                if mensagem["op"] == "remover":
+                    self._remover(mensagem["id"])
+                else:
+                    chip = mensagem["chip"]
+                    self._gravar(chip["id"], chip["status"], _data(chip["proxima_recarga"]),
+                                 _data(chip["proxima_utilizacao"]))
+            self.alteracoes += len(mensagens)
+            self._compactar()
+
+    # --- consultas (threads das requisições) ---
+    def contagens(self):
+        with self._lock:
+            return {status: len(ids) for status, ids in self._por_status.items()}
+
+    def _valido_recarga(self, data, id):
+        atual = self._chips.get(id)
+        return atual is not None and atual[0] != "banido" and atual[1] == data
+
+    def _valido_desbanimento(self, data, id):
+        atual = self._chips.get(id)
+        return atual is not None and atual[0] == "banido" and atual[2] == data
+
+    def _primeiros(self, heap, valido, quantidade):
+        """Os `quantidade` menores válidos; limpa o topo e devolve o resto ao heap"""
+        while heap and not valido(*heap[0]):
+            heapq.heappop(heap)
+        if quantidade == 1:
+            return heap[:1]
+        retirados = []
+        vistos = set()
+        while heap and len(retirados) < quantidade:
+            entrada = heapq.heappop(heap)
+            # Mesmo chip pode ter entrada repetida (mudou e voltou para a mesma data)
+            if valido(*entrada) and entrada[1] not in vistos:
+                retirados.append(entrada)
+                vistos.add(entrada[1])
+        for entrada in retirados:
+            heapq.heappush(heap, entrada)
+        return retirados
+
+    def resumo(self, quantidade=5):
+        with self._lock:
+            contagens = {status: len(ids) for status, ids in self._por_status.items()}
+            recargas = self._primeiros(self._recargas, self._valido_recarga, quantidade)
+            desbanimentos = self._primeiros(self._desbanimentos, self._valido_desbanimento, quantidade)
+        return _formatar(contagens, [(id, data) for data, id in recargas],
+                         [(id, data) for data, id in desbanimentos])
+
+    # --- verificação ---
+    def verificar(self, cur, corrigir=False):
+        """Compara com o banco: resumo e conteúdo linha a linha; `corrigir` recarrega se divergir"""
+        cur.execute(SQL_CARREGAR)
+        banco = {id: (status, recarga, utilizacao) for id, status, recarga, utilizacao in cur.fetchall()}
+        referencia = resumo_sql(cur)
+        with self._lock:
+            memoria = dict(self._chips)
+        faltando = banco.keys() - memoria.keys()
+        sobrando = memoria.keys() - banco.keys()
+        diferentes = [id for id in banco.keys() & memoria.keys() if banco[id] != memoria[id]]
+        resumo = self.resumo()
+        divergencias = {
+            "faltando": sorted(faltando)[:20],
+            "sobrando": sorted(sobrando)[:20],
+            "diferentes": sorted(diferentes)[:20],
+            "resumo": None if resumo == referencia else {"indice": resumo, "sql": referencia},
+        }
+        consistente = not (faltando or sobrando or diferentes) and resumo == referencia
+        if not consistente and corrigir:
+            self.carregar(cur)
+        return {
+            "pid": os.getpid(),
+            "consistente": consistente,
+            "chips_banco": len(banco),
+            "chips_indice": len(memoria),
+            "totais": {"faltando": len(faltando), "sobrando": len(sobrando), "diferentes": len(diferentes)},
+            "divergencias": None if consistente else divergencias,
+            "corrigido": not consistente and corrigir,
+        }
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "pronto": self.pronto,
+                "chips": len(self._chips),
+                "entradas_heap": len(self._recargas) + len(self._desbanimentos),
+                "carregamentos": self.carregamentos,
+                "alteracoes": self.alteracoes,
+                "ultimo_carregamento_ms": self.ultimo_carregamento_ms,
+            }
+
+def _data(valor):
+    return date.fromisoformat(valor) if valor else None
+
+indice_frota = IndiceFrota()
+
+def iniciar():
+    """Liga o índice neste worker: carrega depois do LISTEN e segue as notificações"""
+    if INDICE_FROTA:
+        ouvinte.registrar(indice_frota)
+        ouvinte.iniciar()
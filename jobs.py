@@ -0,0 +1,329 @@
+# jobs.py
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import invalidar_cache
+from db import get_db
+from importacao import importar_stream, ImportacaoCancelada
+
+log = logging.getLogger(__name__)
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS","2"))
+EXTENSOES = (".csv", ".parquet", ".xlsx")
+PASTA_UPLOADS = os.getenv("IMPORT_UPLOADS", os.path.join(tempfile.gettempdir(), "chips_uploads"))
+TAMANHO_PARTE = 1024 * 1024
+# O job em execução marca heartbeat_em a cada IMPORT_HEARTBEAT_S; sem sinal há mais de
+# IMPORT_TRAVADO_MIN o worker morreu (OOM, deploy, SIGKILL) e o job volta para a fila,
+# até IMPORT_TENTATIVAS vezes (um arquivo que derruba o worker não fica em loop)
+IMPORT_HEARTBEAT_S = float(os.getenv("IMPORT_HEARTBEAT_S","30"))
+IMPORT_TRAVADO_MIN = float(os.getenv("IMPORT_TRAVADO_MIN","5"))
+IMPORT_TENTATIVAS = int(os.getenv("IMPORT_TENTATIVAS","3"))
+
+DDL_IMPORTACOES = """
+CREATE TABLE IF NOT EXISTS importacoes (
+    id SERIAL PRIMARY KEY,
+    arquivo TEXT NOT NULL,
+    nome_original TEXT,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente'
+        CHECK (status IN ('pendente','executando','concluida','erro','cancelada')),
+    total_bytes BIGINT NOT NULL DEFAULT 0,
+    bytes_lidos BIGINT NOT NULL DEFAULT 0,
+    lidas INTEGER NOT NULL DEFAULT 0,
+    importadas INTEGER NOT NULL DEFAULT 0,
+    rejeitadas INTEGER NOT NULL DEFAULT 0,
+    cancelar BOOLEAN NOT NULL DEFAULT FALSE,
+    relatorio TEXT,
+    erro TEXT,
+    criada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    iniciada_em TIMESTAMP,
+    finalizada_em TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_importacoes_pendentes ON importacoes (id) WHERE status = 'pendente';
+ALTER TABLE importacoes ADD COLUMN IF NOT EXISTS modo VARCHAR(20) NOT NULL DEFAULT 'inserir';
+ALTER TABLE importacoes ADD COLUMN IF NOT EXISTS inseridas INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE importacoes ADD COLUMN IF NOT EXISTS atualizadas INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE importacoes ADD COLUMN IF NOT EXISTS inalteradas INTEGER NOT NULL DEFAULT 0;
+"""
+
+DDL_HEARTBEAT = """
+ALTER TABLE importacoes ADD COLUMN IF NOT EXISTS heartbeat_em TIMESTAMP;
+ALTER TABLE importacoes ADD COLUMN IF NOT EXISTS tentativas INTEGER NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_importacoes_executando ON importacoes (heartbeat_em) WHERE status = 'executando';
+"""
+
+# O upload fica no banco como large object (gravado e lido em partes de TAMANHO_PARTE,
+# sem o arquivo inteiro em memória): um job que volta para a fila pode ser retomado
+# por um worker de outro host. `arquivo` passa a ser só o nome da cópia local que o
+# worker que executa extrai em PASTA_UPLOADS. O objeto é apagado quando o job termina.
+DDL_CONTEUDO = """
+ALTER TABLE importacoes ADD COLUMN IF NOT EXISTS conteudo OID;
+"""
+
+SQL_DESCARTAR_CONTEUDO = """
+SELECT lo_unlink(conteudo) FROM importacoes WHERE id = ANY(%(ids)s) AND conteudo IS NOT NULL;
+UPDATE importacoes SET conteudo = NULL WHERE id = ANY(%(ids)s) AND conteudo IS NOT NULL;
+"""
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    # Um executor por processo: threads não sobrevivem ao fork do gunicorn
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="importacao")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+# ===============================
+# Fila
+# ===============================
+def enfileirar_importacao(arquivo, nome_original=None, modo="inserir"):
+    """Grava o upload no banco, registra o job como pendente e acorda um worker"""
+    # O formato é detectado pelo conteúdo (importacao.detectar_formato); a extensão só ajuda quem olha a pasta
+    extensao = os.path.splitext(nome_original or "")[1].lower()
+    nome = f"{uuid.uuid4().hex}{extensao if extensao in EXTENSOES else '.csv'}"
+
+    conn = get_db()
+    try:
+        # Conteúdo e job na mesma transação: não sobra objeto órfão se o INSERT falhar
+        conteudo = conn.lobject(0, "wb")
+        total_bytes = 0
+        while parte := arquivo.read(TAMANHO_PARTE):
+            total_bytes += conteudo.write(parte)
+        conteudo.close()
+        cur = conn.cursor()
+        cur.execute("""
+            INSERT INTO importacoes (arquivo, nome_original, modo, total_bytes, conteudo) VALUES (%s,%s,%s,%s,%s)
+            RETURNING id
+        """, (nome, nome_original, modo, total_bytes, conteudo.oid))
+        job_id = cur.fetchone()[0]
+        conn.commit()
+    finally:
+        conn.close()
+
+    executor().submit(processar_pendentes)
+    return job_id
+
+def reservar_proximo():
+    """Pega o próximo job pendente; SKIP LOCKED evita que dois workers peguem o mesmo"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE importacoes SET status='executando', iniciada_em=CURRENT_TIMESTAMP,
+            heartbeat_em=CURRENT_TIMESTAMP, tentativas=tentativas + 1
+        WHERE id = (
+            SELECT id FROM importacoes WHERE status='pendente'
+            ORDER BY id FOR UPDATE SKIP LOCKED LIMIT 1
+        )
+        RETURNING id, arquivo, modo, conteudo
+    """)
+    job = cur.fetchone()
+    conn.commit()
+    conn.close()
+    return job
+
+def recuperar_travados():
+    """Jobs 'executando' sem heartbeat: o worker morreu e a transação da carga foi desfeita.
+    Voltam para a fila do zero, ou terminam em erro/cancelada; retorna quantos voltaram."""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE importacoes SET
+            status = CASE WHEN cancelar THEN 'cancelada'
+                          WHEN tentativas >= %(tentativas)s THEN 'erro'
+                          ELSE 'pendente' END,
+            erro = CASE WHEN NOT cancelar AND tentativas >= %(tentativas)s
+                        THEN 'o worker parou durante a importação ' || tentativas || ' vez(es)'
+                        ELSE erro END,
+            finalizada_em = CASE WHEN cancelar OR tentativas >= %(tentativas)s THEN CURRENT_TIMESTAMP END,
+            lidas = 0, importadas = 0, inseridas = 0, atualizadas = 0, inalteradas = 0,
+            rejeitadas = 0, bytes_lidos = 0
+        WHERE status = 'executando'
+          AND COALESCE(heartbeat_em, iniciada_em) < CURRENT_TIMESTAMP - %(minutos)s * interval '1 minute'
+        RETURNING id, status
+    """, {"tentativas": IMPORT_TENTATIVAS, "minutos": IMPORT_TRAVADO_MIN})
+    recuperados = cur.fetchall()
+    # Quem voltou para a fila mantém o conteúdo no banco para a próxima tentativa
+    cur.execute(SQL_DESCARTAR_CONTEUDO, {"ids": [job_id for job_id, status in recuperados if status != "pendente"]})
+    conn.commit()
+    conn.close()
+    for job_id, status in recuperados:
+        log.warning("Importação %s sem heartbeat há mais de %s min: %s", job_id, IMPORT_TRAVADO_MIN, status)
+    return sum(status == "pendente" for _, status in recuperados)
+
+def processar_pendentes():
+    recuperar_travados()
+    while True:
+        job = reservar_proximo()
+        if job is None:
+            return
+        executar_job(*job)
+
+def _descartar_conteudo(ids):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(SQL_DESCARTAR_CONTEUDO, {"ids": list(ids)})
+    conn.commit()
+    conn.close()
+
+def _atualizar(job_id, sql, params=()):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute(f"UPDATE importacoes SET {sql} WHERE id=%s", tuple(params) + (job_id,))
+    conn.commit()
+    conn.close()
+
+def _extrair_conteudo(conteudo, caminho):
+    """Copia o large object para `caminho` (os leitores de Parquet/XLSX precisam de seek)"""
+    os.makedirs(PASTA_UPLOADS, exist_ok=True)
+    conn = get_db()
+    try:
+        origem = conn.lobject(conteudo, "rb")
+        with open(caminho, "wb") as destino:
+            while parte := origem.read(TAMANHO_PARTE):
+                destino.write(parte)
+        origem.close()
+        conn.commit()
+    finally:
+        conn.close()
+
+def executar_job(job_id, arquivo, modo="inserir", conteudo=None):
+    def progresso(p):
+        # Progresso em conexão separada: a transação da carga só é confirmada no fim
+        conn = get_db()
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE importacoes SET lidas=%s, importadas=%s, inseridas=%s, atualizadas=%s, inalteradas=%s,
+                rejeitadas=%s, bytes_lidos=%s, heartbeat_em=CURRENT_TIMESTAMP
+            WHERE id=%s RETURNING cancelar
+        """, (p["lidas"], p["importadas"], p["inseridas"], p["atualizadas"], p["inalteradas"],
+              p["rejeitadas"], p["bytes_lidos"], job_id))
+        cancelar = cur.fetchone()[0]
+        conn.commit()
+        conn.close()
+        return not cancelar
+
+    # Heartbeat à parte do progresso: um lote lento (ou a leitura de um XLSX grande)
+    # não deve parecer worker morto
+    parar = threading.Event()
+
+    def pulsar():
+        while not parar.wait(IMPORT_HEARTBEAT_S):
+            try:
+                _atualizar(job_id, "heartbeat_em=CURRENT_TIMESTAMP")
+            except Exception:
+                log.exception("Heartbeat da importação %s falhou", job_id)
+
+    # Jobs enfileirados antes do conteúdo no banco ainda têm o caminho completo em `arquivo`
+    if conteudo is not None:
+        arquivo = os.path.join(PASTA_UPLOADS, arquivo)
+    threading.Thread(target=pulsar, name=f"importacao-{job_id}-heartbeat", daemon=True).start()
+    conn = get_db()
+    try:
+        if conteudo is not None:
+            _extrair_conteudo(conteudo, arquivo)
+        with open(arquivo, "rb") as f:
+            resultado = importar_stream(conn, f, progresso=progresso, modo=modo)
+    except ImportacaoCancelada:
+        _atualizar(job_id, "status='cancelada', finalizada_em=CURRENT_TIMESTAMP")
+    except Exception as e:
+        log.exception("Importação %s falhou", job_id)
+        _atualizar(job_id, "status='erro', erro=%s, finalizada_em=CURRENT_TIMESTAMP", (str(e),))
+    else:
+        invalidar_cache()
+        _atualizar(job_id, """
+            status='concluida', lidas=%s, importadas=%s, inseridas=%s, atualizadas=%s, inalteradas=%s,
+            rejeitadas=%s, bytes_lidos=total_bytes, relatorio=%s, finalizada_em=CURRENT_TIMESTAMP
+        """, (resultado["lidas"], resultado["importadas"], resultado["inseridas"], resultado["atualizadas"],
+              resultado["inalteradas"], resultado["rejeitadas"], resultado["relatorio"]))
+    finally:
+        parar.set()
+        conn.close()
+        try:
+            os.remove(arquivo)
+        except OSError:
+            pass
+    # Concluída, com erro ou cancelada: não volta mais para a fila. (Se o worker morrer
+    # antes daqui, o conteúdo fica para a retomada em recuperar_travados.)
+    _descartar_conteudo([job_id])
+
+
+# ===============================
+# Consulta e cancelamento
+# ===============================
+def status_job(job_id):
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT id, nome_original, modo, status, total_bytes, bytes_lidos, lidas, importadas, inseridas,
+               atualizadas, inalteradas, rejeitadas, relatorio, erro, criada_em, iniciada_em, finalizada_em,
+               EXTRACT(EPOCH FROM (COALESCE(finalizada_em, CURRENT_TIMESTAMP) - iniciada_em)),
+               status = 'executando'
+                   AND COALESCE(heartbeat_em, iniciada_em) < CURRENT_TIMESTAMP - %s * interval '1 minute'
+        FROM importacoes WHERE id=%s
+    """, (IMPORT_TRAVADO_MIN, job_id))
+    row = cur.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    if row[-1]:
+        # A tela está acompanhando um job cujo worker morreu: recoloca na fila agora
+        if recuperar_travados():
+            executor().submit(processar_pendentes)
+        return status_job(job_id)
+
+    (id, nome, modo, status, total_bytes, bytes_lidos, lidas, importadas, inseridas, atualizadas,
+     inalteradas, rejeitadas, relatorio, erro, criada_em, iniciada_em, finalizada_em, decorrido, _) = row
+    decorrido = float(decorrido or 0)
+    eta = None
+    if status == "executando" and bytes_lidos and total_bytes:
+        # ETA linear pelo volume de bytes já consumido
+        eta = round(decorrido * (total_bytes - bytes_lidos) / bytes_lidos, 1)
+    return {
+        "id": id,
+        "arquivo": nome,
+        "modo": modo,
+        "status": status,
+        "progresso": round(bytes_lidos / total_bytes * 100, 1) if total_bytes else 0.0,
+        "lidas": lidas,
+        "importadas": importadas,
+        "inseridas": inseridas,
+        "atualizadas": atualizadas,
+        "inalteradas": inalteradas,
+        "rejeitadas": rejeitadas,
+        "linhas_por_segundo": round(lidas / decorrido, 1) if decorrido else 0.0,
+        "eta_segundos": eta,
+        "relatorio": relatorio,
+        "erro": erro,
+        "criada_em": criada_em.isoformat() if criada_em else None,
+        "iniciada_em": iniciada_em.isoformat() if iniciada_em else None,
+        "finalizada_em": finalizada_em.isoformat() if finalizada_em else None,
+    }
+
+def cancelar_job(job_id):
+    """Pendente é cancelado na hora; em execução é sinalizado e desfeito no próximo lote"""
+    conn = get_db()
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE importacoes
+        SET cancelar=TRUE,
+            status=CASE WHEN status='pendente' THEN 'cancelada' ELSE status END,
+            finalizada_em=CASE WHEN status='pendente' THEN CURRENT_TIMESTAMP ELSE finalizada_em END
+        WHERE id=%s AND status IN ('pendente','executando')
+        RETURNING status
+    """, (job_id,))
+    row = cur.fetchone()
+    if row and row[0] == "cancelada":
+        cur.execute(SQL_DESCARTAR_CONTEUDO, {"ids": [job_id]})
+    conn.commit()
+    conn.close()
+    return row is not None
@@ -0,0 +1,245 @@
+# metricas.py
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_app_context, request
+from flask.signals import before_render_template, template_rendered
+
+log_sql = logging.getLogger("chips.sql")
+
+SQL_LENTA_MS = float(os.getenv("SQL_LENTA_MS","200"))
+# Limites dos buckets dos histogramas (segundos), como no cliente Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# ===============================
+# Coletores (por processo: cada worker do gunicorn expõe os seus)
+# ===============================
+class Histograma:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.contagens = [0] * (len(buckets) + 1)  # último = +Inf
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        self.contagens[bisect_left(self.buckets, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requisicoes = {}   # (rota, metodo, status) -> n
+        self.duracao = {}       # rota -> Histograma
+        self.por_rota = {}      # rota -> {"db": s, "render": s, "consultas": n, "linhas": n}
+        self.consultas_lentas = 0
+
+    def registrar_requisicao(self, rota, metodo, status, duracao, db, render, consultas, linhas):
+        with self._lock:
+            chave = (rota, metodo, status)
+            self.requisicoes[chave] = self.requisicoes.get(chave, 0) + 1
+            self.duracao.setdefault(rota, Histograma()).observar(duracao)
+            soma = self.por_rota.setdefault(rota, {"db": 0.0, "render": 0.0, "consultas": 0, "linhas": 0})
+            soma["db"] += db
+            soma["render"] += render
+            soma["consultas"] += consultas
+            soma["linhas"] += linhas
+
+    def registrar_lenta(self):
+        with self._lock:
+            self.consultas_lentas += 1
+
+registro = Registro()
+
+
+# ===============================
+# Medição por requisição
+# ===============================
+def _medicao():
+    """Acumuladores da requisição atual (None fora de uma requisição, ex.: threads de job)"""
+    if has_app_context():
+        return g.get("medicao")
+    return None
+
+def registrar_consulta(sql, params, duracao, linhas=0):
+    m = _medicao()
+    if m is not None:
+        m["db"] += duracao
+        m["consultas"] += 1
+        m["linhas"] += linhas
+    if duracao * 1000 >= SQL_LENTA_MS:
+        registro.registrar_lenta()
+        texto = sql.decode() if isinstance(sql, bytes) else str(sql)
+        log_sql.warning("Consulta lenta (%.1f ms): %s | parâmetros: %.500r",
+                        duracao * 1000, " ".join(texto.split()), params)
+
+def registrar_fetch(duracao, linhas):
+    m = _medicao()
+    if m is not None:
+        m["db"] += duracao
+        m["linhas"] += linhas
+
+
+class CursorMedido:
+    """Proxy de cursor DB-API (psycopg2 ou pyodbc): mede tempo de execute/fetch, conta
+    consultas e linhas e registra as lentas. O resto vai direto para o cursor real."""
+
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, nome):
+        return getattr(self._cursor, nome)
+
+    def __setattr__(self, nome, valor):
+        # fast_executemany, itersize, arraysize... são do cursor real
+        if nome == "_cursor":
+            object.__setattr__(self, nome, valor)
+        else:
+            setattr(self._cursor, nome, valor)
+
+    def _medir(self, metodo, sql, params):
+        inicio = time.perf_counter()
+        try:
+            return metodo(sql) if params is None else metodo(sql, params)
+        finally:
+            registrar_consulta(sql, params, time.perf_counter() - inicio)
+
+    def execute(self, sql, params=None):
+        self._medir(self._cursor.execute, sql, params)
+        return self
+
+    def executemany(self, sql, seq_params):
+        return self._medir(self._cursor.executemany, sql, seq_params)
+
+    def copy_expert(self, sql, arquivo, *args):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.copy_expert(sql, arquivo, *args)
+        finally:
+            registrar_consulta(sql, None, time.perf_counter() - inicio)
+
+    def _fetch(self, metodo, *args):
+        inicio = time.perf_counter()
+        linhas = metodo(*args)
+        n = 1 if linhas is not None and not isinstance(linhas, list) else len(linhas or ())
+        registrar_fetch(time.perf_counter() - inicio, n)
+        return linhas
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+    def __iter__(self):
+        cursor = iter(self._cursor)
+        while True:
+            inicio = time.perf_counter()
+            try:
+                linha = next(cursor)
+            except StopIteration:
+                return
+            registrar_fetch(time.perf_counter() - inicio, 1)
+            yield linha
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+# ===============================
+# Integração com o Flask
+# ===============================
+def _inicio_render(app, template, context, **extra):
+    m = _medicao()
+    if m is not None:
+        m["_render_inicio"] = time.perf_counter()
+
+def _fim_render(app, template, context, **extra):
+    m = _medicao()
+    if m is not None and m.get("_render_inicio"):
+        m["render"] += time.perf_counter() - m.pop("_render_inicio")
+
+def instrumentar(app):
+    """Mede cada requisição e adiciona o cabeçalho Server-Timing"""
+    before_render_template.connect(_inicio_render, app)
+    template_rendered.connect(_fim_render, app)
+
+    @app.before_request
+    def _iniciar():
+        g.medicao = {"inicio": time.perf_counter(), "db": 0.0, "render": 0.0, "consultas": 0, "linhas": 0}
+
+    # Em respostas em streaming (?todos=1, exportação) só entra o trecho até o envio
+    # dos cabeçalhos: o resto do tempo acontece depois do after_request.
+    @app.after_request
+    def _finalizar(resposta):
+        m = g.pop("medicao", None)
+        if m is None:
+            return resposta
+        total = time.perf_counter() - m["inicio"]
+        # Rota pelo padrão da URL (/chips/editar/<int:id>), não pela URL concreta
+        rota = request.url_rule.rule if request.url_rule else "desconhecida"
+        registro.registrar_requisicao(rota, request.method, resposta.status_code, total,
+                                      m["db"], m["render"], m["consultas"], m["linhas"])
+        resposta.headers.add("Server-Timing",
+                             f'db;dur={m["db"] * 1000:.1f};desc="{m["consultas"]} consultas, {m["linhas"]} linhas", '
+                             f'render;dur={m["render"] * 1000:.1f}, total;dur={total * 1000:.1f}')
+        return resposta
+
+
+# ===============================
+# Exposição no formato texto do Prometheus
+# ===============================
+def _rotulos(**rotulos):
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in rotulos.items()) + "}"
+
+def exportar_prometheus(extras=()):
+    """`extras`: (nome, tipo, ajuda, {rótulos_tuple: valor}) de outras fontes (pool, agendador)"""
+    linhas = []
+    with registro._lock:
+        linhas += ["# HELP chips_http_requisicoes_total Requisições atendidas",
+                   "# TYPE chips_http_requisicoes_total counter"]
+        for (rota, metodo, status), n in sorted(registro.requisicoes.items()):
+            linhas.append(f"chips_http_requisicoes_total{_rotulos(rota=rota, metodo=metodo, status=status)} {n}")
+
+        linhas += ["# HELP chips_http_duracao_segundos Latência por rota",
+                   "# TYPE chips_http_duracao_segundos histogram"]
+        for rota, h in sorted(registro.duracao.items()):
+            acumulado = 0
+            for limite, n in zip(h.buckets + (float("inf"),), h.contagens):
+                acumulado += n
+                le = "+Inf" if limite == float("inf") else limite
+                linhas.append(f"chips_http_duracao_segundos_bucket{_rotulos(rota=rota, le=le)} {acumulado}")
+            linhas.append(f"chips_http_duracao_segundos_sum{_rotulos(rota=rota)} {h.soma:.6f}")
+            linhas.append(f"chips_http_duracao_segundos_count{_rotulos(rota=rota)} {h.total}")
+
+        for campo, nome, ajuda in (("db", "chips_http_db_segundos_total", "Tempo em banco por rota"),
+                                   ("render", "chips_http_render_segundos_total", "Tempo renderizando templates por rota"),
+                                   ("consultas", "chips_http_consultas_total", "Consultas SQL executadas por rota"),
+                                   ("linhas", "chips_http_linhas_total", "Linhas lidas do banco por rota")):
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} counter"]
+            for rota, soma in sorted(registro.por_rota.items()):
+                valor = f"{soma[campo]:.6f}" if isinstance(soma[campo], float) else soma[campo]
+                linhas.append(f"{nome}{_rotulos(rota=rota)} {valor}")
+
+        linhas += ["# HELP chips_sql_lentas_total Consultas acima de SQL_LENTA_MS",
+                   "# TYPE chips_sql_lentas_total counter",
+                   f"chips_sql_lentas_total {registro.consultas_lentas}"]
+
+    for nome, tipo, ajuda, valores in extras:
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+        for rotulos, valor in valores.items():
+            linhas.append(f"{nome}{_rotulos(**dict(rotulos)) if rotulos else ''} {valor}")
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,237 @@
+# migracoes.py
+"""Migrações versionadas do esquema PostgreSQL.
+
+Rodam uma vez por deploy, fora dos workers (release do Procfile):
+
+    flask --app app migrar            # aplica as pendentes
+    flask --app app migrar --status   # lista aplicadas/pendentes
+    python -m migracoes               # mesmo efeito, sem carregar o app Flask
+
+Cada versão roda na própria transação e fica registrada em schema_migrations. As
+versões só crescem: para mudar o esquema, acrescente uma nova no fim de MIGRACOES,
+nunca edite uma que já foi aplicada. As primeiras reproduzem o antigo init_db() e são
+idempotentes, então um banco criado por ele só ganha o registro das versões.
+"""
+import logging
+import sys
+import time
+
+import psycopg2
+
+from analitico import DDL_ANALITICO, DDL_CONTROLE_RESUMOS
+from db import get_db
+from eventos import DDL_EVENTOS, EVENTOS_MESES_DEPLOY, garantir_particoes
+from jobs import DDL_CONTEUDO, DDL_HEARTBEAT, DDL_IMPORTACOES
+from notificacoes import DDL_NOTIFICACOES
+
+log = logging.getLogger(__name__)
+
+# Advisory lock: dois deploys simultâneos não aplicam a mesma versão
+CHAVE_LOCK = 7_241_002
+LISTA_CONFLITOS_MAX = 50
+
+class MigracaoBloqueada(Exception):
+    """Dados existentes impedem a versão; nada foi alterado (a transação é desfeita)"""
+
+
+DDL_CONTROLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    versao INTEGER PRIMARY KEY,
+    descricao TEXT NOT NULL,
+    aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duracao_ms INTEGER
+)
+"""
+
+
+# ===============================
+# Versões
+# ===============================
+def criar_chips(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS chips (
+        id SERIAL PRIMARY KEY,
+        numero_chip VARCHAR(20) NOT NULL,
+        status VARCHAR(20) NOT NULL CHECK (status IN ('disponivel','banido','em_uso')),
+        ultima_utilizacao DATE,
+        primeira_recarga DATE,
+        proxima_recarga DATE,
+        proxima_utilizacao DATE,
+        data_banimento DATE,
+        observacoes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """)
+    # Índices da listagem paginada (keyset por id DESC + filtros)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chips_status_id ON chips (status, id DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chips_created_at ON chips (created_at)")
+    # Índices parciais dos alertas: só contêm as linhas que podem gerar aviso
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chips_banidos ON chips (proxima_utilizacao) WHERE status = 'banido'")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chips_recarga ON chips (proxima_recarga) WHERE status <> 'banido'")
+
+def numero_normalizado_unico(cur):
+    # Unicidade pelo número normalizado (só dígitos, como normalizar_telefone). Número
+    # sem dígitos normaliza para '' e fica fora do índice: as telas e a importação já o
+    # recusam, e os legados não devem colidir entre si.
+    cur.execute(r"""
+        ALTER TABLE chips ADD COLUMN IF NOT EXISTS numero_normalizado VARCHAR(20)
+        GENERATED ALWAYS AS (regexp_replace(numero_chip, '\D', '', 'g')) STORED
+    """)
+    cur.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'uq_chips_numero_normalizado'")
+    if cur.fetchone() is None:
+        # Duplicatas não são apagadas aqui: quem decide qual cadastro fica é o operador
+        cur.execute("""
+            SELECT numero_normalizado, array_agg(id ORDER BY id) FROM chips
+            WHERE numero_normalizado <> ''
+            GROUP BY numero_normalizado HAVING count(*) > 1
+            ORDER BY numero_normalizado
+        """)
+        conflitos = cur.fetchall()
+        if conflitos:
+            raise MigracaoBloqueada(
+                f"{len(conflitos)} números normalizados repetidos em chips; resolva antes de migrar:\n"
+                + "\n".join(f"  {numero}: ids {ids}" for numero, ids in conflitos[:LISTA_CONFLITOS_MAX])
+                + (f"\n  ... e mais {len(conflitos) - LISTA_CONFLITOS_MAX}" if len(conflitos) > LISTA_CONFLITOS_MAX else ""))
+        cur.execute("""
+            CREATE UNIQUE INDEX uq_chips_numero_normalizado ON chips (numero_normalizado)
+            WHERE numero_normalizado <> ''
+        """)
+
+def criar_importacoes(cur):
+    cur.execute(DDL_IMPORTACOES)
+
+def criar_eventos(cur):
+    cur.execute(DDL_EVENTOS)
+    garantir_particoes(cur)
+
+def criar_resumos_analiticos(cur):
+    cur.execute(DDL_ANALITICO)
+
+def recarga_vencida(cur):
+    # Marcado pelo agendador quando a próxima recarga já passou
+    cur.execute("ALTER TABLE chips ADD COLUMN IF NOT EXISTS recarga_vencida BOOLEAN NOT NULL DEFAULT FALSE")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_chips_recarga_vencida ON chips (id) WHERE recarga_vencida")
+
+def indice_alocacao(cur):
+    # Fila de alocação: disponíveis do menos usado para o mais usado (acoes.alocar)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chips_alocacao ON chips (ultima_utilizacao NULLS FIRST, id)
+        WHERE status = 'disponivel'
+    """)
+
+def busca_numero_normalizado(cur):
+    # A busca por número é feita nos dígitos (Repositorio.montar_filtros): prefixo em b-tree...
+    cur.execute("DROP INDEX IF EXISTS idx_chips_numero_prefixo")
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_chips_numero_normalizado_prefixo
+        ON chips (numero_normalizado varchar_pattern_ops)
+    """)
+    # ...e trecho no meio do número por trigramas. Sem permissão para criar a extensão a
+    # busca continua funcionando, só sem índice.
+    cur.execute("SAVEPOINT pg_trgm")
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chips_numero_normalizado_trgm
+            ON chips USING gin (numero_normalizado gin_trgm_ops)
+        """)
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT pg_trgm")
+
+def notificar_alteracoes(cur):
+    cur.execute(DDL_NOTIFICACOES)
+
+def heartbeat_importacoes(cur):
+    cur.execute(DDL_HEARTBEAT)
+
+def controle_resumos(cur):
+    cur.execute(DDL_CONTROLE_RESUMOS)
+
+def conteudo_importacoes(cur):
+    cur.execute(DDL_CONTEUDO)
+
+MIGRACOES = (
+    (1, "tabela chips e índices da listagem/alertas", criar_chips),
+    (2, "numero_normalizado único", numero_normalizado_unico),
+    (3, "fila de importações", criar_importacoes),
+    (4, "histórico chip_events particionado", criar_eventos),
+    (5, "resumos analíticos", criar_resumos_analiticos),
+    (6, "coluna recarga_vencida", recarga_vencida),
+    (7, "índice da fila de alocação", indice_alocacao),
+    (8, "busca pelos dígitos do número", busca_numero_normalizado),
+    (9, "NOTIFY das alterações em chips", notificar_alteracoes),
+    (10, "heartbeat das importações em execução", heartbeat_importacoes),
+    (11, "marca d'água dos resumos analíticos", controle_resumos),
+    (12, "upload das importações no banco", conteudo_importacoes),
+)
+
+
+# ===============================
+# Execução
+# ===============================
+def versoes_aplicadas(cur):
+    cur.execute(DDL_CONTROLE)
+    cur.execute("SELECT versao FROM schema_migrations")
+    return {versao for versao, in cur.fetchall()}
+
+def pendentes():
+    conn = get_db()
+    try:
+        aplicadas = versoes_aplicadas(conn.cursor())
+        conn.commit()
+    finally:
+        conn.close()
+    return [(versao, descricao) for versao, descricao, _ in MIGRACOES if versao not in aplicadas]
+
+def aplicar_migracoes():
+    """Aplica as versões pendentes em ordem; retorna [(versao, descricao, ms)] do que foi aplicado"""
+    conn = get_db()
+    cur = conn.cursor()
+    aplicadas = []
+    try:
+        for versao, descricao, migrar in MIGRACOES:
+            # Lock e verificação dentro da transação da versão: quem esperou o lock
+            # enxerga o que o outro processo acabou de aplicar
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (CHAVE_LOCK,))
+            if versao in versoes_aplicadas(cur):
+                conn.rollback()
+                continue
+            inicio = time.perf_counter()
+            migrar(cur)
+            ms = round((time.perf_counter() - inicio) * 1000)
+            cur.execute("INSERT INTO schema_migrations (versao, descricao, duracao_ms) VALUES (%s,%s,%s)",
+                        (versao, descricao, ms))
+            conn.commit()
+            log.info("Migração %s aplicada (%s) em %s ms", versao, descricao, ms)
+            aplicadas.append((versao, descricao, ms))
+        # Não é versão: roda a cada deploy para manter partições à frente do calendário
+        movidas = garantir_particoes(cur, EVENTOS_MESES_DEPLOY)
+        conn.commit()
+        if movidas:
+            log.warning("%s eventos movidos da partição DEFAULT de chip_events", movidas)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return aplicadas
+
+def imprimir_status():
+    faltando = pendentes()
+    print(f"{len(MIGRACOES) - len(faltando)} aplicadas, {len(faltando)} pendentes")
+    for versao, descricao in faltando:
+        print(f"  pendente {versao}: {descricao}")
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if "--status" in sys.argv[1:]:
+        imprimir_status()
+        return
+    try:
+        aplicadas = aplicar_migracoes()
+    except MigracaoBloqueada as e:
+        sys.exit(str(e))
+    print(f"{len(aplicadas)} migrações aplicadas" if aplicadas else "Esquema atualizado, nada a aplicar")
+
+if __name__ == "__main__":
+    main()
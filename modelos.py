@@ -0,0 +1,73 @@
+# modelos.py
+from collections import namedtuple
+from functools import lru_cache
+
+import psycopg2.extensions
+
+# Colunas que cada tela realmente usa (nada de SELECT *)
+COLUNAS_LISTAGEM = ("id","numero_chip","status","ultima_utilizacao","primeira_recarga","proxima_recarga",
+                    "proxima_utilizacao","data_banimento","recarga_vencida")
+COLUNAS_FORMULARIO = ("id","numero_chip","status","ultima_utilizacao","primeira_recarga","proxima_recarga",
+                      "observacoes")
+
+
+@lru_cache(maxsize=64)
+def tipo_chip(colunas):
+    """Um tipo Chip (namedtuple, sem __dict__ por linha) para cada combinação de colunas"""
+    return namedtuple("Chip", colunas, rename=True)
+
+
+class ChipCursor(psycopg2.extensions.cursor):
+    """Cursor que devolve as linhas como Chip: acesso por nome (chip.status) e ainda por posição"""
+
+    Chip = None
+
+    def execute(self, query, vars=None):
+        self.Chip = None
+        return super().execute(query, vars)
+
+    def _tipo(self):
+        if self.Chip is None:
+            self.Chip = tipo_chip(tuple(d[0] for d in self.description))
+        return self.Chip
+
+    def fetchone(self):
+        row = super().fetchone()
+        return None if row is None else self._tipo()._make(row)
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(size) if size is not None else super().fetchmany()
+        return [self._tipo()._make(r) for r in rows] if rows else rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        return [self._tipo()._make(r) for r in rows] if rows else rows
+
+    def __iter__(self):
+        # super().__iter__() devolve o próprio cursor (iterar nele chamaria este método de
+        # novo, uma vez por linha): as linhas vêm direto do __next__ do psycopg2. Em cursor
+        # nomeado a description só existe depois do primeiro FETCH.
+        proximo = super().__next__
+        try:
+            row = proximo()
+        except StopIteration:
+            return
+        Chip = self._tipo()
+        yield Chip._make(row)
+        while True:
+            try:
+                row = proximo()
+            except StopIteration:
+                return
+            yield Chip._make(row)
+
+
+def chip_de_dados(id, dados):
+    """Chip a partir da tupla de salvar_chip (para reexibir o formulário com o que foi digitado)"""
+    numero, status, ultima, primeira, proxima, _, _, obs = dados
+    return tipo_chip(COLUNAS_FORMULARIO)(id, numero, status, ultima, primeira, proxima, obs)
+
+def buscar_chip(conn, id, colunas=COLUNAS_FORMULARIO):
+    cur = conn.cursor(cursor_factory=ChipCursor)
+    cur.execute(f"SELECT {','.join(colunas)} FROM chips WHERE id=%s", (id,))
+    return cur.fetchone()
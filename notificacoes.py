@@ -0,0 +1,206 @@
+# notificacoes.py
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from datetime import date
+
+import psycopg2
+
+from db import get_db, _conectar_postgres
+from modelos import COLUNAS_LISTAGEM
+
+log = logging.getLogger(__name__)
+
+CANAL = "chips_alterados"
+# Acima disso a notificação manda só "recarregar": o payload do NOTIFY tem limite de 8000 bytes
+NOTIFICACAO_MAX_IDS = 500
+# Por worker; cada cliente prende uma thread (manter abaixo do --threads). 0 desliga o ao vivo
+SSE_MAX_CLIENTES = int(os.getenv("SSE_MAX_CLIENTES","8"))
+SSE_FILA = 100            # mensagens pendentes por navegador antes de mandá-lo recarregar
+SSE_PING_S = 15.0         # comentário periódico: mantém proxies sem cortar a conexão ociosa
+ESPERA_RECONEXAO_S = 5.0
+
+# Toda escrita em chips já grava chip_events no mesmo statement (rotas, API, importação,
+# agendador). Um trigger por statement nessa tabela emite o NOTIFY, que o PostgreSQL só
+# entrega no COMMIT: transação desfeita não notifica ninguém.
+DDL_NOTIFICACOES = f"""
+CREATE OR REPLACE FUNCTION notificar_chips_alterados() RETURNS trigger AS $$
+DECLARE
+    grupo RECORD;
+BEGIN
+    FOR grupo IN SELECT tipo, array_agg(DISTINCT chip_id) AS ids FROM novos GROUP BY tipo LOOP
+        IF cardinality(grupo.ids) > {NOTIFICACAO_MAX_IDS} THEN
+            PERFORM pg_notify('{CANAL}', json_build_object('tipo', grupo.tipo, 'recarregar', true)::text);
+        ELSE
+            PERFORM pg_notify('{CANAL}', json_build_object('tipo', grupo.tipo, 'ids', grupo.ids)::text);
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+DROP TRIGGER IF EXISTS chip_events_notificar ON chip_events;
+CREATE TRIGGER chip_events_notificar AFTER INSERT ON chip_events
+REFERENCING NEW TABLE AS novos FOR EACH STATEMENT EXECUTE FUNCTION notificar_chips_alterados();
+"""
+
+
+def _json_valor(valor):
+    return valor.isoformat() if isinstance(valor, date) else valor
+
+def montar_diffs(cur, notificacoes):
+    """Converte as notificações de um ciclo em mensagens por linha para os navegadores.
+
+    Uma consulta só para todos os ids: "atualizar" traz a linha como está agora (o
+    navegador substitui as células), "remover" é para ids que não existem mais.
+    """
+    if any(n.get("recarregar") for n in notificacoes):
+        return [{"op": "recarregar"}]
+    ids = sorted({i for n in notificacoes for i in n.get("ids") or ()})
+    if not ids:
+        return []
+    cur.execute(f"SELECT {','.join(COLUNAS_LISTAGEM)} FROM chips WHERE id = ANY(%s)", (ids,))
+    linhas = {linha[0]: dict(zip(COLUNAS_LISTAGEM, map(_json_valor, linha))) for linha in cur.fetchall()}
+    return [{"op": "atualizar", "chip": linhas[i]} if i in linhas else {"op": "remover", "id": i} for i in ids]
+
+
+class Ouvinte:
+    """Uma conexão LISTEN por worker, compartilhada por todos os navegadores conectados.
+
+    A thread só sobe com o primeiro inscrito, para não abrir conexão em worker que
+    ninguém está assistindo. Cada inscrito é uma fila limitada; quem não consome
+    (aba em segundo plano, rede lenta) é descartado e recebe "recarregar" ao voltar.
+    """
+
+    def __init__(self, max_clientes=SSE_MAX_CLIENTES):
+        self.max_clientes = max_clientes
+        self._pid = None
+        self._lock = threading.Lock()
+        self._inscritos = set()
+        self._consumidores = []
+        self.notificacoes = 0
+        self.mensagens = 0
+        self.descartados = 0
+        self.reconexoes = 0
+
+    def _iniciar(self):
+        # Thread por processo (a do pai não existe no worker depois do fork); chamar com o lock
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            threading.Thread(target=self._loop, name="ouvinte-notify", daemon=True).start()
+
+    def iniciar(self):
+        with self._lock:
+            self._iniciar()
+
+    def registrar(self, consumidor):
+        """Além dos navegadores, `consumidor` recebe as mesmas mensagens no processo:
+        ao_conectar() depois de cada LISTEN (inclusive reconexões) e ao_alterar(mensagens)
+        a cada ciclo. Ambos rodam na thread do ouvinte, em ordem."""
+        with self._lock:
+            if consumidor not in self._consumidores:
+                self._consumidores.append(consumidor)
+
+    def inscrever(self):
+        """Nova fila de mensagens, ou None se o worker já está no limite de clientes"""
+        with self._lock:
+            if len(self._inscritos) >= self.max_clientes:
+                return None
+            fila = queue.Queue(SSE_FILA)
+            self._inscritos.add(fila)
+            self._iniciar()
+        return fila
+
+    def cancelar(self, fila):
+        with self._lock:
+            self._inscritos.discard(fila)
+
+    def _distribuir(self, mensagens):
+        with self._lock:
+            inscritos = list(self._inscritos)
+        for fila in inscritos:
+            for mensagem in mensagens:
+                try:
+                    fila.put_nowait(mensagem)
+                except queue.Full:
+                    # Perdeu mensagens: esvazia e manda recarregar a página inteira
+                    with fila.mutex:
+                        fila.queue.clear()
+                    fila.put_nowait({"op": "recarregar"})
+                    with self._lock:
+                        self.descartados += 1
+                    break
+        with self._lock:
+            self.mensagens += len(mensagens) * len(inscritos)
+
+    def _escutar(self):
+        conn = _conectar_postgres()
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            conn.cursor().execute(f"LISTEN {CANAL}")
+            for consumidor in self._consumidores:
+                consumidor.ao_conectar()
+            while True:
+                if select.select([conn], [], [], SSE_PING_S) == ([], [], []):
+                    continue
+                conn.poll()
+                if not conn.notifies:
+                    continue
+                notificacoes = [json.loads(n.payload) for n in conn.notifies]
+                conn.notifies.clear()
+                with self._lock:
+                    self.notificacoes += len(notificacoes)
+                leitura = get_db()
+                try:
+                    mensagens = montar_diffs(leitura.cursor(), notificacoes)
+                finally:
+                    leitura.close()
+                if mensagens:
+                    for consumidor in self._consumidores:
+                        consumidor.ao_alterar(mensagens)
+                    self._distribuir(mensagens)
+        finally:
+            conn.close()
+
+    def _loop(self):
+        while True:
+            try:
+                self._escutar()
+            except Exception:
+                log.exception("Conexão LISTEN perdida; reconectando em %ss", ESPERA_RECONEXAO_S)
+            # Notificações do intervalo sem conexão se perderam
+            with self._lock:
+                self.reconexoes += 1
+            self._distribuir([{"op": "recarregar"}])
+            time.sleep(ESPERA_RECONEXAO_S)
+
+    def metricas(self):
+        with self._lock:
+            return {
+                "clientes": len(self._inscritos),
+                "max_clientes": self.max_clientes,
+                "notificacoes": self.notificacoes,
+                "mensagens": self.mensagens,
+                "descartados": self.descartados,
+                "reconexoes": self.reconexoes,
+            }
+
+ouvinte = Ouvinte()
+
+def eventos_sse(fila):
+    """Gerador do corpo text/event-stream de um navegador inscrito"""
+    try:
+        yield f"retry: {int(ESPERA_RECONEXAO_S * 1000)}\n\n"
+        while True:
+            try:
+                mensagem = fila.get(timeout=SSE_PING_S)
+            except queue.Empty:
+                yield ": ping\n\n"
+                continue
+            yield f"data: {json.dumps(mensagem, separators=(',', ':'))}\n\n"
+    finally:
+        # Navegador fechou a aba (GeneratorExit na próxima escrita)
+        ouvinte.cancelar(fila)
@@ -0,0 +1,338 @@
+# repositorio.py
+from contextlib import contextmanager
+from datetime import timedelta
+
+import acoes
+from db import pool_postgres
+from importacao import SQL_STAGING, TAMANHO_LOTE, gravar_lote
+from modelos import ChipCursor, COLUNAS_LISTAGEM
+from utilitarios import str_para_date, normalizar_telefone, escapar_like
+
+# Uma interface para os dois esquemas (chips no PostgreSQL, Chips no SQL Server): listar
+# com filtros e paginação keyset, obter, inserir/atualizar, upsert_em_lote, transicionar e
+# excluir. Filtros e página são montados uma vez só, aqui; cada backend ajusta nomes de
+# colunas e o dialeto (marcador, LIMIT, ESCAPE) nos atributos e usa o mecanismo em lote
+# mais rápido do seu driver.
+
+POR_PAGINA_PADRAO = 50
+POR_PAGINA_MAX = 500
+
+
+def ler_paginacao(args):
+    try:
+        por_pagina = int(args.get("por_pagina", POR_PAGINA_PADRAO))
+    except ValueError:
+        por_pagina = POR_PAGINA_PADRAO
+    por_pagina = max(1, min(por_pagina, POR_PAGINA_MAX))
+    try:
+        apos = int(args["apos"]) if args.get("apos") else None
+    except ValueError:
+        apos = None
+    return apos, por_pagina
+
+def fatiar_pagina(linhas, por_pagina):
+    proximo = linhas[por_pagina - 1][0] if len(linhas) > por_pagina else None  # id é a 1ª coluna
+    return linhas[:por_pagina], proximo
+
+def padrao_busca(valor, busca):
+    """Padrão LIKE dos filtros de texto (`valor` já escapado): prefixo com busca=inicio, trecho no resto"""
+    return f"{valor}%" if busca == "inicio" else f"%{valor}%"
+
+
+class Repositorio:
+    """Implementação genérica (SQL padrão, parâmetros posicionais); os backends
+    ajustam o esquema nos atributos e sobrescrevem o que o driver faz melhor."""
+
+    marcador = "%s"
+    tabela = "chips"
+    chave = "id"
+    coluna_numero = "numero_chip"
+    # Só os dígitos do número, coluna gravada e indexada (ver normalizar_telefone)
+    coluna_numero_busca = "numero_normalizado"
+    coluna_status = "status"
+    coluna_data = "created_at"
+    coluna_usuario = None
+    # Nome do filtro de status na querystring de cada tela
+    filtro_status = "status"
+    # `numero` sem busca=...: prefixo (sargable) ou trecho em qualquer posição
+    busca_padrao = "inicio"
+    escape_like = " ESCAPE '\\'"
+    # Colunas das escritas, na ordem das tuplas recebidas
+    colunas = ("numero_chip","status","ultima_utilizacao","primeira_recarga","proxima_recarga",
+               "proxima_utilizacao","data_banimento","observacoes")
+    colunas_listagem = ("id",) + colunas
+    # Limite de parâmetros por statement (IN com muitos ids é quebrado em partes)
+    max_parametros = 999
+
+    def __init__(self, pool=None):
+        self.pool = pool
+
+    @contextmanager
+    def transacao(self, conn=None):
+        """Commit no sucesso, rollback no erro, conexão devolvida ao pool. Com `conn`,
+        roda na transação de quem chamou, que faz o commit."""
+        if conn is not None:
+            yield conn
+            return
+        with self.pool.conexao() as conn:
+            yield conn
+
+    def cursor(self, conn):
+        return conn.cursor()
+
+    def sql_limite(self, sql):
+        return sql + f" LIMIT {self.marcador}"
+
+    # ---------- leitura ----------
+    def montar_filtros(self, args):
+        """WHERE da listagem a partir da querystring: status, numero (prefixo ou trecho,
+        conforme `busca`), contem (trecho), usuario e data_ini/data_fim"""
+        m = self.marcador
+        where = []
+        params = []
+        busca = args.get("busca") or self.busca_padrao
+        status = (args.get(self.filtro_status) or "").strip()
+        numero = normalizar_telefone((args.get("numero") or "").strip())
+        contem = normalizar_telefone((args.get("contem") or "").strip())
+        usuario = (args.get("usuario") or "").strip() if self.coluna_usuario else ""
+        data_ini = str_para_date((args.get("data_ini") or "").strip())
+        data_fim = str_para_date((args.get("data_fim") or "").strip())
+
+        if status:
+            where.append(f"{self.coluna_status} = {m}")
+            params.append(status)
+        # Busca pelos dígitos: "(11) 9 1234" e "119 1234" acham o mesmo chip. Só dígitos,
+        # nada a escapar. Prefixo usa o índice b-tree da coluna; trecho, o de trigramas
+        # no PostgreSQL
+        if numero:
+            where.append(f"{self.coluna_numero_busca} LIKE {m}")
+            params.append(padrao_busca(numero, busca))
+        if contem:
+            where.append(f"{self.coluna_numero_busca} LIKE {m}")
+            params.append(padrao_busca(contem, "contem"))
+        if usuario:
+            where.append(f"{self.coluna_usuario} LIKE {m}{self.escape_like}")
+            params.append(padrao_busca(escapar_like(usuario), busca))
+        # Intervalo semiaberto em vez de CAST da coluna para data: mantém o índice utilizável
+        if data_ini:
+            where.append(f"{self.coluna_data} >= {m}")
+            params.append(data_ini)
+        if data_fim:
+            where.append(f"{self.coluna_data} < {m}")
+            params.append(data_fim + timedelta(days=1))
+        return where, params
+
+    def sql_filtrado(self, args, colunas=None):
+        """(sql, params) de todas as linhas do filtro, id decrescente"""
+        where, params = self.montar_filtros(args)
+        sql = f"SELECT {','.join(colunas or self.colunas_listagem)} FROM {self.tabela}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql + f" ORDER BY {self.chave} DESC", params
+
+    def sql_pagina(self, args, colunas=None):
+        """(sql, params, por_pagina) da página keyset: WHERE id < :apos ORDER BY id DESC, n+1 linhas"""
+        where, params = self.montar_filtros(args)
+        apos, por_pagina = ler_paginacao(args)
+        if apos is not None:
+            where.append(f"{self.chave} < {self.marcador}")
+            params.append(apos)
+        sql = f"SELECT {','.join(colunas or self.colunas_listagem)} FROM {self.tabela}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql = self.sql_limite(sql + f" ORDER BY {self.chave} DESC")
+        return sql, params + [por_pagina + 1], por_pagina
+
+    def buscar_pagina(self, cur, args, colunas=None):
+        """Página no cursor dado; retorna (linhas, id para a próxima página ou None)"""
+        sql, params, por_pagina = self.sql_pagina(args, colunas)
+        cur.execute(sql, params)
+        return fatiar_pagina(cur.fetchall(), por_pagina)
+
+    def listar(self, args, colunas=None, conn=None):
+        """Página keyset (custo constante por página); retorna (linhas, próximo id ou None)"""
+        with self.transacao(conn) as conn:
+            return self.buscar_pagina(self.cursor(conn), args, colunas)
+
+    def obter(self, id, colunas=None, conn=None):
+        with self.transacao(conn) as conn:
+            cur = self.cursor(conn)
+            cur.execute(f"SELECT {','.join(colunas or self.colunas_listagem)} FROM {self.tabela} "
+                        f"WHERE {self.chave} = {self.marcador}", (id,))
+            return cur.fetchone()
+
+    # ---------- escrita ----------
+    def _em_partes(self, ids, reservados=0):
+        ids = list(ids)
+        passo = self.max_parametros - reservados
+        for i in range(0, len(ids), passo):
+            yield ids[i:i + passo]
+
+    def transicionar(self, ids, valores, evento, conn=None):
+        """UPDATE set-based de `valores` ({coluna: valor}) nos `ids`; retorna linhas alteradas.
+        `evento` é o tipo gravado no histórico, nos backends que têm um."""
+        sets = ",".join(f"{c}={self.marcador}" for c in valores)
+        total = 0
+        with self.transacao(conn) as conn:
+            cur = self.cursor(conn)
+            for parte in self._em_partes(ids, len(valores)):
+                cur.execute(f"UPDATE {self.tabela} SET {sets} WHERE {self.chave} IN "
+                            f"({','.join([self.marcador] * len(parte))})", tuple(valores.values()) + tuple(parte))
+                total += cur.rowcount
+        return total
+
+    def excluir(self, ids, conn=None):
+        total = 0
+        with self.transacao(conn) as conn:
+            cur = self.cursor(conn)
+            for parte in self._em_partes(ids):
+                cur.execute(f"DELETE FROM {self.tabela} WHERE {self.chave} IN "
+                            f"({','.join([self.marcador] * len(parte))})", tuple(parte))
+                total += cur.rowcount
+        return total
+
+
+# ===============================
+# PostgreSQL: COPY + ON CONFLICT, = ANY(%s), eventos em chip_events
+# ===============================
+class RepositorioPostgres(Repositorio):
+
+    colunas_listagem = COLUNAS_LISTAGEM
+
+    def cursor(self, conn):
+        return conn.cursor(cursor_factory=ChipCursor)
+
+    def inserir(self, dados, conn=None):
+        """`dados` na ordem de `colunas` (tupla de salvar_chip); retorna o id criado"""
+        with self.transacao(conn) as conn:
+            return acoes.inserir_chip(conn.cursor(), tuple(dados))
+
+    def atualizar(self, id, dados, conn=None):
+        with self.transacao(conn) as conn:
+            return acoes.atualizar_chip(conn.cursor(), id, tuple(dados))
+
+    def transicionar(self, ids, valores, evento, conn=None):
+        # Um UPDATE com id = ANY(%s), qualquer que seja o número de ids
+        with self.transacao(conn) as conn:
+            return acoes.transicionar(conn.cursor(), ids, valores, evento)
+
+    def excluir(self, ids, conn=None):
+        with self.transacao(conn) as conn:
+            return acoes.deletar(conn.cursor(), ids)
+
+    def upsert_em_lote(self, linhas, modo="atualizar", conn=None):
+        """COPY para a tabela temporária e INSERT ... ON CONFLICT pelo número normalizado,
+        o caminho da importação. `modo` como em MODOS_IMPORTACAO; retorna
+        (inseridas, atualizadas), sem contar as linhas que já estavam iguais."""
+        linhas = [tuple(l) for l in linhas]
+        inseridas = atualizadas = 0
+        with self.transacao(conn) as conn:
+            cur = conn.cursor()
+            cur.execute(SQL_STAGING)
+            for i in range(0, len(linhas), TAMANHO_LOTE):
+                ins, atu, _ = gravar_lote(cur, linhas[i:i + TAMANHO_LOTE], modo)
+                inseridas += ins
+                atualizadas += atu
+        return inseridas, atualizadas
+
+repositorio_postgres = RepositorioPostgres(pool_postgres)
+
+
+# ===============================
+# SQL Server (pyodbc): fast_executemany + MERGE, OUTPUT INSERTED
+# ===============================
+class RepositorioSqlServer(Repositorio):
+
+    marcador = "?"
+    tabela = "Chips"
+    chave = "Id"
+    coluna_numero = "NumeroCelular"
+    coluna_numero_busca = "NumeroNormalizado"
+    coluna_status = "EstadoAtual"
+    coluna_data = "DataCadastro"
+    coluna_usuario = "Usuario"
+    filtro_status = "estado"
+    # A tela sempre achou o trecho em qualquer posição; busca=inicio usa os índices
+    busca_padrao = "contem"
+    colunas = ("NumeroCelular","EstadoAtual","Operadora","Status","Usuario")
+    colunas_listagem = ("Id","NumeroCelular","EstadoAtual","Operadora","Status","DataCadastro","Usuario")
+    max_parametros = 2000  # o limite do SQL Server é 2100 por statement
+
+    def sql_limite(self, sql):
+        return sql + " OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+
+    # NumeroNormalizado é gravado aqui, com normalizar_telefone (o T-SQL não tem regex
+    # para uma coluna calculada equivalente); vem sempre depois de `colunas`
+    def _com_normalizado(self, dados):
+        dados = tuple(dados)
+        return dados + (normalizar_telefone(dados[0]),)
+
+    def inserir(self, dados, conn=None):
+        with self.transacao(conn) as conn:
+            cur = conn.cursor()
+            cur.execute(f"""
+                INSERT INTO Chips ({','.join(self.colunas)}, NumeroNormalizado, DataCadastro)
+                OUTPUT INSERTED.Id
+                VALUES ({','.join('?' * (len(self.colunas) + 1))}, SYSDATETIME())
+            """, self._com_normalizado(dados))
+            return cur.fetchone()[0]
+
+    def atualizar(self, id, dados, conn=None):
+        sets = ",".join(f"{c}=?" for c in self.colunas + ("NumeroNormalizado",))
+        with self.transacao(conn) as conn:
+            cur = conn.cursor()
+            cur.execute(f"UPDATE Chips SET {sets} WHERE Id=?", self._com_normalizado(dados) + (id,))
+            return cur.rowcount
+
+    def upsert_em_lote(self, linhas, modo="atualizar", conn=None):
+        """Insere ou (modo atualizar) atualiza pelo número normalizado; retorna
+        (inseridas, atualizadas), sem contar as linhas que já estavam iguais"""
+        linhas = [self._com_normalizado(l) for l in linhas]
+        # Linha igual à cadastrada não conta como atualizada (EXCEPT compara NULLs como iguais)
+        quando_existe = """
+                WHEN MATCHED AND EXISTS (
+                    SELECT s.NumeroCelular, s.EstadoAtual, s.Operadora, s.Status, s.Usuario
+                    EXCEPT
+                    SELECT c.NumeroCelular, c.EstadoAtual, c.Operadora, c.Status, c.Usuario
+                ) THEN UPDATE SET NumeroCelular = s.NumeroCelular, EstadoAtual = s.EstadoAtual,
+                    Operadora = s.Operadora, Status = s.Status, Usuario = s.Usuario""" if modo == "atualizar" else ""
+        with self.transacao(conn) as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TABLE #chips_importacao (
+                    Ordem INT IDENTITY, NumeroCelular VARCHAR(20), EstadoAtual VARCHAR(20), Operadora VARCHAR(50),
+                    Status VARCHAR(50), Usuario VARCHAR(100), NumeroNormalizado VARCHAR(20)
+                )
+            """)
+            # Parâmetros enviados em array (um round-trip por lote, não por linha)
+            cur.fast_executemany = True
+            cur.executemany(f"INSERT INTO #chips_importacao ({','.join(self.colunas)}, NumeroNormalizado) "
+                            f"VALUES ({','.join('?' * (len(self.colunas) + 1))})", linhas)
+            cur.execute(f"""
+                SET NOCOUNT ON;
+                DECLARE @acoes TABLE (acao NVARCHAR(10));
+                -- HOLDLOCK: o intervalo procurado fica travado até o fim, e duas importações
+                -- simultâneas do mesmo número não inserem as duas
+                MERGE Chips WITH (HOLDLOCK) AS c
+                -- Número repetido no lote: vale a última ocorrência (MERGE não aceita a mesma
+                -- linha duas vezes). Sem dígitos não há chave: cada linha é um chip novo.
+                USING (
+                    SELECT * FROM (
+                        SELECT *, ROW_NUMBER() OVER (
+                            PARTITION BY COALESCE(NULLIF(NumeroNormalizado, ''), CONCAT('#', Ordem))
+                            ORDER BY Ordem DESC) AS n
+                        FROM #chips_importacao
+                    ) t WHERE n = 1
+                ) AS s ON c.NumeroNormalizado = s.NumeroNormalizado AND s.NumeroNormalizado <> ''{quando_existe}
+                WHEN NOT MATCHED THEN INSERT (NumeroCelular, EstadoAtual, Operadora, Status, Usuario, NumeroNormalizado,
+                                              DataCadastro)
+                    VALUES (s.NumeroCelular, s.EstadoAtual, s.Operadora, s.Status, s.Usuario, s.NumeroNormalizado,
+                            SYSDATETIME())
+                OUTPUT $action INTO @acoes;
+                SELECT SUM(CASE WHEN acao = 'INSERT' THEN 1 ELSE 0 END),
+                       SUM(CASE WHEN acao = 'UPDATE' THEN 1 ELSE 0 END)
+                FROM @acoes;
+            """)
+            inseridas, atualizadas = cur.fetchone()
+            cur.execute("DROP TABLE #chips_importacao")
+        return inseridas or 0, atualizadas or 0
@@ -0,0 +1,25 @@
+# tests/conftest.py
+# Os módulos do app ficam na raiz do repositório (sem pacote): python -m pytest a partir dela
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+import pytest
+
+
+@pytest.fixture
+def banco():
+    """Conexão nova com o banco DB_* (fora do pool). Os testes gravam e apagam chips de
+    teste, então só rodam com TESTES_DB=1 num banco descartável, como os benchmarks."""
+    if os.getenv("TESTES_DB") != "1":
+        pytest.skip("defina TESTES_DB=1 para os testes que usam o banco DB_*")
+    from db import _conectar_postgres
+    try:
+        conn = _conectar_postgres()
+    except psycopg2.OperationalError as erro:
+        pytest.skip(f"banco indisponível: {erro}")
+    yield conn
+    conn.rollback()
+    conn.close()
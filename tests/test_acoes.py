@@ -0,0 +1,68 @@
+# tests/test_acoes.py
+"""Transições concorrentes no mesmo chip gravam em chip_events o status que a outra deixou.
+
+    TESTES_DB=1 python -m pytest tests
+"""
+import threading
+import uuid
+
+import pytest
+
+import acoes
+from db import _conectar_postgres
+
+
+@pytest.fixture
+def chip(banco):
+    """Um chip 'disponivel' de teste (número único), apagado com seus eventos no fim"""
+    numero = "099" + uuid.uuid4().hex[:8]
+    with banco.cursor() as cur:
+        id = acoes.inserir_chip(cur, (numero, "disponivel", None, None, None, None, None, "teste"))
+    banco.commit()
+    yield id
+    banco.rollback()
+    with banco.cursor() as cur:
+        cur.execute("DELETE FROM chips WHERE id=%s", (id,))
+        cur.execute("DELETE FROM chip_events WHERE chip_id=%s", (id,))
+    banco.commit()
+
+
+def _eventos(banco, id):
+    with banco.cursor() as cur:
+        cur.execute("SELECT tipo, status_anterior, status_novo FROM chip_events WHERE chip_id=%s ORDER BY id", (id,))
+        return cur.fetchall()
+
+
+def test_transicao_concorrente_grava_status_deixado_pela_outra(banco, chip):
+    with banco.cursor() as cur:
+        assert acoes.transicionar(cur, [chip], acoes.valores_banimento(), "banimento") == 1
+    # banimento ainda sem commit: a recarga em outra conexão tem de esperar a trava
+    resultado = {}
+    def recarregar():
+        conn = _conectar_postgres()
+        try:
+            with conn, conn.cursor() as cur:
+                resultado["linhas"] = acoes.transicionar(cur, [chip], acoes.valores_recarga(), "recarga")
+        finally:
+            conn.close()
+    outra = threading.Thread(target=recarregar)
+    outra.start()
+    outra.join(0.5)
+    assert outra.is_alive(), "a recarga não esperou o banimento em andamento"
+    banco.commit()
+    outra.join(10)
+    assert resultado["linhas"] == 1
+    assert _eventos(banco, chip) == [
+        ("cadastro", None, "disponivel"),
+        ("banimento", "disponivel", "banido"),
+        ("recarga", "banido", "em_uso"),
+    ]
+
+
+def test_alocar_devolve_na_ordem_da_fila(banco, chip):
+    with banco.cursor() as cur:
+        cur.execute("SELECT id FROM chips WHERE status='disponivel' ORDER BY ultima_utilizacao NULLS FIRST, id LIMIT 5")
+        fila = [id for id, in cur.fetchall()]
+        alocados = acoes.alocar(cur, 5, ("id",))
+    banco.rollback()
+    assert [linha[0] for linha in alocados] == fila
@@ -0,0 +1,88 @@
+# tests/test_db.py
+"""PoolConexoes com conexões falsas: não precisa de banco.
+
+    python -m pytest tests
+"""
+import pytest
+
+from db import PoolConexoes, PoolEsgotado
+
+
+class ConexaoFalsa:
+    def __init__(self):
+        self.closed = 0
+        self.ping_falha = False
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+class CursorFalso:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql):
+        if self.conn.ping_falha:
+            raise OSError("conexão perdida")
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        pass
+
+
+def _pool(**opcoes):
+    criadas = []
+    def conectar():
+        criadas.append(ConexaoFalsa())
+        return criadas[-1]
+    return PoolConexoes(conectar, **opcoes), criadas
+
+
+def test_reaproveita_conexao_devolvida():
+    pool, criadas = _pool(ping_apos=None)
+    conn = pool.obter()
+    pool.devolver(conn)
+    assert pool.obter() is conn
+    assert len(criadas) == 1
+
+def test_aquecer_abre_o_minimo_e_fechar_todas_fecha_as_livres():
+    pool, criadas = _pool(minimo=3)
+    pool.aquecer()
+    assert pool.metricas()["livres"] == 3 and len(criadas) == 3
+    pool.fechar_todas()
+    assert pool.metricas()["livres"] == 0
+    assert all(conn.closed for conn in criadas)
+
+def test_esgotado_depois_do_timeout():
+    pool, _ = _pool(maximo=1, timeout=0.05)
+    pool.obter()
+    with pytest.raises(PoolEsgotado):
+        pool.obter()
+    assert pool.metricas()["timeouts"] == 1
+
+def test_descarta_conexao_que_falha_no_ping():
+    pool, criadas = _pool(ping_apos=0)
+    conn = pool.obter()
+    pool.devolver(conn)
+    conn.ping_falha = True
+    nova = pool.obter()
+    assert nova is not conn and conn.closed
+    assert pool.metricas()["descartadas"] == 1 and len(criadas) == 2
+
+def test_depois_do_fork_esquece_as_conexoes_herdadas():
+    pool, criadas = _pool(ping_apos=None)
+    herdada = pool.obter()
+    pool.devolver(herdada)
+    pool._pid = -1  # como se estivéssemos no processo filho
+    nova = pool.obter()
+    assert nova is not herdada
+    # O socket é do pai: no filho ela não pode nem ser fechada
+    assert not herdada.closed
+    assert pool.metricas()["em_uso"] == 1 and pool.metricas()["criadas"] == 1
@@ -0,0 +1,86 @@
+# tests/test_importacao.py
+"""validar_frame (vetorizado) tem de aceitar, rejeitar e converter exatamente como validar_linha.
+
+    python -m pytest tests
+"""
+import io
+import random
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from importacao import COLUNAS_CHIPS, ler_xlsx_em_lotes, validar_frame, validar_linha
+
+NUMEROS = ("(11) 9 1234-5678", "11912345678", "  21 98888-7777 ", "", "   ", "abc", "---", "1" * 20, "1" * 21,
+           "+55 (11) 9.1234-5678")
+STATUS = ("", "disponivel", "BANIDO", " em_uso ", "ativo", "banido")
+DATAS = ("", "2026-01-10", "2026-1-5", "2026-02-30", "9999-12-31", "0001-01-01", "1677-09-21", "2262-04-12",
+         "10/01/2026", "2026-01-10T00:00", "amanhã", " 2026-03-01 ")
+OBSERVACOES = ("", "lote 1", "  ", "vírgula, e \"aspas\"")
+
+
+def _linhas(n, semente):
+    rnd = random.Random(semente)
+    return [{
+        "numero_chip": rnd.choice(NUMEROS),
+        "status": rnd.choice(STATUS),
+        "ultima_utilizacao": rnd.choice(DATAS),
+        "primeira_recarga": rnd.choice(DATAS),
+        "proxima_recarga": rnd.choice(DATAS),
+        "observacoes": rnd.choice(OBSERVACOES),
+    } for _ in range(n)]
+
+def _valor(v):
+    # Normaliza o que vem do frame (Timestamp/NaT/NaN) para comparar com a tupla de salvar_chip
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.date()
+    return v
+
+
+@pytest.mark.parametrize("semente", range(5))
+def test_validar_frame_igual_a_validar_linha(semente):
+    linhas = _linhas(2000, semente)
+    limpo, rejeitado = validar_frame(pd.DataFrame(linhas), 2)
+
+    esperado_limpo = {}
+    esperado_rejeitado = {}
+    for i, linha in enumerate(linhas):
+        dados, motivo = validar_linha(linha)
+        if motivo:
+            esperado_rejeitado[i + 2] = motivo
+        else:
+            esperado_limpo[i] = dados
+
+    assert dict(zip(rejeitado["linha"], rejeitado["motivo"])) == esperado_rejeitado
+    obtido = {i: tuple(_valor(v) for v in linha)
+              for i, linha in zip(limpo.index, limpo[list(COLUNAS_CHIPS)].itertuples(index=False))}
+    assert obtido == esperado_limpo
+
+def test_datas_fora_da_faixa_do_pandas():
+    limpo, rejeitado = validar_frame(pd.DataFrame([
+        {"numero_chip": "11 1", "ultima_utilizacao": "9999-12-31", "primeira_recarga": "0001-01-01"},
+        {"numero_chip": "11 2", "ultima_utilizacao": "2026-01-10"},
+    ]), 2)
+    assert rejeitado.empty
+    assert _valor(limpo["ultima_utilizacao"].iloc[0]) == date(9999, 12, 31)
+    assert _valor(limpo["primeira_recarga"].iloc[0]) == date(1, 1, 1)
+    assert _valor(limpo["ultima_utilizacao"].iloc[1]) == date(2026, 1, 10)
+
+def test_xlsx_rejeicao_aponta_a_linha_da_planilha():
+    import openpyxl
+    planilha = openpyxl.Workbook()
+    aba = planilha.active
+    for linha in (("numero_chip", "status"), ("11 1", ""), (None, None), ("11 3", "ativo"), ("11 4", ""),
+                  (None, None), (None, None)):
+        aba.append(linha)
+    arquivo = io.BytesIO()
+    planilha.save(arquivo)
+    arquivo.seek(0)
+
+    frames = [df for df, _ in ler_xlsx_em_lotes(arquivo, tamanho_lote=2)]
+    assert sum(len(df) for df in frames) == 4  # a linha em branco do meio conta, as do fim não
+    rejeitado = pd.concat([validar_frame(df, linha)[1] for df, linha in zip(frames, (2, 4))])
+    assert dict(zip(rejeitado["linha"], rejeitado["motivo"])) == {3: "numero_chip vazio", 4: "status inválido: ativo"}
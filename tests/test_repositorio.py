@@ -0,0 +1,38 @@
+# tests/test_repositorio.py
+"""upsert_em_lote conta inseridas e atualizadas como a importação, nos dois modos.
+
+    TESTES_DB=1 python -m pytest tests
+"""
+import uuid
+
+from repositorio import repositorio_postgres
+from utilitarios import salvar_chip
+
+
+def _numeros():
+    # Prefixo incomum e sufixo aleatório: não colide com chips já cadastrados
+    base = "0977" + str(uuid.uuid4().int)[:6]
+    return base + "1", base + "2", base + "3"
+
+
+def test_upsert_em_lote_inserir_e_atualizar(banco):
+    a, b, c = _numeros()
+    linhas = [salvar_chip(a, "disponivel", None, None, None, "x"),
+              salvar_chip(b, "em_uso", None, None, None, None)]
+    # Tudo numa transação só (a do fixture), desfeita no fim
+    upsert = lambda linhas, modo: repositorio_postgres.upsert_em_lote(linhas, modo, conn=banco)
+
+    assert upsert(linhas, "inserir") == (2, 0)
+    # Já cadastrados: "inserir" não mexe neles
+    assert upsert([salvar_chip(a, "banido", None, None, None, "x")], "inserir") == (0, 0)
+    # Número repetido no lote (mesmos dígitos, outra formatação): vale a última ocorrência
+    assert upsert([salvar_chip(c, "disponivel", None, None, None, None),
+                   salvar_chip(f"({c[:2]}) {c[2:]}", "em_uso", None, None, None, None)], "inserir") == (1, 0)
+    # "atualizar": linha igual à cadastrada não conta, diferente conta como atualizada
+    assert upsert(linhas, "atualizar") == (0, 0)
+    assert upsert([salvar_chip(a, "banido", None, None, None, "x"), linhas[1]], "atualizar") == (0, 1)
+
+    cur = banco.cursor()
+    cur.execute("SELECT numero_chip, status FROM chips WHERE numero_normalizado = ANY(%s) ORDER BY numero_normalizado",
+                ([a, b, c],))
+    assert cur.fetchall() == [(a, "banido"), (b, "em_uso"), (f"({c[:2]}) {c[2:]}", "em_uso")]
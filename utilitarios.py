@@ -0,0 +1,43 @@
+# utilitarios.py
+import os
+import re
+from datetime import date, timedelta, datetime
+
+STATUS_VALIDOS = ("disponivel","banido","em_uso")
+# Quarentena após banimento e validade de uma recarga
+DIAS_BANIMENTO = int(os.getenv("DIAS_BANIMENTO","1"))
+DIAS_RECARGA = int(os.getenv("DIAS_RECARGA","30"))
+
+def normalizar_telefone(numero):
+    """Só os dígitos do número; é a chave de unicidade dos chips"""
+    return re.sub(r'\D', '', numero or "")
+
+def normalizar_telefones(numeros):
+    """normalizar_telefone para uma Series inteira do pandas (importação em lote)"""
+    return numeros.str.replace(r'\D', '', regex=True)
+
+def escapar_like(valor):
+    """Escapa os curingas do LIKE (usar com ESCAPE '\\'); [ é curinga no SQL Server"""
+    return valor.replace("\\","\\\\").replace("%","\\%").replace("_","\\_").replace("[","\\[")
+
+def str_para_date(valor):
+    if not valor:
+        return None
+    if isinstance(valor, date):
+        return valor
+    if isinstance(valor, str):
+        try:
+            return datetime.strptime(valor, "%Y-%m-%d").date()
+        except:
+            return None
+    return None
+
+def salvar_chip(numero, status, ultima, primeira, proxima, obs):
+    """Calcula datas corretamente e retorna tupla pronta para INSERT/UPDATE"""
+    if status=="banido":
+        data_banimento = date.today()
+        proxima_utilizacao = data_banimento + timedelta(days=DIAS_BANIMENTO)
+    else:
+        data_banimento = None
+        proxima_utilizacao = None
+    return (numero,status,ultima,primeira,proxima,proxima_utilizacao,data_banimento,obs)